@@ -1,10 +1,13 @@
-from . import (containers,
+from . import (batch,
+               compact,
+               containers,
                datamodel,
                game_master,
                layout,
                libpelita,
                player,
                simplesetup,
+               vectorised,
                viewer,
                utils,
                __version_from_git)
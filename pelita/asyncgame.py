@@ -0,0 +1,202 @@
+""" Games on an asyncio event loop.
+
+`AsyncGameMaster` plays a game like `GameMaster`, but waits for the replies
+of the teams without blocking the event loop. Together with
+`AsyncRemoteTeamPlayer` many games can thus run concurrently in one
+event loop. The viewers are updated by a background task, so that a slow
+viewer does not stall the game.
+
+Examples
+--------
+Play two games at once:
+
+    >>> import asyncio
+    >>> from pelita.asyncgame import AsyncGameMaster
+    >>> loop = asyncio.get_event_loop()
+    >>> loop.run_until_complete(asyncio.gather(game_master_1.play(), game_master_2.play()))
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+
+import zmq
+import zmq.asyncio
+
+from .game_master import GameFinished, GameMaster
+from .simplesetup import RemoteTeamPlayer, UnknownMessageId, ZMQReplyTimeout, _raise
+
+
+class AsyncRemoteTeamPlayer(RemoteTeamPlayer):
+    """ A `RemoteTeamPlayer` whose requests are coroutines.
+
+    The reply is awaited on the zmq.asyncio shadow of the socket and the
+    timeout is enforced with `asyncio.wait_for`.
+
+    Parameters
+    ----------
+    socket : zmq socket
+        The zmq socket of this connection
+    """
+    def __init__(self, socket):
+        super().__init__(socket)
+        self._async_socket = zmq.asyncio.Socket.from_socket(socket)
+
+    async def set_initial(self, team_id, universe, game_state):
+        send = functools.partial(self._send_set_initial, team_id, universe, game_state)
+        communicate = await self._communicate(send, game_state["timeout_length"])
+        return self._set_initial_reply(communicate)
+
+    async def get_move(self, bot_id, universe, game_state):
+        send = functools.partial(self._send_get_move, bot_id, universe, game_state)
+        communicate = await self._communicate(send, game_state["timeout_length"])
+        return self._get_move_reply(communicate)
+
+    async def _communicate(self, send, timeout):
+        """ Sends a request and waits for the reply.
+
+        Returns
+        -------
+        communicate : function
+            returns the reply or raises the error of the connection
+        """
+        try:
+            send()
+            reply = await asyncio.wait_for(self._recv(), timeout)
+        except asyncio.TimeoutError:
+            return functools.partial(_raise, ZMQReplyTimeout())
+        except Exception as e:
+            return functools.partial(_raise, e)
+        return lambda: reply
+
+    async def _recv(self):
+        while True:
+            await self._async_socket.poll(flags=zmq.POLLIN)
+            try:
+                return self.zmqconnection.recv()
+            except UnknownMessageId:
+                # a late reply to an earlier request
+                continue
+
+    def __repr__(self):
+        return "AsyncRemoteTeamPlayer(%r)" % self.zmqconnection
+
+
+class AsyncGameMaster(GameMaster):
+    """ A `GameMaster` which plays on an asyncio event loop.
+
+    The teams may be local teams or have coroutine methods like
+    `AsyncRemoteTeamPlayer`. `set_initial`, `play`, `play_round` and
+    `play_step` are coroutines.
+
+    The viewers observe copies of the universe and the game state in a
+    background task, one update after the other. `play` waits for them
+    at the end of the game.
+    """
+    # the snapshots for the viewers and the task which shows them
+    _viewer_queue = None
+    _viewer_task = None
+
+    async def set_initial(self):
+        await self._answer_requests_async(self._set_initial_requests())
+
+    async def play(self):
+        """ Play game until finished. """
+        # notify all PlayerTeams
+        await self.set_initial()
+
+        while not self.game_state.get("finished"):
+            await self.play_round()
+
+        await self.flush_viewers()
+
+    async def play_round(self):
+        """ Finishes the current round.
+
+        A round is defined as all bots moving once.
+        """
+        if self.game_state["finished"]:
+            return
+
+        if self._step_iter is None:
+            self._step_iter = self._play_bot_requests()
+        try:
+            await self._answer_requests_async(self._step_iter)
+            self._step_iter = None
+        except GameFinished:
+            self.update_viewers()
+
+    async def play_step(self):
+        """ Plays a single step of a bot.
+        """
+        while not self.game_state["finished"]:
+            if self._step_iter is None:
+                self._step_iter = self._play_bot_requests()
+            try:
+                if await self._answer_requests_async(self._step_iter, step=True):
+                    return
+                # we could not make a move:
+                # just try another one
+                self._step_iter = None
+            except GameFinished:
+                self.update_viewers()
+
+    async def _answer_requests_async(self, requests, step=False):
+        """ Like `_answer_requests`, but awaits the replies of
+        coroutine methods.
+
+        Returns
+        -------
+        stepped : bool
+            True, if `step` is set and the generator gave control to the
+            caller, False if it is exhausted
+        """
+        reply = error = None
+        while True:
+            try:
+                if error is not None:
+                    request = requests.throw(error)
+                else:
+                    request = requests.send(reply)
+            except StopIteration:
+                return False
+            reply = error = None
+            if request is None:
+                if step:
+                    return True
+                continue
+            team = self.player_teams[request.team_id]
+            try:
+                reply = getattr(team, request.action)(*request.args)
+                if inspect.isawaitable(reply):
+                    reply = await reply
+            except Exception as e:
+                error = e
+
+    def update_viewers(self):
+        """ Queues a snapshot of the game for the viewers. """
+        if not self.viewers:
+            return
+        if self._viewer_queue is None:
+            self._viewer_queue = asyncio.Queue()
+            self._viewer_task = asyncio.ensure_future(self._run_viewers())
+        self._viewer_queue.put_nowait((self.universe.copy(), copy.deepcopy(self.game_state)))
+
+    async def flush_viewers(self):
+        """ Waits until the viewers have observed all updates. """
+        if self._viewer_queue is not None:
+            await self._viewer_queue.join()
+            self._viewer_task.cancel()
+            self._viewer_queue = self._viewer_task = None
+
+    async def _run_viewers(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            universe, game_state = await self._viewer_queue.get()
+            try:
+                for viewer in self.viewers:
+                    # the viewers may block, so they observe in a thread
+                    await loop.run_in_executor(None, viewer.observe, universe, game_state)
+            finally:
+                self._viewer_queue.task_done()
@@ -0,0 +1,260 @@
+""" Headless simulation of many games between in-process teams.
+
+The games are played directly by a `GameMaster` without any zmq sockets,
+subprocesses or viewers. Independent games are distributed over a pool of
+processes.
+
+Examples
+--------
+Play 100 games between two new-style teams on all cores:
+
+    >>> from pelita.batch import play_games
+    >>> from my_team import move as my_move
+    >>> from other_team import move as other_move
+    >>> results = play_games([my_move, other_move], 100, seed=1)
+    >>> sum(result.winner == 0 for result in results)
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import inspect
+import os
+import random
+import sys
+
+from . import layout
+from .compact import CompactUniverse
+from .game_master import GameMaster
+from .player import AbstractTeam, Team
+
+#: The result of a single game. The tuples are indexed like the teams
+#: which were passed to `play_games`.
+GameResult = namedtuple("GameResult", ["game", "layout_name", "seed", "team_name", "winner",
+                                       "score", "rounds", "timeouts", "team_time", "disqualified"])
+
+#: Team factories which were loaded from a spec string in this process.
+#: A module can only be imported once with `load_factory`.
+_factory_cache = {}
+
+
+def _load_factory(spec):
+    """ Loads the team factory for a spec string, like pelita-player does. """
+    try:
+        return _factory_cache[spec]
+    except KeyError:
+        pass
+    if spec == '0':
+        from .player.FoodEatingPlayer import team as factory
+    elif spec == '1':
+        from .player.RandomExplorerPlayer import team as factory
+    else:
+        from .scripts.pelita_player import load_factory
+        factory = load_factory(spec)
+    _factory_cache[spec] = factory
+    return factory
+
+
+def make_team(spec):
+    """ Creates a fresh team for a single game.
+
+    Parameters
+    ----------
+    spec : str, AbstractTeam or callable
+        One of:
+
+        * a team spec string as understood by pelita-player
+          (a module path with an optional `:factory`, or '0' and '1'
+          for the built-in teams)
+        * a team object, e.g. a `SimpleTeam`, which is copied for each game
+        * a factory function without arguments which returns a team
+        * a new-style `move(bot, state)` function. The team is named after
+          the `TEAM_NAME` of its module or after the function.
+
+    Returns
+    -------
+    team : AbstractTeam
+        the team
+
+    Raises
+    ------
+    TypeError
+        if the team cannot be created from `spec`
+
+    """
+    if isinstance(spec, str):
+        return _load_factory(spec)()
+    if isinstance(spec, AbstractTeam):
+        return copy.deepcopy(spec)
+    if not callable(spec):
+        raise TypeError("Cannot create a team from {!r}.".format(spec))
+
+    required = [param for param in inspect.signature(spec).parameters.values()
+                if param.default is param.empty and
+                param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)]
+    if not required:
+        return spec()
+
+    module = sys.modules.get(spec.__module__)
+    team_name = getattr(module, "TEAM_NAME", spec.__name__)
+    return Team(team_name, spec)
+
+
+def play_game(team_specs, layout_name, layout_string, *, rounds=300, seed=None, game=0,
+              noise=True, noiser=None, max_timeouts=5, universe_class=CompactUniverse):
+    """ Plays a single game in this process.
+
+    Parameters
+    ----------
+    team_specs : list of team specs
+        the two teams, see `make_team`
+    layout_name : str
+        the name of the layout
+    layout_string : str
+        the layout
+    rounds : int, optional
+        the maximum number of rounds
+    seed : int, optional
+        the seed of the game
+    game : int, optional
+        the index of the game in a batch
+    noise : bool, optional
+        should the enemy positions be noisy
+    noiser : subclass of UniverseNoiser or str, optional
+        the noiser to use
+    max_timeouts : int, optional
+        the number of timeouts (or illegal moves) before a team is disqualified
+    universe_class : subclass of CTFUniverse, optional
+        the universe implementation to use. Default: `CompactUniverse`
+
+    Returns
+    -------
+    result : GameResult
+        the result of the game
+
+    """
+    teams = [make_team(spec) for spec in team_specs]
+    gm = GameMaster(layout_string, teams, 2 * len(teams), rounds, noise=noise, noiser=noiser,
+                    max_timeouts=max_timeouts, layout_name=layout_name, seed=seed,
+                    universe_class=universe_class)
+    gm.play()
+
+    game_state = gm.game_state
+    return GameResult(game=game,
+                      layout_name=layout_name,
+                      seed=seed,
+                      team_name=tuple(game_state["team_name"]),
+                      winner=game_state["team_wins"],
+                      score=tuple(team.score for team in gm.universe.teams),
+                      rounds=game_state["round_index"],
+                      timeouts=tuple(game_state["timeout_teams"]),
+                      team_time=tuple(game_state["team_time"]),
+                      disqualified=tuple(game_state["teams_disqualified"]))
+
+
+def _play_game(args):
+    # unpacks the arguments in the worker process
+    team_specs, layout_name, layout_string, kwargs = args
+    return play_game(team_specs, layout_name, layout_string, **kwargs)
+
+
+def play_games(team_specs, number_games, *, layout_name=None, filter='', rounds=300,
+               seed=None, processes=None, noise=True, noiser=None, max_timeouts=5,
+               universe_class=CompactUniverse):
+    """ Plays a batch of games between the same teams.
+
+    The layout (unless `layout_name` is given) and the seed of each game
+    are drawn from a random number generator seeded with `seed`, so that
+    a batch can be replayed exactly, independent of the number of processes.
+
+    Parameters
+    ----------
+    team_specs : list of team specs
+        the two teams, see `make_team`. When more than one process is used,
+        the specs must be picklable; module level functions and team objects
+        usually are, lambdas are not.
+    number_games : int
+        the number of games to play
+    layout_name : str, optional
+        play all games on this layout
+    filter : str, optional
+        only choose random layouts whose name contains `filter`
+    rounds : int, optional
+        the maximum number of rounds
+    seed : int, optional
+        the seed for the whole batch
+    processes : int, optional
+        the number of worker processes. Default: the number of cores.
+        With one process, the games are played in this process.
+    noise : bool, optional
+        should the enemy positions be noisy
+    noiser : subclass of UniverseNoiser or str, optional
+        the noiser to use
+    max_timeouts : int, optional
+        the number of timeouts (or illegal moves) before a team is disqualified
+    universe_class : subclass of CTFUniverse, optional
+        the universe implementation to use. Default: `CompactUniverse`
+
+    Returns
+    -------
+    results : list of GameResult
+        the results in the order of the games
+
+    """
+    rng = random.Random(seed)
+    if layout_name is None:
+        layout_names = layout.get_available_layouts(filter)
+        if not layout_names:
+            raise ValueError("No layout matches the filter {!r}.".format(filter))
+    layout_strings = {}
+
+    games = []
+    for game in range(number_games):
+        name = layout_name if layout_name is not None else rng.choice(layout_names)
+        if name not in layout_strings:
+            layout_strings[name] = layout.get_layout_by_name(name)
+        kwargs = dict(rounds=rounds, seed=rng.randint(0, sys.maxsize), game=game,
+                      noise=noise, noiser=noiser, max_timeouts=max_timeouts,
+                      universe_class=universe_class)
+        games.append((team_specs, name, layout_strings[name], kwargs))
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, number_games)
+    if processes <= 1:
+        return [_play_game(args) for args in games]
+
+    chunksize = max(1, number_games // (4 * processes))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_play_game, games, chunksize=chunksize))
+
+
+def summarize(results):
+    """ Counts the wins, losses and draws of the teams in a batch.
+
+    Parameters
+    ----------
+    results : list of GameResult
+        the results of a batch
+
+    Returns
+    -------
+    summary : list of dict
+        for each team the number of "wins", "losses" and "draws"
+        and the average "score"
+
+    """
+    number_teams = len(results[0].score) if results else 0
+    summary = [{"wins": 0, "losses": 0, "draws": 0, "score": 0} for _ in range(number_teams)]
+    for result in results:
+        for team_index, team_summary in enumerate(summary):
+            if result.winner is None:
+                team_summary["draws"] += 1
+            elif result.winner == team_index:
+                team_summary["wins"] += 1
+            else:
+                team_summary["losses"] += 1
+            team_summary["score"] += result.score[team_index]
+    for team_summary in summary:
+        team_summary["score"] /= len(results)
+    return summary
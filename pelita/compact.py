@@ -0,0 +1,389 @@
+""" A compact, array-backed implementation of the CTF universe. """
+
+from array import array
+from collections.abc import MutableSet
+
+from .datamodel import Bot, CTFUniverse, IllegalMoveException, Team
+
+
+class CellTables:
+    """ Static lookup tables for a `Maze` in integer cell space.
+
+    A cell is the linear index ``x + y * width`` of a position in the maze.
+    The tables only depend on the walls, so they can be shared between all
+    universes which use the same maze.
+
+    Parameters
+    ----------
+    maze : Maze
+        the maze to build the tables for
+
+    Attributes
+    ----------
+    positions : list of tuple of (int, int)
+        the position (x, y) of each cell
+    cell_x : array of int
+        the x coordinate of each cell
+    legal : list of dict
+        for each cell a mapping from the legal moves to the target cells,
+        in the order of `Maze.legal_moves_table`
+
+    """
+    def __init__(self, maze):
+        self.width = maze.width
+        self.height = maze.height
+        self.positions = [maze._index_linear_to_tuple(cell) for cell in range(len(maze))]
+        self.cell_x = array('i', (pos[0] for pos in self.positions))
+
+        table = maze.legal_moves_table
+        self.legal = [{move: new_x + new_y * self.width for move, (new_x, new_y) in table[pos]}
+                      for pos in self.positions]
+
+    def cell(self, position):
+        """ The cell index of a position.
+
+        Raises
+        ------
+        KeyError
+            if the position is not inside the maze
+
+        """
+        x, y = position
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return x + y * self.width
+        raise KeyError('Position %r is outside of the maze.' % (position,))
+
+
+class CompactBot(Bot):
+    """ A `Bot` which stores its current position in a `CompactUniverse`.
+
+    Apart from the storage of `current_pos`, it behaves like a `Bot`.
+
+    Parameters
+    ----------
+    universe : CompactUniverse
+        the universe holding the position of this bot
+
+    See `Bot` for the other parameters.
+
+    """
+    def __init__(self, universe, index, initial_pos, team_index, homezone,
+            current_pos=None, noisy=False):
+        self._universe = universe
+        super().__init__(index, initial_pos, team_index, homezone,
+                         current_pos=current_pos, noisy=noisy)
+
+    @property
+    def current_pos(self):
+        universe = self._universe
+        return universe._tables.positions[universe._bot_cells[self.index]]
+
+    @current_pos.setter
+    def current_pos(self, position):
+        universe = self._universe
+        universe._bot_cells[self.index] = universe._tables.cell(tuple(position))
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self._to_json_dict() == other._to_json_dict()
+
+    def __ne__(self, other):
+        return not (self == other)
+
+
+class CompactFood(MutableSet):
+    """ A live set view of the food in a `CompactUniverse`.
+
+    Adding and removing positions changes the food array of the universe.
+    Like `FoodIndex`, the view can count and list the food per team zone.
+
+    Parameters
+    ----------
+    universe : CompactUniverse
+        the universe holding the food
+
+    """
+    def __init__(self, universe):
+        self._universe = universe
+
+    def _cell(self, position):
+        try:
+            return self._universe._tables.cell(tuple(position))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def __contains__(self, position):
+        cell = self._cell(position)
+        return cell is not None and self._universe._food[cell] == 1
+
+    def __iter__(self):
+        positions = self._universe._tables.positions
+        return (positions[cell] for cell in self._universe._food_cells())
+
+    def __len__(self):
+        return self._universe._food_count
+
+    def add(self, position):
+        universe = self._universe
+        cell = universe._tables.cell(tuple(position))
+        if not universe._food[cell]:
+            universe._food[cell] = 1
+            universe._change_food_count(cell, 1)
+
+    def discard(self, position):
+        universe = self._universe
+        cell = self._cell(position)
+        if cell is not None and universe._food[cell]:
+            universe._food[cell] = 0
+            universe._change_food_count(cell, -1)
+
+    def in_zone(self, zone_index):
+        """ Food within a zone. """
+        return self._universe.team_food(zone_index)
+
+    def outside_zone(self, zone_index):
+        """ Food outside of a zone. """
+        return self._universe.enemy_food(zone_index)
+
+    def count_in_zone(self, zone_index):
+        """ The number of food items within a zone. """
+        return self._universe.team_food_count(zone_index)
+
+    def count_outside_zone(self, zone_index):
+        """ The number of food items outside of a zone. """
+        return self._universe.enemy_food_count(zone_index)
+
+    def __repr__(self):
+        return 'CompactFood(%r)' % set(self)
+
+
+class CompactUniverse(CTFUniverse):
+    """ Array-backed drop-in replacement for `CTFUniverse`.
+
+    Food is kept in a flat `bytearray` over all cells, the bot positions are
+    kept in an integer array and the legal moves of each cell are looked up
+    in precomputed `CellTables`. This makes `apply_move` and `legal_moves`
+    considerably cheaper than in the generic implementation, which is
+    useful for headless simulations of many games.
+
+    The maze is treated as immutable: the tables are built once and are
+    shared with every copy of this universe. Like `CTFUniverse`, the food
+    lists of `team_food` and `enemy_food` are in row-major order.
+
+    Notes
+    -----
+    `food` is a `CompactFood` view of the food array, so adding or
+    removing food through it changes the universe.
+
+    Parameters
+    ----------
+    maze : Maze object
+        the maze
+    food : iterable of tuple of (int, int)
+        the positions of the food
+    teams : list of Team objects
+        the teams
+    bots : list of Bot objects
+        the bots
+
+    """
+    def __init__(self, maze, food, teams, bots, _tables=None):
+        self.maze = maze
+        self.teams = teams
+        self._tables = _tables or CellTables(maze)
+
+        self._bot_cells = array('i', [0] * len(bots))
+        self.bots = [CompactBot(self, bot.index, bot.initial_pos, bot.team_index, bot.homezone,
+                                current_pos=bot.current_pos, noisy=bot.noisy)
+                     for bot in bots]
+        self.food = food
+
+    @property
+    def food(self):
+        return CompactFood(self)
+
+    @food.setter
+    def food(self, food):
+        self._food = bytearray(self._tables.width * self._tables.height)
+        for pos in food:
+            self._food[self._tables.cell(tuple(pos))] = 1
+        self._count_food()
+        self._state_hash = None
+
+    def _count_food(self):
+        """ Recounts the food in each team zone. """
+        cell_x = self._tables.cell_x
+        self._food_count = 0
+        self._zone_food_counts = [0] * len(self.teams)
+        for cell in self._food_cells():
+            self._food_count += 1
+            zone_index = self._zone_index(cell_x[cell])
+            if zone_index is not None:
+                self._zone_food_counts[zone_index] += 1
+
+    def _change_food_count(self, cell, change):
+        """ Updates the counts after food was added to or removed from a cell. """
+        self._food_count += change
+        zone_index = self._zone_index(self._tables.cell_x[cell])
+        if zone_index is not None:
+            self._zone_food_counts[zone_index] += change
+        self._state_hash = None
+
+    def _zone_index(self, x):
+        """ The index of the team whose zone contains column x. """
+        for team in self.teams:
+            if team.zone[0] <= x <= team.zone[1]:
+                return team.index
+        return None
+
+    _food_view = food
+
+    @property
+    def food_list(self):
+        return self.food
+
+    def _food_cells(self):
+        """ Iterates over the cells which contain food. """
+        food = self._food
+        cell = food.find(1)
+        while cell != -1:
+            yield cell
+            cell = food.find(1, cell + 1)
+
+    def team_food(self, team_index):
+        x_min, x_max = self.teams[team_index].zone
+        positions = self._tables.positions
+        cell_x = self._tables.cell_x
+        return [positions[cell] for cell in self._food_cells()
+                if x_min <= cell_x[cell] <= x_max]
+
+    def enemy_food(self, team_index):
+        x_min, x_max = self.teams[team_index].zone
+        positions = self._tables.positions
+        cell_x = self._tables.cell_x
+        return [positions[cell] for cell in self._food_cells()
+                if not x_min <= cell_x[cell] <= x_max]
+
+    def team_food_count(self, team_index):
+        return self._zone_food_counts[team_index]
+
+    def enemy_food_count(self, team_index):
+        return self._food_count - self._zone_food_counts[team_index]
+
+    @property
+    def bot_positions(self):
+        positions = self._tables.positions
+        return [positions[cell] for cell in self._bot_cells]
+
+    def apply_move(self, bot_id, move):
+        tables = self._tables
+        positions = tables.positions
+        cell_x = tables.cell_x
+        bot_cells = self._bot_cells
+
+        old_cell = bot_cells[bot_id]
+        try:
+            new_cell = tables.legal[old_cell][move]
+        except (KeyError, TypeError):
+            raise IllegalMoveException(
+                'Illegal move from bot_id %r: %s' % (bot_id, move))
+        bot_cells[bot_id] = new_cell
+
+        bot = self.bots[bot_id]
+        x = cell_x[new_cell]
+        bot_at_home = bot.homezone[0] <= x <= bot.homezone[1]
+
+        # check for food being eaten
+        food_eaten = False
+        if self._food[new_cell] and not bot_at_home:
+            self._food[new_cell] = 0
+            self._food_count -= 1
+            zone_index = self._zone_index(x)
+            if zone_index is not None:
+                self._zone_food_counts[zone_index] -= 1
+            self.teams[bot.team_index].score += 1
+            food_eaten = True
+
+        # check for destruction
+        destroyed = ()
+        for enemy in self.bots:
+            if enemy.team_index == bot.team_index or bot_cells[enemy.index] != new_cell:
+                continue
+            enemy_at_home = enemy.homezone[0] <= x <= enemy.homezone[1]
+            if enemy_at_home and not bot_at_home:
+                destroyer = enemy.index
+                harvester = bot_id
+            elif bot_at_home and not enemy_at_home:
+                destroyer = bot_id
+                harvester = enemy.index
+            else:
+                continue
+
+            # move on, if harvester is already destroyed
+            if any(destroyed_bot == harvester for destroyed_bot, _ in destroyed):
+                continue
+
+            destroyed += ((harvester, destroyer),)
+
+        # reset bots
+        for harvester, destroyer in destroyed:
+            self.bots[harvester]._to_initial()
+            self.teams[self.bots[destroyer].team_index].score += self.KILLPOINTS
+
+        old_pos = positions[old_cell]
+        new_pos = positions[new_cell]
+        previous = (self._bot_to_move, self._state_hash)
+        self._update_state_hash(bot_id, old_pos, new_pos, food_eaten, destroyed)
+        return (bot_id, old_pos, new_pos, food_eaten, destroyed, previous)
+
+    def undo(self, undo_token):
+        bot_id, old_pos, new_pos, food_eaten, destroyed, previous = undo_token
+        tables = self._tables
+        bot_cells = self._bot_cells
+        new_cell = tables.cell(new_pos)
+
+        for harvester, destroyer in destroyed:
+            bot_cells[harvester] = new_cell
+            self.teams[self.bots[destroyer].team_index].score -= self.KILLPOINTS
+        if food_eaten:
+            self._food[new_cell] = 1
+            self._food_count += 1
+            zone_index = self._zone_index(new_pos[0])
+            if zone_index is not None:
+                self._zone_food_counts[zone_index] += 1
+            self.teams[self.bots[bot_id].team_index].score -= 1
+        bot_cells[bot_id] = tables.cell(old_pos)
+        self._bot_to_move, self._state_hash = previous
+
+    def legal_moves(self, position):
+        tables = self._tables
+        try:
+            cell = tables.cell(position)
+        except (KeyError, TypeError, ValueError):
+            return super().legal_moves(position)
+        positions = tables.positions
+        return {move: positions[new_cell] for move, new_cell in tables.legal[cell].items()}
+
+    def copy(self):
+        """ Copies the dynamic state of this universe.
+
+        The maze and the cell tables are shared with the copy.
+        """
+        teams = [Team(team.index, team.zone, team.score) for team in self.teams]
+        uni_copy = type(self)(self.maze, (), teams, self.bots, _tables=self._tables)
+        uni_copy._food[:] = self._food
+        uni_copy._food_count = self._food_count
+        uni_copy._zone_food_counts = list(self._zone_food_counts)
+        uni_copy._bot_to_move = self._bot_to_move
+        uni_copy._state_hash = self._state_hash
+        return uni_copy
+
+    def __repr__(self):
+        return ("CompactUniverse(%r, %r, %r, %r)" %
+            (self.maze, set(self.food), self.teams, self.bots))
+
+    def __eq__(self, other):
+        return (type(self) == type(other) and
+                self.maze == other.maze and
+                self._food == other._food and
+                self.teams == other.teams and
+                self.bots == other.bots)
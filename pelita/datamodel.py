@@ -1,5 +1,12 @@
 """ The datamodel. """
 
+from collections import namedtuple
+from collections.abc import MutableSet
+import copy
+import functools
+import random
+import types
+
 from .containers import Mesh
 from .graph import iter_adjacencies, move_pos
 from .layout import Layout
@@ -10,6 +17,9 @@
 east  = (1, 0)
 stop  = (0, 0)
 
+#: All possible (but not necessarily legal) moves
+moves = [north, south, east, west, stop]
+
 class Team:
     """ A team of bots.
 
@@ -192,6 +202,8 @@ class Maze(Mesh):
     ----------
     shape : (int, int)
         tuple of width and height
+    legal_moves_table : mapping, property
+        the legal moves from each position in the maze
 
     """
     def __init__(self, width, height, data=None):
@@ -201,6 +213,46 @@ def __init__(self, width, height, data=None):
             raise TypeError("Maze keyword argument 'data' should be a list of of " +\
                             "bools, not: %r" % data)
         super(Maze, self).__init__(width, height, data)
+        self._legal_moves_table = None
+
+    def __setitem__(self, index, item):
+        super(Maze, self).__setitem__(index, item)
+        self._legal_moves_table = None
+
+    def _set_data(self, new_data):
+        super(Maze, self)._set_data(new_data)
+        self._legal_moves_table = None
+
+    @property
+    def legal_moves_table(self):
+        """ The legal moves for each position in the Maze.
+
+        The table is computed on first access and cached until the walls
+        are changed. Mazes with identical walls share the same table.
+
+        Returns
+        -------
+        legal_moves_table : read-only mapping of position to tuple of (move, new_pos)
+            for each position (x, y) in the Maze the legal moves and
+            where they lead, in the order of `moves`
+
+        """
+        if self._legal_moves_table is None:
+            self._legal_moves_table = _legal_moves_table(self.width, self.height, bytes(self._data))
+        return self._legal_moves_table
+
+    def copy(self):
+        """ Copies the walls of this maze. The legal moves table is shared. """
+        maze = Maze(self.width, self.height, list(self._data))
+        maze._legal_moves_table = self._legal_moves_table
+        return maze
+
+    def __getstate__(self):
+        # the cached table is a read-only view which cannot be pickled;
+        # it is rebuilt on first access
+        state = self.__dict__.copy()
+        state["_legal_moves_table"] = None
+        return state
 
     @property
     def positions(self):
@@ -214,6 +266,69 @@ def positions(self):
         """
         return list(self.keys())
 
+@functools.lru_cache(maxsize=32)
+def _legal_moves_table(width, height, walls):
+    """ Computes the legal moves table for a maze with the given walls.
+
+    Parameters
+    ----------
+    width : int
+        the width of the maze
+    height : int
+        the height of the maze
+    walls : bytes
+        the walls (1) and free spaces (0) of the maze in row-based order
+
+    Returns
+    -------
+    legal_moves_table : read-only mapping of position to tuple of (move, new_pos)
+
+    """
+    table = {}
+    for y in range(height):
+        for x in range(width):
+            legal = []
+            for move in moves:
+                new_x, new_y = x + move[0], y + move[1]
+                if (0 <= new_x < width and 0 <= new_y < height and
+                        not walls[new_x + new_y * width]):
+                    legal.append((move, (new_x, new_y)))
+            table[(x, y)] = tuple(legal)
+    return types.MappingProxyType(table)
+
+#: Seed for the Zobrist keys, so that state hashes are reproducible
+ZOBRIST_SEED = 0x7e1174
+
+ZobristKeys = namedtuple("ZobristKeys", ["bots", "food", "to_move"])
+
+@functools.lru_cache(maxsize=32)
+def _zobrist_keys(width, height, number_bots):
+    """ Computes the random keys for the Zobrist hash of a universe.
+
+    Parameters
+    ----------
+    width : int
+        the width of the maze
+    height : int
+        the height of the maze
+    number_bots : int
+        the number of bots in the universe
+
+    Returns
+    -------
+    zobrist_keys : ZobristKeys
+        `bots[bot_index][cell]` and `food[cell]` for the cell ``x + y * width``
+        and `to_move[bot_index]` for the bot which has to move next
+
+    """
+    rng = random.Random(ZOBRIST_SEED)
+    cells = width * height
+    bot_keys = tuple(tuple(rng.getrandbits(64) for _cell in range(cells))
+                     for _bot in range(number_bots))
+    food_keys = tuple(rng.getrandbits(64) for _cell in range(cells))
+    to_move_keys = tuple(rng.getrandbits(64) for _bot in range(number_bots))
+    return ZobristKeys(bot_keys, food_keys, to_move_keys)
+
 def create_maze(layout_mesh):
     """ Transforms a layout_mesh into a Maze.
 
@@ -263,6 +378,114 @@ def extract_initial_positions(mesh, number_bots):
     return start
 
 
+def _row_major(position):
+    # sort key for positions in the order of the cells of a maze
+    return (position[1], position[0])
+
+
+class FoodIndex(MutableSet):
+    """ A set of food positions which is indexed by the team zones.
+
+    Besides the usual set operations, the index keeps one set of food
+    positions for each zone, so that the food within a zone and its
+    amount can be looked up without scanning all of the food.
+
+    The food of a zone is listed in row-major order (by y, then x), so
+    that the order does not depend on the history of the sets and is the
+    same in every copy of a universe.
+
+    Parameters
+    ----------
+    food : iterable of tuple of int (x, y)
+        the positions of the food
+    zones : list of tuple of int (x_min, x_max)
+        the zones by which the food is indexed
+
+    """
+    def __init__(self, food=(), zones=()):
+        self.zones = [tuple(zone) for zone in zones]
+        self._food = set()
+        self._zone_food = [set() for _zone in self.zones]
+        # food which lies outside of all zones
+        self._other_food = set()
+        for pos in food:
+            self.add(tuple(pos))
+
+    def _food_set_of(self, position):
+        x = position[0]
+        for zone, zone_food in zip(self.zones, self._zone_food):
+            if zone[0] <= x <= zone[1]:
+                return zone_food
+        return self._other_food
+
+    def __contains__(self, position):
+        return position in self._food
+
+    def __iter__(self):
+        return iter(self._food)
+
+    def __len__(self):
+        return len(self._food)
+
+    def add(self, position):
+        if position not in self._food:
+            self._food.add(position)
+            self._food_set_of(position).add(position)
+
+    def discard(self, position):
+        if position in self._food:
+            self._food.remove(position)
+            self._food_set_of(position).remove(position)
+
+    def in_zone(self, zone_index):
+        """ Food within a zone.
+
+        Returns
+        -------
+        zone_food : list of tuple of (int, int)
+            the positions of the food in the zone, in row-major order
+
+        """
+        return sorted(self._zone_food[zone_index], key=_row_major)
+
+    def outside_zone(self, zone_index):
+        """ Food outside of a zone.
+
+        Returns
+        -------
+        other_food : list of tuple of (int, int)
+            the positions of the food outside of the zone, in row-major order
+
+        """
+        other_food = []
+        for idx, zone_food in enumerate(self._zone_food):
+            if idx != zone_index:
+                other_food.extend(zone_food)
+        other_food.extend(self._other_food)
+        other_food.sort(key=_row_major)
+        return other_food
+
+    def count_in_zone(self, zone_index):
+        """ The number of food items within a zone. """
+        return len(self._zone_food[zone_index])
+
+    def count_outside_zone(self, zone_index):
+        """ The number of food items outside of a zone. """
+        return len(self._food) - len(self._zone_food[zone_index])
+
+    def copy(self):
+        """ A copy of this index. """
+        food_copy = type(self).__new__(type(self))
+        food_copy.zones = self.zones
+        food_copy._food = set(self._food)
+        food_copy._zone_food = [set(zone_food) for zone_food in self._zone_food]
+        food_copy._other_food = set(self._other_food)
+        return food_copy
+
+    def __repr__(self):
+        return 'FoodIndex(%r, %r)' % (self._food, self.zones)
+
+
 class UniverseException(Exception):
     """ Standard error in the Universe. """
     pass
@@ -288,9 +511,28 @@ class CTFUniverse:
     ----------
     bot_positions : list of tuple of ints (x, y), property
         the current position of all bots
+    food : FoodIndex, property
+        the positions of all edible food, indexed by the team zones
     food_list : list of tuple of ints (x, y), property
         the positions of all edible food
 
+    bot_to_move : int, property
+        the index of the bot which moves next
+    state_hash : int, property
+        the Zobrist hash of the bot positions, the food and the bot to move
+
+    Notes
+    -----
+    Copies of a universe share their food until it is changed: The maze
+    is always shared and treated as immutable. The food is copied as soon
+    as it is changed in `move_bot` or accessed through the public `food`
+    attribute. The teams and the bots are cheap and are copied right
+    away, so that a universe always keeps its own `Bot` objects.
+
+    The `state_hash` is updated incrementally by `move_bot`, `apply_move`
+    and `undo`. Changing the bots or the food in place by other means
+    leaves it stale; assigning to `bots` or `food` resets it.
+
     """
 
     @classmethod
@@ -344,17 +586,131 @@ def create(cls, layout_str, number_bots):
         return cls(maze, food, teams, bots)
 
     #: All possible (but not necessarily legal) moves
-    _moves = [north, south, east, west, stop]
+    _moves = moves
 
     #: the number of points to score when killing
     KILLPOINTS = 5
 
+    # flags for the state which is shared with a copy of the universe
+    _food_shared = False
+
+    # the Zobrist hash of the state (None until it is needed)
+    # and the index of the bot which moves next
+    _state_hash = None
+    _bot_to_move = 0
+
     def __init__(self, maze, food, teams, bots):
         self.maze = maze
-        self.food = set(tuple(f) for f in food)
         self.teams = teams
+        self.food = food
         self.bots = bots
 
+    @property
+    def food(self):
+        """ The food in the universe.
+
+        Returns
+        -------
+        food : FoodIndex
+            the set of food positions, indexed by the team zones
+
+        """
+        if self._food_shared:
+            self._food_index = self._food_index.copy()
+            self._food_shared = False
+        return self._food_index
+
+    @food.setter
+    def food(self, food):
+        self._food_index = FoodIndex(food, [team.zone for team in self._teams])
+        self._food_shared = False
+        self._state_hash = None
+
+    @property
+    def _food_view(self):
+        # the food without unsharing it; must not be changed
+        return self._food_index
+
+    @property
+    def teams(self):
+        return self._teams
+
+    @teams.setter
+    def teams(self, teams):
+        self._teams = teams
+
+    @property
+    def bots(self):
+        return self._bots
+
+    @bots.setter
+    def bots(self, bots):
+        self._bots = bots
+        self._state_hash = None
+
+    @property
+    def state_hash(self):
+        """ The Zobrist hash of the current state.
+
+        The hash covers the positions of the bots, the remaining food and
+        the bot which has to move next. Equal states have equal hashes, so
+        it can be used as a key for transposition tables.
+
+        Returns
+        -------
+        state_hash : int
+            a 64 bit hash of the state
+
+        """
+        if self._state_hash is None:
+            keys = self._zobrist_keys()
+            width = self.maze.width
+            state_hash = keys.to_move[self._bot_to_move]
+            for bot_index, (x, y) in enumerate(self.bot_positions):
+                state_hash ^= keys.bots[bot_index][x + y * width]
+            for x, y in self._food_view:
+                state_hash ^= keys.food[x + y * width]
+            self._state_hash = state_hash
+        return self._state_hash
+
+    @property
+    def bot_to_move(self):
+        """ The index of the bot which moves next.
+
+        `move_bot` and `apply_move` advance it to the following bot.
+        Setting it updates the `state_hash`.
+        """
+        return self._bot_to_move
+
+    @bot_to_move.setter
+    def bot_to_move(self, bot_index):
+        if self._state_hash is not None:
+            to_move = self._zobrist_keys().to_move
+            self._state_hash ^= to_move[self._bot_to_move] ^ to_move[bot_index]
+        self._bot_to_move = bot_index
+
+    def _zobrist_keys(self):
+        return _zobrist_keys(self.maze.width, self.maze.height, len(self._bots))
+
+    def _update_state_hash(self, bot_id, old_pos, new_pos, food_eaten, destroyed):
+        """ Updates the state hash and the bot to move after a move. """
+        next_bot = (bot_id + 1) % len(self._bots)
+        state_hash = self._state_hash
+        if state_hash is not None:
+            keys = self._zobrist_keys()
+            width = self.maze.width
+            new_cell = new_pos[0] + new_pos[1] * width
+            state_hash ^= keys.to_move[self._bot_to_move] ^ keys.to_move[next_bot]
+            state_hash ^= (keys.bots[bot_id][old_pos[0] + old_pos[1] * width] ^
+                           keys.bots[bot_id][new_cell])
+            if food_eaten:
+                state_hash ^= keys.food[new_cell]
+            for harvester, _destroyer in destroyed:
+                x, y = self._bots[harvester].initial_pos
+                state_hash ^= keys.bots[harvester][new_cell] ^ keys.bots[harvester][x + y * width]
+            self._state_hash = state_hash
+        self._bot_to_move = next_bot
+
     @property
     def bot_positions(self):
         """ Current positions of all bots.
@@ -364,7 +720,7 @@ def bot_positions(self):
         bot_positions : list of tuple of (int, int)
             the positions of all bots
         """
-        return [bot.current_pos for bot in self.bots]
+        return [bot.current_pos for bot in self._bots]
 
     @property
     def food_list(self):
@@ -376,7 +732,7 @@ def food_list(self):
             the positions of all food
 
         """
-        return self.food
+        return self._food_view
 
     def team_food(self, team_index):
         """ Food that is owned by a team
@@ -387,8 +743,18 @@ def team_food(self, team_index):
             food owned by team
 
         """
-        return [pos for pos in self.food_list
-                if self.teams[team_index].in_zone(pos)]
+        return self._food_view.in_zone(team_index)
+
+    def team_food_count(self, team_index):
+        """ Number of food items owned by a team
+
+        Returns
+        -------
+        team_food_count : int
+            number of food items owned by team
+
+        """
+        return self._food_view.count_in_zone(team_index)
 
     def enemy_food(self, team_index):
         """ Food that is edible by a team
@@ -399,8 +765,18 @@ def enemy_food(self, team_index):
             food edible by team
 
         """
-        return [pos for pos in self.food_list
-                if not self.teams[team_index].in_zone(pos)]
+        return self._food_view.outside_zone(team_index)
+
+    def enemy_food_count(self, team_index):
+        """ Number of food items edible by a team
+
+        Returns
+        -------
+        enemy_food_count : int
+            number of food items edible by team
+
+        """
+        return self._food_view.count_outside_zone(team_index)
 
     def other_team_bots(self, bot_index):
         """ Obtain other bots on team.
@@ -416,7 +792,7 @@ def other_team_bots(self, bot_index):
             the other bots on the team, excluding the desired bot
 
         """
-        team_index = self.bots[bot_index].team_index
+        team_index = self._bots[bot_index].team_index
         return [bot for bot in self.team_bots(team_index)
                 if not bot.index == bot_index]
 
@@ -433,7 +809,7 @@ def team_bots(self, team_index):
         team_bots : list of Bot objects
 
         """
-        return [bot for bot in self.bots
+        return [bot for bot in self._bots
                 if bot.team_index == team_index]
 
     def enemy_bots(self, team_index):
@@ -449,7 +825,7 @@ def enemy_bots(self, team_index):
         enemy_bots : list of Bot objects
 
         """
-        return [bot for bot in self.bots
+        return [bot for bot in self._bots
                 if not bot.team_index == team_index]
 
     def enemy_team(self, team_index):
@@ -469,8 +845,8 @@ def enemy_team(self, team_index):
         UniverseException
             if there is more than one enemy team
         """
-        other_teams = self.teams[:]
-        other_teams.remove(self.teams[team_index])
+        other_teams = self._teams[:]
+        other_teams.remove(self._teams[team_index])
         if len(other_teams) != 1:
             raise UniverseException("Expecting one enemy team. Found %i." % len(other_teams))
         return other_teams[0]
@@ -492,15 +868,20 @@ def team_border(self, team_index):
 
         """
         x_min, x_max = 0, self.maze.shape[0]
-        team_zone = self.teams[team_index].zone
+        team_zone = self._teams[team_index].zone
         if team_zone[0] == x_min:
             border_x = team_zone[1]
         else:
             border_x = team_zone[0]
         return [(border_x, y) for y in range(self.maze.shape[1]) if not self.maze[border_x, y]]
 
-    def move_bot(self, bot_id, move):
-        """ Move a bot in certain direction.
+    def apply_move(self, bot_id, move):
+        """ Move a bot in certain direction and return how to undo it.
+
+        This is the low-level variant of `move_bot` for search algorithms
+        which explore many moves on the same universe: Instead of a
+        game_state, it returns a small undo token which `undo` takes to
+        restore the universe exactly to the state before the move.
 
         Parameters
         ----------
@@ -511,8 +892,11 @@ def move_bot(self, bot_id, move):
 
         Returns
         -------
-        game_state : dict
-            the current game_state
+        undo_token : tuple
+            the token to pass to `undo`. It is a tuple
+            (bot_id, old_pos, new_pos, food_eaten, destroyed, previous) where
+            destroyed is a tuple of (harvester, destroyer) bot indices and
+            previous holds the bot to move and the state hash before the move.
 
         Raises
         ------
@@ -520,32 +904,32 @@ def move_bot(self, bot_id, move):
             if the move is invalid or impossible
 
         """
+        bots = self.bots
+        bot = bots[bot_id]
+        old_pos = bot.current_pos
         # check legality of the move
-
-        game_state = {}
-
-        bot = self.bots[bot_id]
-        legal_moves_dict = self.legal_moves(bot.current_pos)
-        if move not in legal_moves_dict.keys():
+        try:
+            for legal_move, new_pos in self.maze.legal_moves_table[old_pos]:
+                if legal_move == move:
+                    break
+            else:
+                raise KeyError(move)
+        except (KeyError, TypeError):
             raise IllegalMoveException(
                 'Illegal move from bot_id %r: %s' % (bot_id, move))
-        old_pos = bot.current_pos
-        new_pos = bot.current_pos = legal_moves_dict[move]
+        bot.current_pos = new_pos
 
-        game_state["bot_moved"] = [{"bot_id": bot_id, "old_pos": old_pos, "new_pos": new_pos}]
-
-        team = self.teams[bot.team_index]
         # check for food being eaten
-        game_state["food_eaten"] = []
-        if bot.current_pos in self.food_list and not bot.in_own_zone:
-            self.food.remove(bot.current_pos)
-
-            game_state["food_eaten"] += [{"food_pos": bot.current_pos, "bot_id": bot_id}]
+        food_eaten = False
+        if new_pos in self._food_view and not bot.in_own_zone:
+            self.food.remove(new_pos)
+            self.teams[bot.team_index].score += 1
+            food_eaten = True
 
         # check for destruction
-        game_state["bot_destroyed"] = []
+        destroyed = ()
         for enemy in self.enemy_bots(bot.team_index):
-            if enemy.current_pos == bot.current_pos:
+            if enemy.current_pos == new_pos:
                 if enemy.is_destroyer and bot.is_harvester:
                     destroyer = enemy.index
                     harvester = bot.index
@@ -556,29 +940,84 @@ def move_bot(self, bot_id, move):
                     continue
 
                 # move on, if harvester is already destroyed
-                if any(bot_destr["bot_id"]==harvester for bot_destr in game_state["bot_destroyed"]):
+                if any(destroyed_bot == harvester for destroyed_bot, _ in destroyed):
                     continue
 
                 # otherwise mark for destruction
-                game_state["bot_destroyed"] += [{'bot_id': harvester, 'destroyed_by': destroyer}]
+                destroyed += ((harvester, destroyer),)
 
         # reset bots
-        for destroyed in game_state["bot_destroyed"]:
-            old_pos = bot.current_pos
-            self.bots[destroyed["bot_id"]]._to_initial()
-            new_pos = bot.current_pos
-            game_state["bot_moved"] += [{"bot_id": bot_id, "old_pos": old_pos, "new_pos": new_pos}]
+        for harvester, destroyer in destroyed:
+            bots[harvester]._to_initial()
+            self.teams[bots[destroyer].team_index].score += self.KILLPOINTS
 
-        for food_eaten in game_state["food_eaten"]:
-            self.teams[self.bots[food_eaten["bot_id"]].team_index].score += 1
+        previous = (self._bot_to_move, self._state_hash)
+        self._update_state_hash(bot_id, old_pos, new_pos, food_eaten, destroyed)
+        return (bot_id, old_pos, new_pos, food_eaten, destroyed, previous)
 
-        for bot_destroyed in game_state["bot_destroyed"]:
-            self.teams[self.bots[bot_destroyed["destroyed_by"]].team_index].score += self.KILLPOINTS
+    def undo(self, undo_token):
+        """ Undo a move which was done with `apply_move`.
 
-        return game_state
+        Moves must be undone in the reverse order in which they were applied.
+
+        Parameters
+        ----------
+        undo_token : tuple
+            the token returned by `apply_move`
 
-        # TODO:
-        # check for state change
+        """
+        bot_id, old_pos, new_pos, food_eaten, destroyed, previous = undo_token
+        bots = self.bots
+        for harvester, destroyer in destroyed:
+            bots[harvester].current_pos = new_pos
+            self.teams[bots[destroyer].team_index].score -= self.KILLPOINTS
+        if food_eaten:
+            self.food.add(new_pos)
+            self.teams[bots[bot_id].team_index].score -= 1
+        bots[bot_id].current_pos = old_pos
+        self._bot_to_move, self._state_hash = previous
+
+    def move_bot(self, bot_id, move):
+        """ Move a bot in certain direction.
+
+        Parameters
+        ----------
+        bot_id : int
+            index of the bot
+        move : tuple of (int, int)
+            direction to move in
+
+        Returns
+        -------
+        game_state : dict
+            the current game_state
+
+        Raises
+        ------
+        IllegalMoveException
+            if the move is invalid or impossible
+
+        """
+        _, old_pos, new_pos, food_eaten, destroyed, _ = self.apply_move(bot_id, move)
+
+        game_state = {}
+        game_state["bot_moved"] = [{"bot_id": bot_id, "old_pos": old_pos, "new_pos": new_pos}]
+        game_state["food_eaten"] = []
+        if food_eaten:
+            game_state["food_eaten"] += [{"food_pos": new_pos, "bot_id": bot_id}]
+        game_state["bot_destroyed"] = [{'bot_id': harvester, 'destroyed_by': destroyer}
+                                       for harvester, destroyer in destroyed]
+
+        # the position of the moving bot, as the destroyed bots are reset
+        # one after the other
+        pos = new_pos
+        for harvester, _destroyer in destroyed:
+            old_pos = pos
+            if harvester == bot_id:
+                pos = self._bots[bot_id].initial_pos
+            game_state["bot_moved"] += [{"bot_id": bot_id, "old_pos": old_pos, "new_pos": pos}]
+
+        return game_state
 
     def legal_moves(self, position):
         """ Obtain legal moves and where they lead.
@@ -594,14 +1033,16 @@ def legal_moves(self, position):
             the legal moves and where they would lead.
 
         """
+        try:
+            return dict(self.maze.legal_moves_table[position])
+        except (KeyError, TypeError):
+            # Positions outside of the maze (or given as a list)
+            # are not in the table.
+            pass
         legal_moves_dict = {}
         for move, new_pos in self.neighbourhood(position).items():
-            try:
-                if not self.maze[new_pos]:
-                    legal_moves_dict[move] = new_pos
-            except IndexError:
-                # If we’re outside the maze, it is not a legal move.
-                pass
+            if not self.maze[new_pos]:
+                legal_moves_dict[move] = new_pos
         return legal_moves_dict
 
     def legal_moves_or_stop(self, position):
@@ -626,10 +1067,14 @@ def legal_moves_or_stop(self, position):
 
     def __repr__(self):
         return ("CTFUniverse(%r, %r, %r, %r)" %
-            (self.maze, self.food, self.teams, self.bots))
+            (self.maze, set(self._food_view), self._teams, self._bots))
 
     def __eq__(self, other):
-        return type(self) == type(other) and self.__dict__ == other.__dict__
+        return (type(self) == type(other) and
+                self.maze == other.maze and
+                self._food_view == other._food_view and
+                self._teams == other._teams and
+                self._bots == other._bots)
 
     def __ne__(self, other):
         return not (self == other)
@@ -637,14 +1082,15 @@ def __ne__(self, other):
     @property
     def _char_mesh(self):
         char_mesh = Mesh(self.maze.width, self.maze.height)
+        food = self._food_view
         for pos in self.maze.positions:
             if self.maze[pos]:
                 char_mesh[pos] = Wall
-            elif pos in self.food:
+            elif pos in food:
                 char_mesh[pos] = Food
             else:
                 char_mesh[pos] = Free
-        for bot in self.bots:
+        for bot in self._bots:
             # TODO what about bots on the same space?
             char_mesh[bot.current_pos] = str(bot.index)
         return char_mesh
@@ -653,7 +1099,22 @@ def __str__(self):
         return str(self._char_mesh)
 
     def copy(self):
-        return self._from_json_dict(self._to_json_dict())
+        """ Copies this universe.
+
+        The copy shares the maze with this universe. The food is shared
+        as well, until either universe changes it.
+
+        Returns
+        -------
+        universe : CTFUniverse
+            a copy of this universe
+
+        """
+        self._food_shared = True
+        universe = copy.copy(self)
+        universe._teams = [copy.copy(team) for team in self._teams]
+        universe._bots = [copy.copy(bot) for bot in self._bots]
+        return universe
 
     @property
     def compact_str(self):
@@ -686,7 +1147,7 @@ def pretty(self):
         """
         out = str()
         out += self.compact_str
-        for team in self.teams:
+        for team in self._teams:
             out += repr(team)
             out += '\n'
             for bot in self.team_bots(team.index):
@@ -741,20 +1202,23 @@ def free_positions(self):
         # Get the list of all free positions.
         free_pos = [pos for pos, val in self.maze.items() if not val]
 
-        # Here we use a generator on a dictionary to create the adjacency list.
-        # However, for Python 3, we force evaluation on the legal_moves.values
-        return ((pos, list(self.legal_moves(pos).values())) for pos in free_pos)
+        # The adjacencies are read from the legal moves table of the maze.
+        table = self.maze.legal_moves_table
+        return ((pos, [new_pos for _move, new_pos in table[pos]]) for pos in free_pos)
 
 
     def _to_json_dict(self):
         return {"maze": self.maze._to_json_dict(),
-                "food": list(self.food),
-                "teams": [team._to_json_dict() for team in self.teams],
-                "bots": [bot._to_json_dict() for bot in self.bots]}
+                "food": list(self._food_view),
+                "teams": [team._to_json_dict() for team in self._teams],
+                "bots": [bot._to_json_dict() for bot in self._bots],
+                "bot_to_move": self._bot_to_move}
 
     @classmethod
     def _from_json_dict(cls, item):
-        return cls(maze=Maze._from_json_dict(item["maze"]),
-                   food=item["food"],
-                   teams=[Team._from_json_dict(team) for team in item["teams"]],
-                   bots=[Bot._from_json_dict(bot) for bot in item["bots"]])
+        universe = cls(maze=Maze._from_json_dict(item["maze"]),
+                       food=item["food"],
+                       teams=[Team._from_json_dict(team) for team in item["teams"]],
+                       bots=[Bot._from_json_dict(bot) for bot in item["bots"]])
+        universe.bot_to_move = item.get("bot_to_move", 0)
+        return universe
@@ -1,14 +1,16 @@
 """ The controller """
 
 import abc
+from collections import namedtuple
+import functools
 import random
 import sys
 import time
+import types
 import uuid
 from warnings import warn
 
 from . import datamodel
-from .datamodel import Bot, CTFUniverse
 from .graph import Graph, NoPathException, manhattan_dist
 
 
@@ -25,6 +27,10 @@ class NoFoodWarning(Warning):
     """ Warning about a layout with no food. """
     pass
 
+#: A call of `action` with `args` on the team with index `team_id`,
+#: which the GameMaster needs an answer for.
+TeamRequest = namedtuple("TeamRequest", ["team_id", "action", "args"])
+
 class GameMaster:
     """ Controller of player moves and universe updates.
 
@@ -44,8 +50,13 @@ class GameMaster:
         the total permitted number of rounds
     noise : boolean
         should enemy positions be noisy
+    noiser : subclass of UniverseNoiser or str, optional
+        the noiser to use or its name in `NOISERS`. Default: `ManhattanNoiser`
     seed : int, optional
         seed which initialises the internal random number generator
+    universe_class : subclass of CTFUniverse, optional
+        the universe implementation to use, e.g. `CompactUniverse`
+        for headless simulations. Default: `CTFUniverse`
 
     Attributes
     ----------
@@ -61,8 +72,12 @@ class GameMaster:
     """
     def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=None,
                  max_timeouts=5, timeout_length=3, layout_name=None,
-                 seed=None):
-        self.universe = datamodel.CTFUniverse.create(layout, number_bots)
+                 seed=None, universe_class=None):
+        if universe_class is None:
+            universe_class = datamodel.CTFUniverse
+        self._universe_class = universe_class
+        self._layout = layout
+        self.universe = _new_universe(universe_class, layout, number_bots)
         self.number_bots = number_bots
 
         if not len(teams) == len(self.universe.teams):
@@ -71,6 +86,9 @@ def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=Non
 
         if noiser is None:
             noiser = ManhattanNoiser
+        elif isinstance(noiser, str):
+            noiser = NOISERS[noiser]
+        self._noiser_class = noiser if noise else None
         self.noiser = noiser(self.universe, seed=seed) if noise else None
 
         self.viewers = []
@@ -83,10 +101,60 @@ def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=Non
         # Currently, the noiser does not use this rng but has its own.
         self.rnd = random.Random(seed)
 
+        self.game_state = {}
+        self._init_game_state(game_time=game_time,
+                              max_timeouts=max_timeouts,
+                              timeout_length=timeout_length,
+                              layout_name=layout_name)
+
+    def reset(self, seed=None, layout=None, layout_name=None):
+        """ Prepares this GameMaster for a new game with the same teams.
+
+        The universe is set back to the initial state of the layout and
+        `game_state` is reset in place. The game time, the timeout settings,
+        the teams and the viewers are kept. The parsed layout and, unless
+        the layout changes, the noiser are reused, so that starting another
+        game is cheap. The teams are set up again by `set_initial`, they
+        need to forget about the previous game there.
+
+        Parameters
+        ----------
+        seed : int, optional
+            seed which initialises the internal random number generators
+        layout : string, optional
+            the layout of the new game. Default: the current layout
+        layout_name : string, optional
+            the name of the new layout. Default: the current name if the
+            layout does not change
+
+        """
+        if layout is None or layout == self._layout:
+            layout = self._layout
+            if layout_name is None:
+                layout_name = self.game_state["layout_name"]
+        self.universe = _new_universe(self._universe_class, layout, self.number_bots)
+
+        if self.noiser and layout != self._layout:
+            self.noiser = self._noiser_class(self.universe, noise_radius=self.noiser.noise_radius,
+                                             sight_distance=self.noiser.sight_distance, seed=seed)
+        elif self.noiser:
+            self.noiser.rnd.seed(seed)
+        self._layout = layout
+
+        self.rnd.seed(seed)
+
+        self._init_game_state(game_time=self.game_state["game_time"],
+                              max_timeouts=self.game_state["max_timeouts"],
+                              timeout_length=self.game_state["timeout_length"],
+                              layout_name=layout_name)
+
+    def _init_game_state(self, game_time, max_timeouts, timeout_length, layout_name):
+        """ Sets `game_state` (in place) to the state before the first round. """
         #: The pointer to the current iteration.
         self._step_iter = None
 
-        self.game_state = {
+        self.game_state.clear()
+        self.game_state.update({
             #: game uuid
             "game_uuid": str(uuid.uuid4()),
 
@@ -126,6 +194,10 @@ def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=Non
             #: [times_killed_team_0, times_killed_team_1]
             "times_killed": [0] * len(self.universe.teams),
 
+            #: [latency_histogram_team_0, latency_histogram_team_1]
+            #: the reply latencies of remote teams (None for local teams)
+            "team_latency": [None] * len(self.universe.teams),
+
             #: team.index of the team winning or None
             "team_wins": None,
 
@@ -145,7 +217,7 @@ def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=Non
             "food_count": [0] * len(self.universe.teams),
 
             #: [food_to_eat_team_0, food_to_eat_team_1]
-            "food_to_eat": [len(self.universe.enemy_food(team.index)) for team in self.universe.teams],
+            "food_to_eat": [self.universe.enemy_food_count(team.index) for team in self.universe.teams],
 
             #: time until timeout
             "timeout_length": timeout_length,
@@ -164,7 +236,7 @@ def __init__(self, layout, teams, number_bots, game_time, noise=True, noiser=Non
 
             #: sight distance of the noise
             "noise_sight_distance": self.noiser and self.noiser.sight_distance
-        }
+        })
 
         # Check that both teams have food, and raise a warning otherwise
         for (team_id, food_count) in enumerate(self.game_state["food_to_eat"]):
@@ -202,6 +274,49 @@ def set_initial(self):
         It notifies the PlayerTeams and the Viewers of the initial
         universes and tells the PlayerTeams what team_id they have.
         """
+        for _ in self._answer_requests(self._set_initial_requests()):
+            pass
+
+    def _answer_requests(self, requests):
+        """ Answers the `TeamRequest`s of the generator `requests` by
+        calling the teams. An exception of a team is thrown back into the
+        generator.
+
+        The generator may also yield None to give control to the caller.
+        This is passed on, so that the returned iterator yields once for
+        each None.
+        """
+        reply = error = None
+        while True:
+            try:
+                if error is not None:
+                    request = requests.throw(error)
+                else:
+                    request = requests.send(reply)
+            except StopIteration:
+                return
+            reply = error = None
+            if request is None:
+                yield
+                continue
+            team = self.player_teams[request.team_id]
+            try:
+                reply = getattr(team, request.action)(*request.args)
+            except Exception as e:
+                error = e
+
+    def _game_requests(self):
+        """ Plays the whole game and yields the `TeamRequest`s (and a None
+        after each step) on the way. See `_answer_requests`.
+        """
+        yield from self._set_initial_requests()
+        while not self.game_state.get("finished"):
+            try:
+                yield from self._play_bot_requests()
+            except GameFinished:
+                self.update_viewers()
+
+    def _set_initial_requests(self):
         if len(self.player_teams) != len(self.universe.teams):
             raise IndexError(
                 "Universe uses %i teams, but %i are registered."
@@ -220,10 +335,16 @@ def set_initial(self):
             team_seed = self.rnd.randint(0, sys.maxsize)
             team_state = dict({"seed": team_seed}, **self.game_state)
             try:
-                team_name = team.set_initial(team_id, self.universe, team_state)
+                team_name = yield TeamRequest(team_id, "set_initial", (team_id, self.universe, team_state))
                 self.game_state["team_name"][team_id] = team_name
             except PlayerTimeout:
                 pass
+            self._update_team_latency(team_id)
+
+    def _update_team_latency(self, team_id):
+        latency_histogram = getattr(self.player_teams[team_id], "latency_histogram", None)
+        if latency_histogram is not None:
+            self.game_state["team_latency"][team_id] = list(latency_histogram)
 
     # TODO the game winning detection should be refactored
     def play(self):
@@ -275,6 +396,9 @@ def play_step(self):
     def _play_bot_iterator(self):
         """ Returns an iterator which will query a bot at each step.
         """
+        return self._answer_requests(self._play_bot_requests())
+
+    def _play_bot_requests(self):
         self.prepare_next_round()
 
         if self.check_finished():
@@ -283,7 +407,7 @@ def _play_bot_iterator(self):
         for bot in self.universe.bots:
             start_time = time.monotonic()
 
-            self._play_bot(bot)
+            yield from self._play_bot(bot)
 
             end_time = time.monotonic()
             self.game_state["running_time"] += (end_time - start_time)
@@ -306,13 +430,14 @@ def _play_bot_iterator(self):
 
     def _play_bot(self, bot):
         self.game_state["bot_id"] = bot.index
+        # the previous bot may not have moved (eg. when it was disqualified)
+        self.universe.bot_to_move = bot.index
         self.game_state["bot_moved"] = []
         self.game_state["food_eaten"] = []
         self.game_state["bot_destroyed"] = []
         self.game_state["bot_timeout"] = None
         self.game_state["bot_error"] = {}
 
-        player_team = self.player_teams[bot.team_index]
         try:
             if self.noiser:
                 universe = self.noiser.uniform_noise(self.universe, bot.index)
@@ -321,7 +446,8 @@ def _play_bot(self, bot):
 
             team_time_begin = time.monotonic()
 
-            player_state = player_team.get_move(bot.index, universe, self.game_state)
+            player_state = yield TeamRequest(bot.team_index, "get_move",
+                                             (bot.index, universe, self.game_state))
             try:
                 # player_state may be None, if RemoteTeamPlayer could not
                 # properly convert it
@@ -362,6 +488,8 @@ def _play_bot(self, bot):
         except PlayerDisconnected:
             self.game_state["teams_disqualified"][bot.team_index] = "disconnected"
 
+        self._update_team_latency(bot.team_index)
+
         for food_eaten in self.game_state["food_eaten"]:
             team_id = self.universe.bots[food_eaten["bot_id"]].team_index
             self.game_state["food_count"][team_id] += 1
@@ -405,8 +533,8 @@ def check_finished(self):
                 self.game_state["finished"] = True
 
         # If one of the teams has eaten all the food, we finish immediately
-        for to_eat, eaten in zip(self.game_state["food_to_eat"], self.game_state["food_count"]):
-            if to_eat == eaten:
+        for team in self.universe.teams:
+            if self.universe.enemy_food_count(team.index) == 0:
                 self.game_state["finished"] = True
 
         if self.game_state["finished"]:
@@ -420,6 +548,112 @@ def check_finished(self):
 
         return self.game_state["finished"]
 
+class NoisyUniverse:
+    """ A view of a universe with noisy enemy positions.
+
+    The view overlays the noisy positions on the bots of the underlying
+    universe without cloning them. `_to_json_dict` writes the noisy
+    positions directly into the serialised universe. Everything else
+    (`bots`, `copy` and the other methods of `CTFUniverse`) is answered by
+    a copy-on-write copy of the underlying universe, which is only created
+    on first use: it shares the food with the underlying universe, and
+    only the bots are copied to apply the noisy positions. Like the
+    universes handed out before, it also shares the maze and the teams.
+
+    Parameters
+    ----------
+    universe : CTFUniverse
+        the universe to overlay
+    noisy_positions : dict of int to tuple of (int, int)
+        the noisy position of each bot which should be noisy
+
+    """
+    def __init__(self, universe, noisy_positions):
+        self._universe = universe
+        self._noisy_positions = noisy_positions
+        self._materialised = None
+
+    @property
+    def maze(self):
+        return self._universe.maze
+
+    def _materialise(self):
+        """ The noisy universe as a copy of the underlying universe. """
+        if self._materialised is None:
+            universe = self._universe
+            noisy = universe.copy()
+            noisy.teams = universe.teams
+            if self._noisy_positions:
+                bots = noisy.bots
+                for index, position in self._noisy_positions.items():
+                    bots[index].current_pos = position
+                    bots[index].noisy = True
+                noisy._state_hash = None
+            self._materialised = noisy
+        return self._materialised
+
+    def __getattr__(self, name):
+        # only called for the attributes which are not defined on the view
+        if name.startswith('__') or '_materialised' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self._materialise(), name)
+
+    def copy(self):
+        """ A copy of the noisy universe.
+
+        Returns
+        -------
+        universe : CTFUniverse
+            a copy of the noisy universe
+
+        """
+        return self._materialise().copy()
+
+    def _to_json_dict(self):
+        if self._materialised is not None:
+            return self._materialised._to_json_dict()
+        json_dict = self._universe._to_json_dict()
+        bots = json_dict["bots"]
+        for index, position in self._noisy_positions.items():
+            bots[index]["current_pos"] = position
+            bots[index]["noisy"] = True
+        return json_dict
+
+    def __eq__(self, other):
+        if isinstance(other, NoisyUniverse):
+            other = other._materialise()
+        return self._materialise() == other
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        return "NoisyUniverse(%r, %r)" % (self._universe, self._noisy_positions)
+
+    def __str__(self):
+        return str(self._materialise())
+
+
+@functools.lru_cache(maxsize=32)
+def _parsed_universe(universe_class, layout, number_bots):
+    """ The initial universe of a layout, which is only parsed once.
+
+    The universe is shared by all callers and must not be changed.
+    """
+    return universe_class.create(layout, number_bots)
+
+
+def _new_universe(universe_class, layout, number_bots):
+    """ A new universe in the initial state of a layout.
+
+    The universe is copied from the cached `_parsed_universe` and gets
+    its own maze, so that a game cannot change the walls of the next one.
+    """
+    universe = _parsed_universe(universe_class, layout, number_bots).copy()
+    universe.maze = universe.maze.copy()
+    return universe
+
+
 class UniverseNoiser(metaclass=abc.ABCMeta):
     """Abstract BaseClass to make bot positions noisy.
 
@@ -466,8 +700,9 @@ def uniform_noise(self, universe, bot_index):
         adds uniform noise in maze space to the enemy positions. If a position
         is noisy or not is indicated by the `noisy` attribute in the Bot class.
 
-        The method will modify the reference, therefore it is important to use a
-        copy of the universe as an argument.
+        The universe itself is not changed. The noisy positions are overlaid
+        on it by a `NoisyUniverse`, which must therefore only be used until the
+        universe changes.
 
         Parameters
         ----------
@@ -478,30 +713,23 @@ def uniform_noise(self, universe, bot_index):
 
         Returns
         -------
-        noisy_universe : CTFUniverse
+        noisy_universe : NoisyUniverse
             universe with noisy enemy positions
 
         """
-        # Prepare a copy of the universe with all bots cloned so that their position
-        # can be changed without altering the original universe.
-        universe_copy = CTFUniverse(maze=universe.maze,
-                                    food=universe.food,
-                                    teams=universe.teams,
-                                    bots=[Bot._from_json_dict(bot._to_json_dict()) for bot in universe.bots])
-        self.universe = universe_copy
-        current_bot = universe_copy.bots[bot_index]
-        enemy_bots = universe_copy.enemy_bots(current_bot.team_index)
-        for b in enemy_bots:
+        self.universe = universe
+        current_bot = universe.bots[bot_index]
+        noisy_positions = {}
+        for b in universe.enemy_bots(current_bot.team_index):
             # Check that the distance between this bot and the enemy is larger
             # than `sight_distance`.
             distance = self.distance(current_bot, b)
 
             if distance is None or distance > self.sight_distance:
                 # If so then alter the position of the enemy
-                b.current_pos = self.altered_pos(b.current_pos)
-                b.noisy = True
+                noisy_positions[b.index] = self.altered_pos(b.current_pos)
 
-        return universe_copy
+        return NoisyUniverse(universe, noisy_positions)
 
     @abc.abstractmethod
     def distance(self, bot, other_bot):
@@ -517,19 +745,52 @@ class ManhattanNoiser(UniverseNoiser):
     """Noiser in Manhattan space.
 
     It uses Manhattan distance. A bot distance of 1 in Manhattan space
-    could still be much further away in maze distance."""
+    could still be much further away in maze distance.
+
+    For each free position, the free positions within the noise radius
+    are computed once per layout. A noisy position is then a single random
+    choice among them, which has the same (uniform) distribution as
+    shuffling and probing all positions in the noise radius.
+
+    Parameters
+    ----------
+    seed_compatible : bool, optional, default: False
+        if True, the positions are drawn by shuffling all positions in the
+        noise radius, as in earlier versions. This consumes the random
+        numbers in the same way, so a given seed results in the same
+        noisy positions as before.
+
+    See `UniverseNoiser` for the other parameters.
+
+    """
+
+    def __init__(self, universe, noise_radius=5, sight_distance=5, seed=None,
+                 seed_compatible=False):
+        super().__init__(universe, noise_radius=noise_radius,
+                         sight_distance=sight_distance, seed=seed)
+        self.seed_compatible = seed_compatible
+        maze = universe.maze
+        self.noise_candidates = _manhattan_noise_candidates(maze.width, maze.height,
+                                                            bytes(maze._data), noise_radius)
 
     def distance(self, bot, other_bot):
         return manhattan_dist(bot.current_pos, other_bot.current_pos)
 
     def altered_pos(self, bot_pos):
+        if self.seed_compatible:
+            return self._shuffled_altered_pos(bot_pos)
+        try:
+            candidates = self.noise_candidates[bot_pos]
+        except KeyError:
+            # not a free position of the initial maze
+            return self._shuffled_altered_pos(bot_pos)
+        if not candidates:
+            return bot_pos
+        return self.rnd.choice(candidates)
+
+    def _shuffled_altered_pos(self, bot_pos):
         # get a list of possible positions
-        noise_radius = self.noise_radius
-        x_min, x_max = bot_pos[0] - noise_radius, bot_pos[0] + noise_radius
-        y_min, y_max = bot_pos[1] - noise_radius, bot_pos[1] + noise_radius
-        possible_positions = [(i,j) for i in range(x_min, x_max)
-                                    for j in range(y_min, y_max)
-                              if manhattan_dist((i,j), bot_pos) <= noise_radius]
+        possible_positions = _manhattan_square(bot_pos, self.noise_radius)
 
         # shuffle the list of positions
         self.rnd.shuffle(possible_positions)
@@ -542,3 +803,133 @@ def altered_pos(self, bot_pos):
                 pass
         # if we land here, no valid position has been found
         return bot_pos
+
+
+class MazeNoiser(UniverseNoiser):
+    """Noiser in maze space.
+
+    Both the sight distance and the noise radius are measured as the length
+    of the shortest path through the maze. A noisy bot is placed uniformly
+    on one of the positions which are at most `noise_radius` steps away.
+
+    The positions within sight and noise distance are computed with a
+    bounded breadth first search the first time they are needed for a
+    position and memoised afterwards, so that the cost per noisy bot is
+    constant after the first few rounds.
+
+    See `UniverseNoiser` for the parameters.
+
+    """
+
+    def __init__(self, universe, noise_radius=5, sight_distance=5, seed=None):
+        super().__init__(universe, noise_radius=noise_radius,
+                         sight_distance=sight_distance, seed=seed)
+        self._sight = {}
+        self._pos_within = {}
+
+    def distance(self, bot, other_bot):
+        """ The maze distance between two bots.
+
+        Returns
+        -------
+        distance : int or None
+            the maze distance or None if the bots are further apart than
+            `sight_distance` (or not connected at all)
+
+        """
+        try:
+            in_sight = self._sight[bot.current_pos]
+        except KeyError:
+            try:
+                in_sight = self.adjacency.bfs_distances(bot.current_pos,
+                                                        max_distance=self.sight_distance)
+            except NoPathException:
+                in_sight = {}
+            self._sight[bot.current_pos] = in_sight
+        return in_sight.get(other_bot.current_pos)
+
+    def pos_within(self, position):
+        """ The positions within `noise_radius` (inclusive) of `position`.
+
+        Returns
+        -------
+        pos_within : tuple of tuple of (int, int)
+            the sorted positions within the noise radius
+        """
+        try:
+            return self._pos_within[position]
+        except KeyError:
+            pass
+        try:
+            # Graph.pos_within is exclusive
+            positions = tuple(sorted(self.adjacency.pos_within(position, self.noise_radius + 1)))
+        except NoPathException:
+            positions = ()
+        self._pos_within[position] = positions
+        return positions
+
+    def altered_pos(self, bot_pos):
+        possible_positions = self.pos_within(bot_pos)
+        if not possible_positions:
+            return bot_pos
+        return self.rnd.choice(possible_positions)
+
+class CompatibleManhattanNoiser(ManhattanNoiser):
+    """ A `ManhattanNoiser` which always runs in `seed_compatible` mode,
+    so that games can be selected by name and replayed with the noisy
+    positions of earlier versions.
+    """
+    def __init__(self, universe, noise_radius=5, sight_distance=5, seed=None):
+        super().__init__(universe, noise_radius=noise_radius,
+                         sight_distance=sight_distance, seed=seed,
+                         seed_compatible=True)
+
+#: The noisers which can be selected by name
+NOISERS = {
+    "manhattan": ManhattanNoiser,
+    "manhattan-compat": CompatibleManhattanNoiser,
+    "maze": MazeNoiser,
+}
+
+
+def _manhattan_square(bot_pos, noise_radius):
+    """ The positions around `bot_pos` which are considered for noise. """
+    x_min, x_max = bot_pos[0] - noise_radius, bot_pos[0] + noise_radius
+    y_min, y_max = bot_pos[1] - noise_radius, bot_pos[1] + noise_radius
+    return [(i,j) for i in range(x_min, x_max)
+                  for j in range(y_min, y_max)
+            if manhattan_dist((i,j), bot_pos) <= noise_radius]
+
+@functools.lru_cache(maxsize=32)
+def _manhattan_noise_candidates(width, height, walls, noise_radius):
+    """ The free positions in the noise radius of every free position.
+
+    Parameters
+    ----------
+    width : int
+        the width of the maze
+    height : int
+        the height of the maze
+    walls : bytes
+        the walls (1) and free spaces (0) of the maze in row-based order
+    noise_radius : int
+        the noise radius
+
+    Returns
+    -------
+    noise_candidates : read-only mapping of tuple of (int, int) to tuple of tuple of (int, int)
+        for each free position, the free positions which `altered_pos`
+        chooses from
+
+    """
+    def is_free(pos):
+        x, y = pos
+        return 0 <= x < width and 0 <= y < height and not walls[x + y * width]
+
+    noise_candidates = {}
+    for y in range(height):
+        for x in range(width):
+            if is_free((x, y)):
+                noise_candidates[(x, y)] = tuple(pos for pos in _manhattan_square((x, y), noise_radius)
+                                                 if is_free(pos))
+    return types.MappingProxyType(noise_candidates)
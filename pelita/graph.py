@@ -1,7 +1,12 @@
 """ Basic graph module """
 
+import hashlib
 import heapq
-from collections import deque, UserDict
+import os
+from array import array
+from collections import OrderedDict, UserDict
+
+import numpy as np
 
 
 class NoPathException(Exception):
@@ -96,16 +101,70 @@ def iter_adjacencies(initial, adjacencies_for_pos):
         reached.add(pos)
         yield (pos, legal_moves)
 
+class CSRAdjacency:
+    """ Compressed sparse row (CSR) representation of an adjacency list.
+
+    Every position is identified by an integer index. Positions are indexed
+    in sorted order, so that comparing indices is equivalent to comparing
+    the positions. The neighbours of the position with index ``i`` are
+    ``neighbors[offsets[i]:offsets[i + 1]]``, in the order of the adjacency
+    list. Neighbours which are not themselves in the adjacency list are left out.
+
+    Parameters
+    ----------
+    adjacencies : mapping of tuple of (int, int) to iterable of tuple of (int, int)
+        the adjacency list, e.g. a `Graph`
+
+    Attributes
+    ----------
+    positions : list of tuple of (int, int)
+        the position of each index
+    index : dict of tuple of (int, int) to int
+        the index of each position
+    offsets : array of int
+        the start of the neighbours of each index in `neighbors`
+    neighbors : array of int
+        the indices of the neighbours of all positions
+    xs, ys : array of int
+        the coordinates of each index
+
+    """
+    def __init__(self, adjacencies):
+        self.positions = sorted(adjacencies.keys())
+        self.index = {pos: idx for idx, pos in enumerate(self.positions)}
+        self.offsets = array('i', [0])
+        self.neighbors = array('i')
+        for pos in self.positions:
+            self.neighbors.extend(self.index[neighbor] for neighbor in adjacencies[pos]
+                                  if neighbor in self.index)
+            self.offsets.append(len(self.neighbors))
+        self.xs = array('i', (pos[0] for pos in self.positions))
+        self.ys = array('i', (pos[1] for pos in self.positions))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def neighbors_of(self, idx):
+        """ The indices of the neighbours of index `idx`. """
+        return self.neighbors[self.offsets[idx]:self.offsets[idx + 1]]
+
+
 class Graph(UserDict):
     """ Adjacency list [1] representation of a Maze.
 
     The `Graph` is mostly a wrapper for a `dict`. Given a position,
     it returns the positions reachable from there.
 
+    The searches run on an integer-indexed `CSRAdjacency` of the graph,
+    which is built on first use and rebuilt after positions have been
+    added, changed or removed. (Changing a neighbour list in place is not
+    detected.)
+
     [1] http://en.wikipedia.org/wiki/Adjacency_list
 
     """
     def __init__(self, *args):
+        self._csr = None
         super().__init__()
         if len(args) == 1:
             adjacencies = args[0]
@@ -130,6 +189,21 @@ def __copy__(self):
         # return a Graph instance
         return self.__class__(self.data)
 
+    def __setitem__(self, key, item):
+        self._csr = None
+        super().__setitem__(key, item)
+
+    def __delitem__(self, key):
+        self._csr = None
+        super().__delitem__(key)
+
+    @property
+    def csr(self):
+        """ The `CSRAdjacency` of this graph. """
+        if self._csr is None:
+            self._csr = CSRAdjacency(self.data)
+        return self._csr
+
     def pos_within(self, position, distance):
         """ Positions within a certain distance.
 
@@ -157,20 +231,30 @@ def pos_within(self, position, distance):
 
         """
         self._check_pos_exist([position])
-        positions = set([position])
-        to_visit = [position]
-        for i in range(distance):
-            local_to_visit = []
-            for pos in to_visit:
-                if pos not in positions:
-                    positions.add(pos)
-                local_to_visit.extend(self[pos])
-            to_visit = local_to_visit
-        return positions
+        csr = self.csr
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        start = csr.index[position]
+        seen = {start}
+        frontier = [start]
+        # the positions up to distance - 1 steps away
+        for _step in range(distance - 1):
+            next_frontier = []
+            for idx in frontier:
+                for neighbor in neighbors[offsets[idx]:offsets[idx + 1]]:
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        positions = csr.positions
+        return set(positions[idx] for idx in seen)
 
     def _check_pos_exist(self, positions):
+        data = self.data
         for pos in positions:
-            if pos not in self.keys():
+            if pos not in data:
                 raise NoPathException("Position %s does not exist in adjacency list." %
                         repr(pos))
 
@@ -204,50 +288,139 @@ def bfs(self, initial, targets):
 
         """
         # First check that the arguments were valid.
-        self._check_pos_exist([initial] + targets)
-        # Initialise `to_visit` of type `deque` with current position.
-        # We use a `deque` since we need to extend to the right
-        # but pop from the left, i.e. its a fifo queue.
-        to_visit = deque([initial])
-        # `seen` is a list of nodes we have seen already
-        # We append to right and later pop from right, so a list will do.
-        # Order is important for the back-track later on, so don't use a set.
-        seen = []
-        found = False
-        while to_visit:
-            current = to_visit.popleft()
-            if current in seen:
-                # This node has been seen, ignore it.
-                continue
-            elif current in targets:
-                # We found some food, break and back-track path.
-                found = True
-                break
-            else:
-                # Otherwise keep going, i.e. add adjacent nodes to seen list.
-                seen.append(current)
-                to_visit.extend(self[current])
+        targets = set(targets)
+        self._check_pos_exist([initial])
+        self._check_pos_exist(targets)
+        if initial in targets:
+            return []
+        csr = self.csr
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        positions = csr.positions
+        target_idxs = set(csr.index[target] for target in targets)
+        # `order` holds the nodes in the order in which they were discovered
+        # and doubles as the fifo queue of nodes to expand.
+        # `discovered` maps each node to its position in `order` (or -1).
+        initial_idx = csr.index[initial]
+        order = [initial_idx]
+        discovered = [-1] * len(csr)
+        discovered[initial_idx] = 0
+        current = None
+        next_idx = 0
+        while next_idx < len(order) and current is None:
+            node = order[next_idx]
+            for neighbor in neighbors[offsets[node]:offsets[node + 1]]:
+                if discovered[neighbor] != -1:
+                    continue
+                if neighbor in target_idxs:
+                    # The first target to be discovered is the closest one.
+                    current = neighbor
+                    break
+                discovered[neighbor] = len(order)
+                order.append(neighbor)
+            next_idx += 1
         # if we did not find any of the targets, raise an Exception
-        if not found:
+        if current is None:
             raise NoPathException("BFS: No path from %r to %r."
                     % (initial, targets))
-        # Now back-track using seen to determine how we got here.
-        # Initialise the path with current node, i.e. position of food.
-        path = [current]
-        while seen:
-            # Pop the latest node in seen
-            next_ = seen.pop()
-            # If that's adjacent to the current node
-            # it's in the path
-            if next_ in self[current]:
-                # So add it to the path
-                path.append(next_)
-                # And continue back-tracking from there
-                current = next_
+        # Now back-track to determine how we got here. From each node, we go
+        # to the adjacent node which was discovered last before it.
+        # (The target has not been added to `order`, so all nodes qualify.)
+        path = [positions[current]]
+        current_idx = len(order)
+        while current_idx > 0:
+            best = -1
+            for neighbor in neighbors[offsets[current]:offsets[current + 1]]:
+                neighbor_idx = discovered[neighbor]
+                if best < neighbor_idx < current_idx:
+                    best = neighbor_idx
+            current_idx = best
+            current = order[current_idx]
+            path.append(positions[current])
         # The last element is the current position, we don't need that in our
         # path, so don't include it.
         return path[:-1]
 
+    def bfs_distances(self, initial, targets=None, max_distance=None):
+        """ Distances from one position to many targets in a single search.
+
+        Parameters
+        ----------
+        initial : tuple of (int, int)
+            the first position
+        targets : iterable of tuple of (int, int), optional
+            the target positions. Default: all positions
+        max_distance : int, optional
+            stop the search at this distance. Targets which are further
+            away are treated as unreachable.
+
+        Returns
+        -------
+        distances : dict of tuple of (int, int) to int
+            the distance from `initial` to each reachable target.
+            Unreachable targets are missing from the dict.
+
+        Raises
+        ------
+        NoPathException
+            if either `initial` or `targets` does not exist
+
+        """
+        self._check_pos_exist([initial])
+        if targets is not None:
+            targets = set(targets)
+            self._check_pos_exist(targets)
+            remaining = len(targets)
+        distances = {initial: 0}
+        found = {}
+        frontier = [initial]
+        dist = 0
+        while frontier:
+            if targets is not None:
+                for pos in frontier:
+                    if pos in targets:
+                        found[pos] = dist
+                        remaining -= 1
+                if not remaining:
+                    # all targets found; stop early
+                    break
+            if max_distance is not None and dist >= max_distance:
+                break
+            dist += 1
+            next_frontier = []
+            for pos in frontier:
+                for neighbor in self[pos]:
+                    if neighbor not in distances:
+                        distances[neighbor] = dist
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        if targets is None:
+            return distances
+        return found
+
+    def distance_field(self, sources):
+        """ Distances from every position to the closest of `sources`.
+
+        See `DistanceField`.
+
+        Parameters
+        ----------
+        sources : iterable of tuple of (int, int)
+            the source positions, e.g. the enemy food
+
+        Returns
+        -------
+        distance_field : DistanceField
+            the distances to the closest source
+
+        Raises
+        ------
+        NoPathException
+            if one of `sources` does not exist
+
+        """
+        return DistanceField(self, sources)
+
     def a_star(self, initial, target):
         """ A* search.
 
@@ -281,31 +454,41 @@ def a_star(self, initial, target):
         # First check that the arguments were valid.
         self._check_pos_exist([initial, target])
 
-        # Initialize the dicts that help us keep track
-        came_from = {}
-        cost_so_far = {}
-        came_from[initial] = None
-        cost_so_far[initial] = 0
+        csr = self.csr
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        xs = csr.xs
+        ys = csr.ys
+        initial_idx = csr.index[initial]
+        target_idx = csr.index[target]
+        target_x, target_y = target
+
+        # Initialize the lists that help us keep track
+        came_from = [-1] * len(csr)
+        cost_so_far = [-1] * len(csr)
+        cost_so_far[initial_idx] = 0
 
         # Since it’s A* we use a heap queue to ensure that we always get the next node
         # with to lowest *guesstimated* distance to the current node.
+        # (The indices are sorted like the positions, so ties are broken as before.)
         to_visit = []
-        heapq.heappush(to_visit, (0, initial))
+        heapq.heappush(to_visit, (0, initial_idx))
 
         while to_visit:
             old_prio, current = heapq.heappop(to_visit)
 
-            if current == target:
+            if current == target_idx:
                 break
 
-            for next in self[current]:
-                new_cost = cost_so_far[current] + 1 # 1 is the cost to the neighbor
-                if next not in cost_so_far or new_cost < cost_so_far[next]:  # only choose unvisited and ‘worthy’ nodes
+            new_cost = cost_so_far[current] + 1 # 1 is the cost to the neighbor
+            for next in neighbors[offsets[current]:offsets[current + 1]]:
+                next_cost = cost_so_far[next]
+                if next_cost == -1 or new_cost < next_cost:  # only choose unvisited and ‘worthy’ nodes
                     cost_so_far[next] = new_cost
                     came_from[next] = current
 
                     # Add the node with an estimated distance to the heap
-                    priority = new_cost + manhattan_dist(target, next)
+                    priority = new_cost + abs(target_x - xs[next]) + abs(target_y - ys[next])
                     heapq.heappush(to_visit, (priority, next))
         else:
             # no target found
@@ -313,12 +496,341 @@ def a_star(self, initial, target):
 
         # Now back-track using seen to determine how we got here.
         # Initialise the path with current node, i.e. position of food.
-        current = target
-        path = [current]
-        while current != initial:
+        positions = csr.positions
+        current = target_idx
+        path = [target]
+        while current != initial_idx:
             current = came_from[current]
-            path.append(current)
+            path.append(positions[current])
         # The last element is the current position, we don’t need that in our
         # path, so don’t include it.
         return path[:-1]
 
+
+class DistanceField:
+    """ Distances from every position of a `Graph` to a set of sources.
+
+    The distances are computed with a single breadth first search which
+    starts from all sources at once, so the distance of a position is the
+    distance to the closest source. Following `next_step` from any position
+    leads along a shortest path to the closest source.
+
+    A field only depends on the graph and the sources. It can therefore be
+    computed once per turn (e.g. for the enemy food or the border) and be
+    shared by all bots of a team.
+
+    Parameters
+    ----------
+    graph : Graph
+        the adjacency list
+    sources : iterable of tuple of (int, int)
+        the source positions
+
+    Attributes
+    ----------
+    distances : dict of tuple of (int, int) to int
+        the distance of each position to its closest source. Positions from
+        which no source can be reached are missing.
+
+    Raises
+    ------
+    NoPathException
+        if one of `sources` does not exist in the graph
+
+    """
+    def __init__(self, graph, sources):
+        self.graph = graph
+        frontier = list(dict.fromkeys(sources))
+        graph._check_pos_exist(frontier)
+        distances = dict.fromkeys(frontier, 0)
+        dist = 0
+        while frontier:
+            dist += 1
+            next_frontier = []
+            for pos in frontier:
+                for neighbor in graph[pos]:
+                    if neighbor not in distances:
+                        distances[neighbor] = dist
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        self.distances = distances
+
+    def distance(self, position):
+        """ The distance from `position` to the closest source.
+
+        Raises
+        ------
+        NoPathException
+            if no source can be reached from `position`
+
+        """
+        try:
+            return self.distances[position]
+        except KeyError:
+            raise NoPathException("DistanceField: No path from %r to any source." % (position,))
+
+    def next_step(self, position):
+        """ The next step from `position` towards the closest source.
+
+        Returns
+        -------
+        next_step : tuple of (int, int)
+            the neighbour of `position` which is closer to a source, or
+            `position` itself if it is a source
+
+        Raises
+        ------
+        NoPathException
+            if no source can be reached from `position`
+
+        """
+        dist = self.distance(position)
+        if dist == 0:
+            return position
+        distances = self.distances
+        for neighbor in self.graph[position]:
+            if distances.get(neighbor) == dist - 1:
+                return neighbor
+
+    def path(self, position):
+        """ A shortest path from `position` to the closest source.
+
+        Returns
+        -------
+        path : list of tuple of (int, int)
+            the path from `position` to the closest source (excluding
+            `position` itself), in the same order as the paths of `Graph.bfs`,
+            i.e. the next step is the last element
+
+        Raises
+        ------
+        NoPathException
+            if no source can be reached from `position`
+
+        """
+        path = []
+        current = position
+        while self.distance(current) > 0:
+            current = self.next_step(current)
+            path.append(current)
+        return path[::-1]
+
+
+class DistanceMatrix:
+    """ All-pairs shortest path distances in a `Graph`.
+
+    The distances are computed once with a breadth first search from every
+    position of the graph and stored in a compact `uint16` array, so that
+    `distance` and `next_step` are constant time lookups. As the matrix only
+    depends on the maze, it can be shared by all bots and all games on the
+    same layout. Use `DistanceMatrix.cached` to reuse it in memory and
+    optionally on disk.
+
+    Parameters
+    ----------
+    graph : Graph
+        the adjacency list to compute the distances for
+
+    Attributes
+    ----------
+    positions : list of tuple of (int, int)
+        the positions in the graph, in the order of the matrix rows
+    index : dict of tuple of (int, int) to int
+        the matrix row of each position
+    distances : numpy.ndarray of uint16
+        the distance matrix; unreachable pairs hold `UNREACHABLE`
+
+    """
+    #: distance value for positions which are not connected
+    UNREACHABLE = np.iinfo(np.uint16).max
+
+    #: the number of matrices which `cached` keeps in memory
+    CACHE_SIZE = 16
+
+    #: in-memory cache used by `cached`, least recently used first
+    _cache = OrderedDict()
+
+    def __init__(self, graph, _distances=None):
+        self.positions = sorted(graph.keys())
+        self.index = {pos: idx for idx, pos in enumerate(self.positions)}
+        self._neighbors = [[self.index[neighbor] for neighbor in graph[pos] if neighbor in self.index]
+                           for pos in self.positions]
+        if _distances is None:
+            _distances = self._all_pairs_bfs()
+        self.distances = _distances
+
+    def _all_pairs_bfs(self):
+        size = len(self.positions)
+        if size >= self.UNREACHABLE:
+            raise ValueError("Graph too large for a DistanceMatrix: %i positions." % size)
+        neighbors = self._neighbors
+        distances = np.full((size, size), self.UNREACHABLE, dtype=np.uint16)
+        for source in range(size):
+            row = [self.UNREACHABLE] * size
+            row[source] = 0
+            frontier = [source]
+            dist = 0
+            while frontier:
+                dist += 1
+                next_frontier = []
+                for node in frontier:
+                    for neighbor in neighbors[node]:
+                        if row[neighbor] == self.UNREACHABLE:
+                            row[neighbor] = dist
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+            distances[source] = row
+        return distances
+
+    def _row(self, position):
+        try:
+            return self.index[position]
+        except KeyError:
+            raise NoPathException("Position %s does not exist in adjacency list." %
+                    repr(position))
+
+    def distance(self, initial, target):
+        """ The length of the shortest path between two positions.
+
+        Parameters
+        ----------
+        initial : tuple of (int, int)
+            the first position
+        target : tuple of (int, int)
+            the second position
+
+        Returns
+        -------
+        distance : int
+            the number of steps from `initial` to `target`
+
+        Raises
+        ------
+        NoPathException
+            if there is no path from `initial` to `target`
+
+        """
+        dist = self.distances[self._row(initial), self._row(target)]
+        if dist == self.UNREACHABLE:
+            raise NoPathException("DistanceMatrix: No path from %r to %r." % (initial, target))
+        return int(dist)
+
+    def next_step(self, initial, target):
+        """ The first step on a shortest path between two positions.
+
+        If several shortest paths exist, the step is the first neighbour
+        of `initial` in the order of the graph. This may differ from the
+        first step of the path which `Graph.a_star` finds.
+
+        Parameters
+        ----------
+        initial : tuple of (int, int)
+            the first position
+        target : tuple of (int, int)
+            the target position
+
+        Returns
+        -------
+        next_step : tuple of (int, int)
+            the neighbour of `initial` which is closest to `target`
+            or `target`, if `initial` equals `target`
+
+        Raises
+        ------
+        NoPathException
+            if there is no path from `initial` to `target`
+
+        """
+        initial_row = self._row(initial)
+        target_row = self._row(target)
+        column = self.distances[:, target_row]
+        dist = column[initial_row]
+        if dist == self.UNREACHABLE:
+            raise NoPathException("DistanceMatrix: No path from %r to %r." % (initial, target))
+        if dist == 0:
+            return target
+        for neighbor in self._neighbors[initial_row]:
+            if column[neighbor] == dist - 1:
+                return self.positions[neighbor]
+
+    def save(self, filename):
+        """ Stores the matrix in a `.npz` file. """
+        np.savez_compressed(filename, positions=np.array(self.positions, dtype=np.int32).reshape(-1, 2),
+                            distances=self.distances)
+
+    @classmethod
+    def load(cls, filename, graph):
+        """ Loads a matrix for `graph` which was stored with `save`.
+
+        Raises
+        ------
+        ValueError
+            if the stored matrix does not belong to the graph
+
+        """
+        with np.load(filename) as data:
+            positions = [tuple(pos) for pos in data["positions"].tolist()]
+            distances = data["distances"]
+        if positions != sorted(graph.keys()):
+            raise ValueError("The matrix in %s does not belong to the graph." % filename)
+        return cls(graph, _distances=distances)
+
+    @staticmethod
+    def graph_key(graph):
+        """ A key which identifies a graph by its adjacencies. """
+        adjacencies = sorted((pos, sorted(neighbors)) for pos, neighbors in graph.items())
+        return hashlib.sha1(repr(adjacencies).encode("ascii")).hexdigest()
+
+    @classmethod
+    def cached(cls, graph, key=None, cache_dir=None):
+        """ The distance matrix for a graph, computed only once.
+
+        The `CACHE_SIZE` most recently used matrices are cached in memory
+        and, if `cache_dir` is given, all of them as ``distances-<key>.npz``
+        files in that directory.
+
+        Parameters
+        ----------
+        graph : Graph
+            the adjacency list
+        key : str, optional
+            a key for the graph, e.g. the layout name.
+            Default: a hash of the adjacencies in the graph
+        cache_dir : str, optional
+            directory for the disk cache
+
+        Returns
+        -------
+        distance_matrix : DistanceMatrix
+            the (possibly shared) distance matrix for the graph
+
+        """
+        if key is None:
+            key = cls.graph_key(graph)
+        try:
+            cls._cache.move_to_end(key)
+            return cls._cache[key]
+        except KeyError:
+            pass
+
+        matrix = None
+        if cache_dir is not None:
+            filename = os.path.join(cache_dir, "distances-%s.npz" % key)
+            try:
+                matrix = cls.load(filename, graph)
+            except (OSError, ValueError, KeyError):
+                # missing or broken cache file; compute it again
+                pass
+        if matrix is None:
+            matrix = cls(graph)
+            if cache_dir is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                # write to a temporary file first, so that concurrent
+                # processes never read a partially written file
+                tmp_filename = "%s.%i.tmp.npz" % (filename[:-len(".npz")], os.getpid())
+                matrix.save(tmp_filename)
+                os.replace(tmp_filename, filename)
+        cls._cache[key] = matrix
+        while len(cls._cache) > cls.CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return matrix
@@ -172,6 +172,131 @@ def call_pelita_player(module_spec, address, color='', dump=None):
         return (subprocess.Popen(call_args), None, None)
 
 
+class PlayerWorker:
+    """ A long-lived player process which serves consecutive games.
+
+    The process is started with `call_pelita_player` and loads its team
+    only once. It stays connected to the socket of this worker and can
+    be handed to `SimpleServer` (as `team_player`) for each new game.
+    The team is reset by the `set_initial` of every game.
+
+    Parameters
+    ----------
+    module_spec : ModuleSpec
+        the team to load
+    color : string, optional
+        the color for the output of the player
+    dump : string, optional
+        the prefix of the files for stdout and stderr
+
+    Attributes
+    ----------
+    team_player : RemoteTeamPlayer
+        the connection to the player process
+    games_played : int
+        the number of games which this worker has finished
+    """
+    def __init__(self, module_spec, color='', dump=None):
+        self.module_spec = module_spec
+        self.context = zmq.Context()
+        socket = self.context.socket(zmq.PAIR)
+        port = socket.bind_to_random_port('tcp://127.0.0.1')
+        self.address = 'tcp://127.0.0.1:%d' % port
+        self.team_player = RemoteTeamPlayer(socket)
+        self.proc, self.stdout, self.stderr = call_pelita_player(module_spec, self.address, color, dump)
+        self.games_played = 0
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def close(self):
+        """ Tells the player to exit and terminates its process. """
+        if self.alive:
+            self.team_player._exit()
+        for stream in (self.stdout, self.stderr):
+            if stream:
+                stream.close()
+        _logger.debug("Terminating worker proc %r", self.proc)
+        self.proc.terminate()
+        self.proc.wait()
+        self.team_player.zmqconnection.socket.close()
+
+    def __repr__(self):
+        return "PlayerWorker(%r, %r)" % (self.module_spec, self.address)
+
+
+class PlayerPool:
+    """ A pool of warm `PlayerWorker`s, one set per team.
+
+    A worker is checked out for a game and returned afterwards. Workers
+    are recycled (i.e. closed and replaced by a new process on the next
+    checkout), when they have crashed, were disqualified or have played
+    `max_games` games.
+
+    Example
+    -------
+        with PlayerPool(max_games=50) as pool:
+            for _ in range(10):
+                run_game(team_specs, rounds=300, layout=layout, pool=pool)
+
+    Parameters
+    ----------
+    max_games : int, optional
+        the number of games after which a worker is recycled.
+        None means no limit.
+    dump : string, optional
+        the prefix of the files for stdout and stderr of the workers
+    """
+    def __init__(self, max_games=None, dump=None):
+        self.max_games = max_games
+        self.dump = dump
+        #: idle workers for each module spec
+        self._idle = {}
+
+    def checkout(self, module_spec):
+        """ Returns an idle worker for `module_spec` or starts a new one. """
+        idle = self._idle.get(module_spec, [])
+        while idle:
+            worker = idle.pop()
+            if worker.alive:
+                return worker
+            _logger.info("Worker %r has died. Recycling it.", worker)
+            worker.close()
+        return PlayerWorker(module_spec, dump=self.dump)
+
+    def release(self, worker, failed=False):
+        """ Returns a worker after a finished game.
+
+        Parameters
+        ----------
+        worker : PlayerWorker
+            the worker to return
+        failed : bool, optional
+            if True, the worker is recycled
+        """
+        worker.games_played += 1
+        if (failed or not worker.alive or
+                (self.max_games is not None and worker.games_played >= self.max_games)):
+            _logger.debug("Recycling worker %r after %d games.", worker, worker.games_played)
+            worker.close()
+        else:
+            self._idle.setdefault(worker.module_spec, []).append(worker)
+
+    def close(self):
+        """ Closes all idle workers. """
+        for workers in self._idle.values():
+            for worker in workers:
+                worker.close()
+        self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 @contextlib.contextmanager
 def run_and_terminate_process(args, **kwargs):
     """ This serves as a contextmanager around `subprocess.Popen`, ensuring that
@@ -224,7 +349,7 @@ def run_and_terminate_process(args, **kwargs):
                     p.kill()
 
 
-def call_pelita(team_specs, *, rounds, filter, viewer, dump, seed):
+def call_pelita(team_specs, *, rounds, filter, viewer, dump, seed, noiser=None):
     """ Starts a new process with the given command line arguments and waits until finished.
 
     Returns
@@ -251,11 +376,13 @@ def call_pelita(team_specs, *, rounds, filter, viewer, dump, seed):
     viewer = ['--' + viewer] if viewer else []
     dump = ['--dump', dump] if dump else []
     seed = ['--seed', seed] if seed else []
+    noiser = ['--noiser', noiser] if noiser else []
 
     cmd = [get_python_process(), '-m', 'pelita.scripts.pelita_main',
            team1, team2,
            '--reply-to', reply_addr,
            *seed,
+           *noiser,
            *dump,
            *filter,
            *rounds,
@@ -351,21 +478,36 @@ def prepare_team(team_spec):
     return TeamSpec(module, address)
 
 def run_game(team_specs, *, rounds, layout, layout_name="", seed=None, dump=False,
-                            max_timeouts=5, timeout_length=3,
-                            viewers=None, controller=None, publisher=None):
+                            max_timeouts=5, timeout_length=3, noiser=None,
+                            viewers=None, controller=None, publisher=None, pool=None):
+    """ Runs a game in this process.
+
+    The teams which are given as modules are played by new
+    `pelita_player` processes, or, if a `PlayerPool` is given,
+    by the workers of the pool.
+    """
 
     if viewers is None:
         viewers = []
 
     teams = [prepare_team(team_spec) for team_spec in team_specs]
 
+    workers = {}
+    if pool is not None:
+        for idx, team in enumerate(teams):
+            if team.module:
+                workers[idx] = pool.checkout(team.module)
+                # the worker is already connected
+                teams[idx] = TeamSpec(module=None, address=workers[idx].team_player)
+
     server = SimpleServer(layout_string=layout,
                           rounds=rounds,
                           bind_addrs=[team.address for team in teams],
                           max_timeouts=max_timeouts,
                           timeout_length=timeout_length,
                           layout_name=layout_name,
-                          seed=seed)
+                          seed=seed,
+                          noiser=noiser)
 
     # Update our teams with the bound addresses
     teams = [
@@ -381,7 +523,7 @@ def run_game(team_specs, *, rounds, layout, layout_name="", seed=None, dump=Fals
             color[team] = 'Red'
         else:
             color[team] = ''
-        if team.module is None:
+        if team.module is None and idx not in workers:
             print("Waiting for external team %d to connect to %s." % (idx, team.address))
 
     external_players = [
@@ -396,15 +538,21 @@ def run_game(team_specs, *, rounds, layout, layout_name="", seed=None, dump=Fals
     if publisher:
         server.game_master.register_viewer(publisher)
 
-    with autoclose_subprocesses(external_players):
-        if controller is not None:
-            if controller.game_master is None:
-                controller.game_master = server.game_master
-            controller.run()
-            server.exit_teams()
-        else:
-            server.run()
-        return server.game_master.game_state
+    try:
+        with autoclose_subprocesses(external_players):
+            if controller is not None:
+                if controller.game_master is None:
+                    controller.game_master = server.game_master
+                controller.run()
+                server.exit_teams()
+            else:
+                server.run()
+            return server.game_master.game_state
+    finally:
+        for idx, worker in workers.items():
+            disqualified = server.game_master.game_state["teams_disqualified"][idx]
+            finished = server.game_master.game_state["finished"]
+            pool.release(worker, failed=(disqualified is not None or not finished))
 
 @contextlib.contextmanager
 def tk_viewer(publish_to=None, geometry=None, delay=None):
@@ -1,15 +1,16 @@
 from pelita import datamodel
-from pelita.graph import Graph, NoPathException, diff_pos
+from pelita.graph import DistanceMatrix, Graph, NoPathException, diff_pos
 from pelita.player import AbstractPlayer, SimpleTeam
 
 
 class SmartEatingPlayer(AbstractPlayer):
     def set_initial(self):
         self.graph = Graph(self.current_uni.reachable([self.initial_pos]))
+        self.distances = DistanceMatrix.cached(self.graph)
         self.next_food = None
 
     def goto_pos(self, pos):
-        return self.graph.a_star(self.current_pos, pos)[-1]
+        return self.distances.next_step(self.current_pos, pos)
 
     def get_move(self):
         # check, if food is still present
@@ -72,6 +72,10 @@ def set_initial(self, team_id, universe, game_state):
         #: Store if we have been eaten before our move
         self._bot_eaten = [False, False]
 
+        #: The walls and homezones do not change during the game
+        self._walls = walls_from_universe(universe)
+        self._homezones = create_homezones(universe.maze.width, universe.maze.height)
+
         # To make things a little simpler, we also initialise a random generator
         # for all enemy bots
 
@@ -105,7 +109,9 @@ def get_move(self, bot_id, universe, game_state):
                                   rng=self._bot_random,
                                   round=game_state['round_index'],
                                   team_name=game_state['team_name'],
-                                  timeout_count=game_state['timeout_teams'])
+                                  timeout_count=game_state['timeout_teams'],
+                                  walls=self._walls,
+                                  homezones=self._homezones)
 
         me = bots[bot_id]
         team = bots[bot_id]._team
@@ -384,11 +390,18 @@ def _rebuild_universe(bots):
 
 
 # def __init__(self, *, bot_index, position, initial_position, walls, homezone, food, is_noisy, score, random, round, is_blue):
-def make_bots(*, walls, food, positions, initial_positions, score, is_noisy, rng, round, team_name, timeout_count):
-    """ Creates a set of 4 bots with the given specification. """
-    width = max(walls)[0] + 1
-    height = max(walls)[1] + 1
-    homezones = create_homezones(width, height)
+def make_bots(*, walls, food, positions, initial_positions, score, is_noisy, rng, round, team_name, timeout_count,
+              homezones=None):
+    """ Creates a set of 4 bots with the given specification.
+
+    The `homezones` are derived from the walls, unless they are given.
+    """
+    if homezones is None:
+        width = max(walls)[0] + 1
+        height = max(walls)[1] + 1
+        homezones = create_homezones(width, height)
+    # the blue homezone ends where the red homezone starts
+    border = min(homezones[1])[0]
     bots = []
     for i, position in enumerate(positions):
         homezone = homezones[i % 2]
@@ -397,7 +410,7 @@ def make_bots(*, walls, food, positions, initial_positions, score, is_noisy, rng
                   initial_position=initial_positions[i],
                   walls=walls,
                   homezone=homezone,
-                  food=[f for f in food if f in homezone],
+                  food=[f for f in food if (f[0] < border) == (i % 2 == 0)],
                   is_noisy=is_noisy[i],
                   score=score[i % 2],
                   random=rng[i],
@@ -410,9 +423,20 @@ def make_bots(*, walls, food, positions, initial_positions, score, is_noisy, rng
         bot._bots = bots
     return bots
 
-def bots_from_universe(universe, rng, round, team_name, timeout_count):
-    """ Creates 4 bots given a universe. """
-    return make_bots(walls=[pos for pos, is_wall in universe.maze.items() if is_wall],
+def walls_from_universe(universe):
+    """ The positions of the walls in a universe. """
+    return [pos for pos, is_wall in universe.maze.items() if is_wall]
+
+def bots_from_universe(universe, rng, round, team_name, timeout_count, walls=None, homezones=None):
+    """ Creates 4 bots given a universe.
+
+    The `walls` and `homezones` do not change during a game. If they are
+    given, they are used instead of scanning the maze.
+    """
+    if walls is None:
+        walls = walls_from_universe(universe)
+    return make_bots(walls=walls,
+                     homezones=homezones,
                      food=universe.food,
                      positions=[b.current_pos for b in universe.bots],
                      initial_positions=[b.initial_pos for b in universe.bots],
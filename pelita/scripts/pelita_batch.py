@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import sys
+
+from .. import batch
+from ..game_master import NOISERS
+
+
+parser = argparse.ArgumentParser(description='Play many headless games between two teams.')
+parser.add_argument('team_specs', help='FILENAME1.py FILENAME2.py (as for pelita)', nargs=2)
+parser.add_argument('--games', '-n', type=int, default=10,
+                    help='Number of games to play.')
+parser.add_argument('--rounds', type=int, default=300,
+                    help='Maximum number of rounds per game.')
+parser.add_argument('--seed', type=int, default=None,
+                    help='Seed for the whole batch.')
+parser.add_argument('--processes', '-j', type=int, default=None,
+                    help='Number of worker processes (default: number of cores).')
+parser.add_argument('--noiser', choices=sorted(NOISERS), default='manhattan',
+                    help='Noise model for the enemy positions.')
+parser.add_argument('--no-noise', action='store_true',
+                    help='Play without noisy enemy positions.')
+layout_opt = parser.add_mutually_exclusive_group()
+layout_opt.add_argument('--layout', metavar='NAME',
+                        help='Play all games on this layout.')
+layout_opt.add_argument('--filter', metavar='STRING', default='',
+                        help='Choose random layouts whose name contains STRING.')
+parser.add_argument('--results', metavar='FILE',
+                    help='Write the result of each game as a line of JSON to FILE.')
+
+
+def main():
+    args = parser.parse_args()
+
+    if args.seed is None:
+        args.seed = random.randint(0, sys.maxsize)
+        print("Replay this batch with --seed {seed}".format(seed=args.seed))
+
+    results = batch.play_games(args.team_specs, args.games,
+                               layout_name=args.layout,
+                               filter=args.filter,
+                               rounds=args.rounds,
+                               seed=args.seed,
+                               processes=args.processes,
+                               noise=not args.no_noise,
+                               noiser=args.noiser)
+
+    if args.results:
+        with open(args.results, 'w') as f:
+            for result in results:
+                print(json.dumps(result._asdict()), file=f)
+
+    team_names = results[0].team_name if results else args.team_specs
+    for team_name, spec, summary in zip(team_names, args.team_specs, batch.summarize(results)):
+        print("{name} ({spec}): {wins} wins, {losses} losses, {draws} draws, "
+              "average score {score:.1f}".format(name=team_name, spec=spec, **summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@
 
 import pelita
 from pelita import libpelita
+from pelita.game_master import NOISERS
 
 # silence stupid warnings from logging module
 logging.root.manager.emittedNoHandlerWarning = 1
@@ -170,6 +171,10 @@ def long_help(s):
                            help='Maximum number of rounds to play.')
 game_settings.add_argument('--seed', type=int, metavar='SEED', default=None,
                            help='Initialize the random number generator with SEED.')
+game_settings.add_argument('--noiser', choices=sorted(NOISERS), default='manhattan',
+                           help='Measure the noise of enemy positions in \'manhattan\' or \'maze\' distance'
+                           ' (default: \'manhattan\'). \'manhattan-compat\' draws the same noisy'
+                           ' positions for a seed as earlier versions.')
 
 layout_opt = game_settings.add_mutually_exclusive_group()
 layout_opt.add_argument('--layoutfile', metavar='FILE',
@@ -372,6 +377,7 @@ def main():
 
         libpelita.run_game(team_specs=team_specs, rounds=args.rounds, layout=layout_string, layout_name=layout_name,
                            seed=args.seed, dump=args.dump, max_timeouts=args.max_timeouts, timeout_length=args.timeout_length,
+                           noiser=args.noiser,
                            viewers=viewers, controller=controller, publisher=publisher)
 
 if __name__ == '__main__':
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import collections
 import contextlib
 import importlib
 import inspect
+import json
 import keyword
 import logging
 import os
@@ -13,11 +15,14 @@
 import string
 import subprocess
 import sys
+import time
 
 import zmq
+import zmq.utils.monitor
 
 import pelita
 from ..player.team import new_style_team
+from ..simplesetup import decode_message
 
 _logger = logging.getLogger(__name__)
 
@@ -161,67 +166,225 @@ def load_factory(pathspec: str):
         return new_style_team(module)
 
 
-def with_zmq_router(team, address):
-    dealer_pair_mapping = {}
-    pair_dealer_mapping = {}
-    proc_dealer_mapping = {}
+class RouterHub:
+    """ Routes the matches of remote servers to a pool of team workers.
 
-    def cleanup(signum, frame):
-        for proc in proc_dealer_mapping:
-            proc.terminate()
-        sys.exit()
-
-    signal.signal(signal.SIGTERM, cleanup)
-
-    ctx = zmq.Context()
-    sock = ctx.socket(zmq.ROUTER)
-    sock.bind(address)
-
-    poll = zmq.Poller()
-    poll.register(sock, zmq.POLLIN)
+    Servers connect with a zmq.DEALER to the zmq.ROUTER of the hub and
+    send a `REQUEST` first. Each request is assigned to an idle worker,
+    i.e. a `pelita_player` process which has been started beforehand and
+    has already loaded the team. All further messages are forwarded
+    between the server and its worker. A worker exits at the end of its
+    match and is replaced by a fresh one.
 
-    while True:
-        evts = dict(poll.poll(1000))
-        if sock in evts:
-            id_ = sock.recv()
-            msg = sock.recv_json()
-            if "REQUEST" in msg:
-                pair_sock = ctx.socket(zmq.PAIR)
-                port = pair_sock.bind_to_random_port('tcp://127.0.0.1')
-                pair_addr = 'tcp://127.0.0.1:{}'.format(port)
+    At most `workers` processes run at once. When all of them are busy,
+    up to `max_queue` requests wait for a free worker; further requests
+    are answered with an error.
 
-                poll.register(pair_sock, zmq.POLLIN)
-
-                _logger.info("Starting match for team {}. ({} already running.)".format(team, len(proc_dealer_mapping)))
-                sub = play_remote(team, pair_addr)
-
-                dealer_pair_mapping[id_] = pair_sock
-                pair_dealer_mapping[pair_sock] = id_
-                proc_dealer_mapping[sub] = (id_, pair_sock)
-
-                assert len(dealer_pair_mapping) == len(pair_dealer_mapping)
-            elif id_ in dealer_pair_mapping:
-                dealer_pair_mapping[id_].send_json(msg)
+    Parameters
+    ----------
+    team : str
+        the team spec for the workers
+    address : str
+        the address to bind the zmq.ROUTER to
+    workers : int, optional
+        the number of worker processes
+    max_queue : int, optional
+        the number of requests which may wait for a worker
+
+    Attributes
+    ----------
+    metrics : dict
+        the number of active matches, idle workers and waiting requests,
+        the number of spawned workers and the mean time (in seconds) from
+        starting a worker until it has loaded the team and connected
+    """
+    #: interval (in seconds) for checking on the worker processes
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, team, address, workers=4, max_queue=16):
+        self.team = team
+        self.max_workers = workers
+        self.max_queue = max_queue
+
+        self.ctx = zmq.Context()
+        self.sock = self.ctx.socket(zmq.ROUTER)
+        self.sock.bind(address)
+
+        self.poll = zmq.Poller()
+        self.poll.register(self.sock, zmq.POLLIN)
+
+        #: started workers which wait for a match
+        self.idle = collections.deque()
+        #: dealer id -> worker
+        self.dealer_worker = {}
+        #: pair socket -> worker
+        self.socket_worker = {}
+        #: dealer id -> buffered messages of requests which wait for a worker
+        self.waiting = collections.OrderedDict()
+        #: monitor socket -> worker which has not connected yet
+        self.monitor_worker = {}
+
+        self.metrics = {
+            "active_matches": 0,
+            "idle_workers": 0,
+            "queue_depth": 0,
+            "spawned": 0,
+            "spawn_latency": 0.0,
+        }
+        self._connected = 0
+
+        for _ in range(self.max_workers):
+            self._spawn()
+
+    def _spawn(self):
+        pair_sock = self.ctx.socket(zmq.PAIR)
+        port = pair_sock.bind_to_random_port('tcp://127.0.0.1')
+        pair_addr = 'tcp://127.0.0.1:{}'.format(port)
+        proc = play_remote(self.team, pair_addr)
+        worker = _Worker(proc, pair_sock, time.monotonic())
+        self.poll.register(pair_sock, zmq.POLLIN)
+        # tells us when the worker is ready
+        worker.monitor = pair_sock.get_monitor_socket(zmq.EVENT_ACCEPTED)
+        self.poll.register(worker.monitor, zmq.POLLIN)
+        self.monitor_worker[worker.monitor] = worker
+        self.socket_worker[pair_sock] = worker
+        self.idle.append(worker)
+        self.metrics["spawned"] += 1
+
+    def _close_monitor(self, worker):
+        if worker.monitor is not None:
+            del self.monitor_worker[worker.monitor]
+            self.poll.unregister(worker.monitor)
+            worker.pair_sock.disable_monitor()
+            worker.monitor.close()
+            worker.monitor = None
+
+    def _handle_monitor(self, worker):
+        zmq.utils.monitor.recv_monitor_message(worker.monitor)
+        self._close_monitor(worker)
+        # running mean of the time which workers need until they are ready
+        self._connected += 1
+        latency = time.monotonic() - worker.started
+        self.metrics["spawn_latency"] += (latency - self.metrics["spawn_latency"]) / self._connected
+
+    def _assign(self, id_, worker, messages=()):
+        worker.dealer_id = id_
+        self.dealer_worker[id_] = worker
+        for msg in messages:
+            worker.pair_sock.send(msg)
+        _logger.info("Starting match for team {}. ({} running.)".format(self.team, len(self.dealer_worker)))
+
+    def _handle_dealer(self):
+        id_ = self.sock.recv()
+        raw_msg = self.sock.recv()
+        worker = self.dealer_worker.get(id_)
+        if worker is not None:
+            # forward the message in whatever wire format it is
+            worker.pair_sock.send(raw_msg)
+        elif id_ in self.waiting:
+            self.waiting[id_].append(raw_msg)
+        else:
+            self._handle_request(id_, raw_msg)
+
+    def _handle_request(self, id_, raw_msg):
+        """ Starts a match for a DEALER without a worker. """
+        try:
+            msg = decode_message(raw_msg)
+        except ValueError:
+            # eg. a late reply to a worker which has exited
+            _logger.warning("Dropping undecodable message from unknown DEALER.")
+            return
+        if isinstance(msg, dict) and "REQUEST" in msg:
+            if self.idle:
+                self._assign(id_, self.idle.popleft())
+            elif len(self.waiting) < self.max_queue:
+                _logger.info("All workers are busy. Queueing request.")
+                self.waiting[id_] = []
             else:
-                _logger.info("Unknown incoming DEALER and not a request.")
-
-        elif len(evts):
-            for pair_sock, id_ in pair_dealer_mapping.items():
-                if pair_sock in evts:
-                    msg = pair_sock.recv()
-                    sock.send_multipart([id_, msg])
-
-        old_procs = list(proc_dealer_mapping.keys())
+                _logger.warning("Queue is full. Rejecting request.")
+                self.sock.send_multipart([id_, json.dumps({'__error__': 'Hub for %s is full' % self.team}).encode('utf-8')])
+        else:
+            _logger.info("Unknown incoming DEALER and not a request.")
+
+    def _check_workers(self):
+        """ Replaces the workers which have exited and assigns new workers
+        to the waiting requests. """
         count = 0
-        for proc in old_procs:
-            if proc.poll() is not None:
-                id_, pair_sock = proc_dealer_mapping[proc]
-                del dealer_pair_mapping[id_]
-                del pair_dealer_mapping[pair_sock]
-                del proc_dealer_mapping[proc]
-                count += 1
+        for pair_sock, worker in list(self.socket_worker.items()):
+            if worker.proc.poll() is None:
+                continue
+            del self.socket_worker[pair_sock]
+            self._close_monitor(worker)
+            self.poll.unregister(pair_sock)
+            pair_sock.close()
+            if worker.dealer_id is not None:
+                del self.dealer_worker[worker.dealer_id]
+            else:
+                self.idle.remove(worker)
+            count += 1
         if count:
-            _logger.debug("Cleaned up {} process(es). ({} still running.)".format(count, len(proc_dealer_mapping)))
+            _logger.debug("Cleaned up {} process(es). ({} still running.)".format(count, len(self.dealer_worker)))
+
+        while len(self.socket_worker) < self.max_workers:
+            self._spawn()
+        while self.idle and self.waiting:
+            id_, messages = self.waiting.popitem(last=False)
+            self._assign(id_, self.idle.popleft(), messages)
+
+        self.metrics.update(active_matches=len(self.dealer_worker),
+                            idle_workers=len(self.idle),
+                            queue_depth=len(self.waiting))
+
+    def run(self):
+        self._stopped = False
+        next_check = time.monotonic()
+        while not self._stopped:
+            evts = dict(self.poll.poll(self.CHECK_INTERVAL * 1000))
+            for sock in evts:
+                if sock is self.sock:
+                    self._handle_dealer()
+                elif sock in self.monitor_worker:
+                    self._handle_monitor(self.monitor_worker[sock])
+                else:
+                    worker = self.socket_worker[sock]
+                    msg = sock.recv()
+                    self.sock.send_multipart([worker.dealer_id, msg])
+
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                _logger.debug("Hub metrics: %r", self.metrics)
+                next_check = time.monotonic() + self.CHECK_INTERVAL
+
+    def stop(self):
+        """ Lets `run` return after the current iteration. """
+        self._stopped = True
+
+    def terminate(self):
+        for worker in self.socket_worker.values():
+            worker.proc.terminate()
+
+
+class _Worker:
+    def __init__(self, proc, pair_sock, started):
+        self.proc = proc
+        self.pair_sock = pair_sock
+        self.started = started
+        #: the monitor of the pair socket until the worker has connected
+        self.monitor = None
+        #: the id of the dealer whose match this worker plays
+        self.dealer_id = None
+
+
+def with_zmq_router(team, address, workers=4, max_queue=16):
+    hub = RouterHub(team, address, workers=workers, max_queue=max_queue)
+
+    def cleanup(signum, frame):
+        hub.terminate()
+        sys.exit()
+
+    signal.signal(signal.SIGTERM, cleanup)
+
+    hub.run()
 
 
 def play_remote(team, pair_addr):
@@ -243,6 +406,9 @@ def main():
                         metavar='LOGFILE', default=argparse.SUPPRESS, nargs='?')
     parser.add_argument('--remote', help='bind to a zmq.ROUTER socket at the given address which forks subprocesses on demand',
                         action='store_const', const=True)
+    parser.add_argument('--workers', help='the number of team processes for --remote', type=int, default=4)
+    parser.add_argument('--max-queue', help='the number of matches which wait for a team process with --remote',
+                        type=int, default=16)
     parser.add_argument('--color', help='which color your team will have in the game', default=None)
     parser.add_argument('team')
     parser.add_argument('address')
@@ -255,7 +421,7 @@ def main():
         pass
 
     if args.remote:
-        with_zmq_router(args.team, args.address)
+        with_zmq_router(args.team, args.address, workers=args.workers, max_queue=args.max_queue)
     else:
         client = make_client(args.team, args.address, args.color)
         ret = client.run()
@@ -24,19 +24,27 @@
 re-investigate this decision.
 """
 
+import bisect
+from collections import namedtuple
+import functools
+import itertools
 import json
 import logging
 import multiprocessing
 import re
 import sys
 import time
-import uuid
 
 import zmq
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 from .datamodel import CTFUniverse
 from .game_master import GameMaster, PlayerDisconnected, PlayerTimeout
-from .viewer import AbstractViewer
+from .viewer import AbstractViewer, DeltaDecoder, DeltaEncoder
 
 _logger = logging.getLogger(__name__)
 
@@ -55,6 +63,14 @@ class UnknownMessageId(Exception):
 #: The timeout to use during sending
 DEAD_CONNECTION_TIMEOUT = 3.0
 
+#: The upper bounds (in seconds) of the buckets of the latency histograms.
+#: Slower replies are counted in an additional last bucket.
+LATENCY_BUCKETS = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0)
+
+#: The wire formats which can be used on this installation, best first.
+#: JSON is understood by every client.
+PROTOCOLS = ["msgpack", "json"] if msgpack else ["json"]
+
 def extract_port_range(address):
     """ We additionally allow for setting a port range in rectangular brackets:
         tcp://127.0.0.1:[50100:50120]
@@ -113,19 +129,69 @@ def json_default_handler(o):
     # we don’t know the type: raise a Type error
     raise TypeError("Cannot convert %r of type %s to json" % (o, type(o)))
 
+def encode_message(message_obj, protocol="json"):
+    """ Encodes a message in the given wire format.
+
+    Parameters
+    ----------
+    message_obj : dict
+        the message
+    protocol : str, optional
+        "json" or (if msgpack is installed) "msgpack"
+
+    Returns
+    -------
+    message : bytes
+        the encoded message
+
+    """
+    if protocol == "msgpack":
+        return msgpack.packb(message_obj, use_bin_type=True, default=json_default_handler)
+    return json.dumps(message_obj, default=json_default_handler).encode("utf-8")
+
+def decode_message(message):
+    """ Decodes a message in any of the wire formats.
+
+    JSON messages are objects and therefore start with a brace. Everything
+    else is read as msgpack.
+
+    Raises
+    ------
+    ValueError
+        if the message cannot be decoded
+
+    """
+    if message[:1] == b"{" or msgpack is None:
+        return json.loads(message.decode("utf-8"))
+    try:
+        # bot_error in the game state has integer keys
+        return msgpack.unpackb(message, raw=False, strict_map_key=False)
+    except Exception as e:
+        raise ValueError("Could not decode message: %r" % e)
+
 class ZMQConnection:
     """ This class is supposed to ease request–reply connections
-    through a zmq socket. It does so by attaching a uuid to each
-    request. It will only accept a reply if this also includes
-    this uuid. All other incoming messages will be discarded.
+    through a zmq socket. It does so by attaching an increasing
+    integer id (in the `__uuid__` field) to each request. It will only
+    accept a reply if this also includes this id. All other incoming
+    messages will be discarded.
 
     Please note the following:
       * This class is not thread-safe!
       * There can only be one request at a time. Only the reply for
-        the most recent request (= uuid) will be received. Non-matching
-        uuids are discarded.
+        the most recent request (= id) will be received. Non-matching
+        ids are discarded.
       * There is no storage of messages.
 
+    Messages are sent as JSON, until the peer picks one of the
+    `PROTOCOLS` which are offered with each request. Clients which pick a
+    protocol also accept universes without the (static) maze. Older
+    clients ignore the offer and keep talking JSON. Incoming messages
+    are decoded in whichever format they arrive.
+
+    The time between sending a request and receiving its reply is
+    counted in `latency_histogram`.
+
     Parameters
     ----------
     socket : zmq socket
@@ -135,56 +201,74 @@ class ZMQConnection:
     ----------
     socket : zmq socket
         The zmq socket of this connection
-    pollin : zmq poller
-        Poller for incoming connections
-    pollout : zmq poller
-        Poller for outgoing connections
-    last_uuid : uuid
-        Uuid which the next incoming message has to match
+    last_uuid : int
+        Id which the next incoming message has to match
+    latency_histogram : list of int
+        The number of replies for each of the `LATENCY_BUCKETS`
+        and for the replies slower than the last bucket
+    protocol : str
+        The wire format for sending
+    negotiated : bool
+        True if the peer has picked a protocol
     """
     def __init__(self, socket):
         self.socket = socket
-        self.pollin = zmq.Poller()
-        self.pollin.register(socket, zmq.POLLIN)
-        self.pollout = zmq.Poller()
-        self.pollout.register(socket, zmq.POLLOUT)
 
         self.last_uuid = None
+        self._send_time = None
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._message_ids = itertools.count(1)
+        self.protocol = "json"
+        self.negotiated = False
 
     def send(self, action, data, timeout=None):
         if timeout is None:
             timeout = DEAD_CONNECTION_TIMEOUT
 
-        msg_uuid = str(uuid.uuid4())
+        msg_uuid = next(self._message_ids)
         _logger.debug("---> %r [%s]", action, msg_uuid)
 
-        # Check before sending. Forever is a long time.
-        socks = dict(self.pollout.poll(timeout * 1000))
-        if socks.get(self.socket) == zmq.POLLOUT:
-            # I think we need to set NOBLOCK here, else we may run into a
-            # race condition if a connection was closed between poll and send.
-            # NOBLOCK should raise, so we can catch that
-            message_obj = {"__uuid__": msg_uuid, "__action__": action, "__data__": data}
-            json_message = json.dumps(message_obj)
+        message_obj = {"__uuid__": msg_uuid, "__action__": action, "__data__": data}
+        if not self.negotiated:
+            message_obj["__protocols__"] = PROTOCOLS
+        message = encode_message(message_obj, self.protocol)
+
+        # Usually, the socket is writable and we can send right away.
+        # We always need NOBLOCK, else we may run into a race condition
+        # if a connection is closed before sending. NOBLOCK should raise,
+        # so we can catch that
+        try:
+            self.socket.send(message, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            # Wait until we can send. Forever is a long time.
+            if not self.socket.poll(timeout * 1000, zmq.POLLOUT):
+                raise ZMQUnreachablePeer()
             try:
-                self.socket.send_unicode(json_message, flags=zmq.NOBLOCK)
+                self.socket.send(message, flags=zmq.NOBLOCK)
             except zmq.ZMQError as e:
                 _logger.info("Could not send message. Assume socket is unavailable. %r", e)
                 raise ZMQUnreachablePeer()
-        else:
+        except zmq.ZMQError as e:
+            _logger.info("Could not send message. Assume socket is unavailable. %r", e)
             raise ZMQUnreachablePeer()
         self.last_uuid = msg_uuid
+        self._send_time = time.monotonic()
 
     def recv(self):
         # return tuple
         # (action, data)
-        json_message = self.socket.recv_unicode()
+        message = self.socket.recv()
         try:
-            py_obj = json.loads(json_message)
+            py_obj = decode_message(message)
         except ValueError:
-            _logger.warn('Received non-json message from self. Triggering a timeout.')
+            _logger.warn('Received undecodable message. Triggering a timeout.')
             raise ZMQReplyTimeout()
-        #print repr(json_msg)
+
+        # a late reply may still tell us about the protocol
+        protocol = py_obj.get("__protocol__")
+        if protocol in PROTOCOLS:
+            self.protocol = protocol
+            self.negotiated = True
 
         try:
             msg_error = py_obj['__error__']
@@ -205,11 +289,16 @@ def recv(self):
 
         if msg_uuid == self.last_uuid:
             self.last_uuid = None
+            self._record_latency(time.monotonic() - self._send_time)
             return msg_return
         else:
-            self.last_uuid = None
+            # a late reply to an earlier request; keep waiting for ours
             raise UnknownMessageId()
 
+    def _record_latency(self, latency):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        self.latency_histogram[bucket] += 1
+
     def recv_timeout(self, timeout):
         if timeout is None:
             return self.recv()
@@ -221,19 +310,16 @@ def recv_timeout(self, timeout):
         while time_now < timeout_until:
             time_left = timeout_until - time_now
 
-            socks = dict(self.pollin.poll(time_left * 1000)) # poll needs milliseconds
-            if socks.get(self.socket) == zmq.POLLIN:
-                try:
-                    reply = self.recv()
-                    # No error? Then it is the answer that we wanted. Good.
-                    return reply
-                except UnknownMessageId:
-                    # Okay, false alarm. Reset the current time and try again.
-                    time_now = time.monotonic()
-                    continue
+            # poll needs milliseconds
+            if not self.socket.poll(time_left * 1000, zmq.POLLIN):
                 # answer did not arrive in time
-            else:
-                raise ZMQReplyTimeout()
+                break
+            try:
+                # No error? Then it is the answer that we wanted. Good.
+                return self.recv()
+            except UnknownMessageId:
+                # Okay, false alarm. Reset the current time and try again.
+                time_now = time.monotonic()
         raise ZMQReplyTimeout()
 
     def __repr__(self):
@@ -255,6 +341,12 @@ class RemoteTeamPlayer:
     def __init__(self, socket):
         self.zmqconnection = ZMQConnection(socket)
 
+    @property
+    def latency_histogram(self):
+        """ The histogram of the reply latencies of the remote team.
+        See `ZMQConnection`. """
+        return self.zmqconnection.latency_histogram
+
     def team_name(self):
         try:
             self.zmqconnection.send("team_name", {})
@@ -267,11 +359,30 @@ def team_name(self):
             return "%error%"
 
     def set_initial(self, team_id, universe, game_state):
-        try:
-            self.zmqconnection.send("set_initial", {"team_id": team_id,
-                                                    "universe": universe._to_json_dict(),
-                                                    "game_state": game_state})
+        def communicate():
+            self._send_set_initial(team_id, universe, game_state)
+            return self.zmqconnection.recv_timeout(game_state["timeout_length"])
+        return self._set_initial_reply(communicate)
+
+    def get_move(self, bot_id, universe, game_state):
+        def communicate():
+            self._send_get_move(bot_id, universe, game_state)
             return self.zmqconnection.recv_timeout(game_state["timeout_length"])
+        return self._get_move_reply(communicate)
+
+    # The requests are split into sending and handling the reply, so that
+    # a server can wait for the replies of many connections at once.
+    # `communicate` returns the raw reply or raises the error of the
+    # connection.
+
+    def _send_set_initial(self, team_id, universe, game_state):
+        self.zmqconnection.send("set_initial", {"team_id": team_id,
+                                                "universe": universe._to_json_dict(),
+                                                "game_state": game_state})
+
+    def _set_initial_reply(self, communicate):
+        try:
+            return communicate()
         except ZMQReplyTimeout:
             # answer did not arrive in time
             raise PlayerTimeout()
@@ -281,12 +392,18 @@ def set_initial(self, team_id, universe, game_state):
             _logger.info("Detected a ConnectionError: %s", e)
             return '%%%s%%' % e
 
-    def get_move(self, bot_id, universe, game_state):
+    def _send_get_move(self, bot_id, universe, game_state):
+        universe_dict = universe._to_json_dict()
+        if self.zmqconnection.negotiated:
+            # the client knows the maze from set_initial
+            del universe_dict["maze"]
+        self.zmqconnection.send("get_move", {"bot_id": bot_id,
+                                             "universe": universe_dict,
+                                             "game_state": game_state})
+
+    def _get_move_reply(self, communicate):
         try:
-            self.zmqconnection.send("get_move", {"bot_id": bot_id,
-                                                 "universe": universe._to_json_dict(),
-                                                 "game_state": game_state})
-            reply = self.zmqconnection.recv_timeout(game_state["timeout_length"])
+            reply = communicate()
             # make sure it is a dict
             reply = dict(reply)
             # make sure that the move is a tuple
@@ -340,6 +457,13 @@ class SimpleServer:
         The name of the given layout string.
     seed : int, optional
         The initial seed to be passed to GameMaster.
+    noiser : string, optional
+        The name of the noiser to be passed to GameMaster.
+
+    Instead of an address, `bind_addrs` may also hold a move function
+    for a local team or a `RemoteTeamPlayer` which is already connected
+    to a running client. Such a client is not told to exit after the
+    game, so that it can play the next one.
 
     Raises
     ------
@@ -351,7 +475,7 @@ class SimpleServer:
     """
     def __init__(self, layout_string, teams=2, players=4, rounds=300, bind_addrs=None,
                  max_timeouts=5, timeout_length=3, layout_name=None,
-                 seed=None):
+                 seed=None, noiser=None):
 
         self.players = players
         self.number_of_teams = teams
@@ -372,8 +496,16 @@ def __init__(self, layout_string, teams=2, players=4, rounds=300, bind_addrs=Non
         #: the remote team players which are used for sending
         self.team_players = []
 
+        #: the remote team players which stay connected after the game
+        self.persistent_players = []
+
         for address in bind_addrs:
-            if callable(address):
+            if isinstance(address, RemoteTeamPlayer):
+                # a client which outlives this game
+                self.bind_addresses.append(None)
+                self.team_players.append(address)
+                self.persistent_players.append(address)
+            elif callable(address):
                 # address is a move function
 #                self.sockets.append(socket)
                 self.bind_addresses.append(None)
@@ -424,11 +556,13 @@ def __init__(self, layout_string, teams=2, players=4, rounds=300, bind_addrs=Non
                                       max_timeouts=max_timeouts,
                                       timeout_length=timeout_length,
                                       layout_name=layout_name,
-                                      seed=seed)
+                                      seed=seed,
+                                      noiser=noiser)
 
     def exit_teams(self):
         for team_player in self.team_players:
-            team_player._exit()
+            if team_player not in self.persistent_players:
+                team_player._exit()
 
     def shutdown(self):
         """ Closes the sockets.
@@ -443,6 +577,136 @@ def run(self):
 
         self.exit_teams()
 
+class MatchServer:
+    """ Hosts many games at once in a single process.
+
+    Instead of waiting for each reply in turn, the MatchServer sends the
+    requests of all games and polls all team sockets together. Whichever
+    game has its reply ready is advanced until it needs the next reply.
+    The time is thus bounded by the thinking time of the bots and not by
+    the number of games.
+
+    Example
+    -------
+        server = MatchServer()
+        for teams in matches:
+            server.add_game(GameMaster(layout, teams, 4, 300))
+        server.run()
+
+    The teams of the games are `RemoteTeamPlayer`s, each with its own
+    connected socket, or local teams which are asked directly.
+
+    Attributes
+    ----------
+    game_masters : list of GameMaster
+        the hosted games
+    """
+    def __init__(self):
+        self.game_masters = []
+        self._poller = zmq.Poller()
+        #: the remote team player for each socket
+        self._team_players = {}
+        #: the request which each socket has to answer
+        self._pending = {}
+
+    def add_game(self, game_master):
+        """ Adds a game which will be played by `run`. """
+        for team_player in game_master.player_teams:
+            if isinstance(team_player, RemoteTeamPlayer):
+                socket = team_player.zmqconnection.socket
+                if socket in self._team_players:
+                    raise ValueError("%r plays in more than one game." % team_player)
+                self._team_players[socket] = team_player
+                self._poller.register(socket, zmq.POLLIN)
+        self.game_masters.append(game_master)
+
+    def run(self):
+        """ Plays all games until they are finished. """
+        for game_master in self.game_masters:
+            self._advance(game_master._game_requests(), game_master, None, None)
+
+        while self._pending:
+            time_left = min(pending.deadline for pending in self._pending.values()) - time.monotonic()
+            events = dict(self._poller.poll(max(time_left, 0) * 1000))
+            for socket in events:
+                team_player = self._team_players[socket]
+                try:
+                    reply = team_player.zmqconnection.recv()
+                except UnknownMessageId:
+                    # a reply which arrived too late
+                    continue
+                except (ZMQReplyTimeout, ZMQConnectionError) as e:
+                    communicate = functools.partial(_raise, e)
+                else:
+                    communicate = functools.partial(_identity, reply)
+                if socket in self._pending:
+                    self._resume(self._pending.pop(socket), communicate)
+
+            time_now = time.monotonic()
+            for socket, pending in list(self._pending.items()):
+                if pending.deadline <= time_now:
+                    del self._pending[socket]
+                    self._resume(pending, functools.partial(_raise, ZMQReplyTimeout()))
+
+        self.exit_teams()
+
+    def _resume(self, pending, communicate):
+        reply = error = None
+        try:
+            reply = getattr(pending.team_player, "_%s_reply" % pending.action)(communicate)
+        except Exception as e:
+            error = e
+        self._advance(pending.requests, pending.game_master, reply, error)
+
+    def _advance(self, requests, game_master, reply, error):
+        """ Plays a game until it waits for a remote team or has finished. """
+        while True:
+            try:
+                if error is not None:
+                    request = requests.throw(error)
+                else:
+                    request = requests.send(reply)
+            except StopIteration:
+                return
+            reply = error = None
+            if request is None:
+                continue
+
+            team_player = game_master.player_teams[request.team_id]
+            if not isinstance(team_player, RemoteTeamPlayer):
+                try:
+                    reply = getattr(team_player, request.action)(*request.args)
+                except Exception as e:
+                    error = e
+                continue
+
+            try:
+                getattr(team_player, "_send_%s" % request.action)(*request.args)
+            except Exception as send_error:
+                # let the team player translate the error
+                try:
+                    reply = getattr(team_player, "_%s_reply" % request.action)(functools.partial(_raise, send_error))
+                except Exception as e:
+                    error = e
+                continue
+
+            deadline = time.monotonic() + game_master.game_state["timeout_length"]
+            socket = team_player.zmqconnection.socket
+            self._pending[socket] = _PendingRequest(requests, game_master, team_player, request.action, deadline)
+            return
+
+    def exit_teams(self):
+        for team_player in self._team_players.values():
+            team_player._exit()
+
+_PendingRequest = namedtuple("_PendingRequest", ["requests", "game_master", "team_player", "action", "deadline"])
+
+def _raise(error):
+    raise error
+
+def _identity(value):
+    return value
+
 class ExitLoop(Exception):
     """ If this is raised, we’ll close the inner loop.
     """
@@ -532,6 +796,13 @@ def __init__(self, team, team_name="", address=None):
 
         self.address = address
 
+        #: the wire format of the replies
+        self.protocol = "json"
+        #: the maze from set_initial, as a json dict
+        self._maze = None
+        #: the universe from set_initial, which is updated with each move
+        self._universe = None
+
     def on_start(self):
         # We connect here because zmq likes to have its own
         # thread/process/whatever.
@@ -556,11 +827,12 @@ def _loop(self):
         answer from the player.
         """
 
-        json_message = self.socket.recv_unicode()
-        py_obj = json.loads(json_message)
+        message = self.socket.recv()
+        py_obj = decode_message(message)
         uuid_ = py_obj["__uuid__"]
         action = py_obj["__action__"]
         data = py_obj["__data__"]
+        offered = py_obj.get("__protocols__")
 
         try:
             # feed client actor here …
@@ -581,16 +853,44 @@ def _loop(self):
         finally:
             try:
                 message_obj = {"__uuid__": uuid_, "__return__": retval}
-                json_message = json.dumps(message_obj, default=json_default_handler)
-                self.socket.send_unicode(json_message)
+                if offered is not None:
+                    # pick the best protocol which the server offers
+                    self.protocol = next(p for p in PROTOCOLS if p in offered or p == "json")
+                    message_obj["__protocol__"] = self.protocol
+                self.socket.send(encode_message(message_obj, self.protocol))
             except NameError:
                 pass
 
     def set_initial(self, team_id, universe, game_state):
-        return self.team.set_initial(team_id, CTFUniverse._from_json_dict(universe), game_state)
+        self._maze = universe["maze"]
+        self._universe = CTFUniverse._from_json_dict(universe)
+        return self.team.set_initial(team_id, self._universe.copy(), game_state)
 
     def get_move(self, bot_id, universe, game_state):
-        return self.team.get_move(bot_id, CTFUniverse._from_json_dict(universe), game_state)
+        if self._universe is None or universe.get("maze", self._maze) != self._maze:
+            # we do not know this maze yet
+            self._maze = universe["maze"]
+            self._universe = CTFUniverse._from_json_dict(universe)
+        else:
+            self._update_universe(universe)
+        return self.team.get_move(bot_id, self._universe.copy(), game_state)
+
+    def _update_universe(self, universe):
+        """ Patches the dynamic state of a json universe into the
+        cached universe. The maze, the zones and the initial positions
+        are kept from `set_initial`.
+        """
+        cached = self._universe
+        for team, item in zip(cached.teams, universe["teams"]):
+            team.score = item["score"]
+        bots = cached.bots
+        for bot, item in zip(bots, universe["bots"]):
+            bot.current_pos = tuple(item["current_pos"])
+            bot.noisy = item["noisy"]
+        # re-assign to invalidate the state hash
+        cached.bots = bots
+        cached.food = universe["food"]
+        cached.bot_to_move = universe.get("bot_to_move", 0)
 
     def exit(self):
         raise ExitLoop()
@@ -611,6 +911,9 @@ class SimplePublisher(AbstractViewer):
     """ Sets up a simple Publisher which sends all viewed events
     over a zmq connection.
 
+    Only keyframes hold the whole universe, the other events only
+    hold the changes, see `DeltaEncoder`.
+
     Parameters
     ----------
     address : string
@@ -622,6 +925,7 @@ def __init__(self, address):
         self.socket = self.context.socket(zmq.PUB)
         self.socket_addr = bind_socket(self.socket, self.address, '--publish')
         _logger.debug("Bound zmq.PUB to {}".format(self.socket_addr))
+        self._encoder = DeltaEncoder()
 
 
     def _send(self, message):
@@ -630,14 +934,12 @@ def _send(self, message):
 
     def set_initial(self, universe, game_state):
         message = {"__action__": "set_initial",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.keyframe(universe, game_state)}
         self._send(message)
 
     def observe(self, universe, game_state):
         message = {"__action__": "observe",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.encode(universe, game_state)}
         self._send(message)
 
 class SimpleSubscriber(AbstractViewer):
@@ -654,6 +956,7 @@ class SimpleSubscriber(AbstractViewer):
     def __init__(self, viewer, address):
         self.viewer = viewer
         self.address = address
+        self._decoder = DeltaDecoder()
 
     def on_start(self):
         self.context = zmq.Context()
@@ -682,10 +985,14 @@ def _loop(self):
         getattr(self, action)(**data)
 
     def set_initial(self, universe, game_state):
-        return self.viewer.set_initial(CTFUniverse._from_json_dict(universe), game_state)
-
-    def observe(self, universe, game_state):
-        return self.viewer.observe(CTFUniverse._from_json_dict(universe), game_state)
+        return self.viewer.set_initial(self._decoder.decode(universe=universe), game_state)
+
+    def observe(self, game_state, universe=None, delta=None):
+        universe = self._decoder.decode(universe=universe, delta=delta)
+        if universe is None:
+            # we joined late and wait for the next keyframe
+            return
+        return self.viewer.observe(universe, game_state)
 
     def exit(self):
         raise ExitLoop()
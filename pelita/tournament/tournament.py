@@ -2,6 +2,7 @@
 # -*- coding:utf-8 -*-
 
 import builtins
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import io
 import json
 import os
@@ -82,8 +83,16 @@ def __init__(self, config):
         #: Individual matches will get a random seed derived from this.
         self.seed = config.get("seed", 42)
 
+        #: The noiser for the enemy positions. Maze distance is more
+        #: realistic than Manhattan distance for tournament games.
+        self.noiser = config.get("noiser", "maze")
+
         self.bonusmatch = config["bonusmatch"]
 
+        #: The number of round-robin matches which are played at once.
+        #: Each match runs its own processes for the game and the teams.
+        self.parallel_matches = config.get("parallel_matches", max(1, (os.cpu_count() or 1) // 3))
+
         self.speak = config.get("speak")
         self.speaker = config.get("speaker")
 
@@ -206,9 +215,15 @@ def round2(self):
         return self.state["round2"]
 
     def save(self, filename):
+        """ Saves the state atomically: the file is either the old
+        or the new state, even if we crash while writing. """
         if filename:
-            with open(filename, 'w') as f:
+            tmp_filename = filename + '.tmp'
+            with open(tmp_filename, 'w') as f:
                 yaml.dump(self.state, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_filename, filename)
 
     @classmethod
     def load(cls, config, filename):
@@ -245,23 +260,32 @@ def set_name(team):
         raise
 
 
-def play_game_with_config(config, teams):
-    team1, team2 = teams
+def match_dump_file(config, seed):
+    """ The dump file of a match, or None if there is no tournament log folder. """
+    if not config.tournament_log_folder:
+        return None
+    # the seed tells apart the dumps of matches which run at the same time
+    return os.path.join(config.tournament_log_folder, "dump-{time}-{seed}".format(time=time.strftime('%Y%m%d-%H%M%S'),
+                                                                                 seed=seed))
 
-    if config.tournament_log_folder:
-        dumpfile = os.path.join(config.tournament_log_folder, "dump-{time}".format(time=time.strftime('%Y%m%d-%H%M%S')))
-        dump = dumpfile
-    else:
-        dump = None
 
-    seed = str(random.randint(0, sys.maxsize))
+def play_game_with_config(config, teams, seed=None, viewer=None, dump=None):
+    team1, team2 = teams
+
+    if seed is None:
+        seed = str(random.randint(0, sys.maxsize))
+    if viewer is None:
+        viewer = config.viewer
+    if dump is None:
+        dump = match_dump_file(config, seed)
 
     res = libpelita.call_pelita([config.team_spec(team1), config.team_spec(team2)],
                                 rounds=config.rounds,
                                 filter=config.filter,
-                                viewer=config.viewer,
+                                viewer=viewer,
                                 dump=dump,
-                                seed=seed)
+                                seed=seed,
+                                noiser=config.noiser)
 
     if dump:
         (_final_state, stdout, stderr) = res
@@ -271,6 +295,19 @@ def play_game_with_config(config, teams):
     return res
 
 
+def uses_gui_viewer(config):
+    """ True if the matches are shown in a tk window. """
+    return bool(config.viewer) and config.viewer.startswith('tk')
+
+
+def replay_match(config, dump):
+    """ Shows a dumped match in the tk viewer and waits until it is closed. """
+    cmd = [libpelita.get_python_process(), '-m', 'pelita.scripts.pelita_main',
+           '--replay', dump, '--tk']
+    _logger.debug("Executing: %r", cmd)
+    subprocess.run(cmd)
+
+
 def start_match(config, teams, shuffle=False):
     """Start a match between a list of teams. Return the index of the team that won
     False if there was a draw.
@@ -290,20 +327,38 @@ def start_match(config, teams, shuffle=False):
     config.wait_for_keypress()
 
     (final_state, stdout, stderr) = play_game_with_config(config, teams)
-    try:
-        game_draw = final_state['game_draw']
-        team_wins = final_state['team_wins']
+    return present_match_result(config, teams, final_state, stdout, stderr)
+
+
+def match_winner(teams, final_state):
+    """ Returns the winning team of a match or False for a draw.
+
+    Raises
+    ------
+    TypeError, ValueError, KeyError
+        if the final state holds no outcome
+    """
+    if final_state['game_draw']:
+        return False
+    team_wins = final_state['team_wins']
+    if team_wins == 0 or team_wins == 1:
+        return teams[team_wins]
+    raise ValueError("No winner in final state.")
+
 
-        if game_draw:
+def present_match_result(config, teams, final_state, stdout, stderr):
+    """ Prints the outcome of a match. Returns the team that won,
+    False if there was a draw and None if the outcome is unknown.
+    """
+    team1, team2 = teams
+    try:
+        winner = match_winner(teams, final_state)
+        if winner is False:
             config.print('‘{t1}’ and ‘{t2}’ had a draw.'.format(t1=config.team_name(team1),
                                                                 t2=config.team_name(team2)))
-            return False
-        elif team_wins == 0 or team_wins == 1:
-            winner = teams[team_wins]
-            config.print('‘{team}’ wins'.format(team=config.team_name(winner)))
-            return winner
         else:
-            raise ValueError
+            config.print('‘{team}’ wins'.format(team=config.team_name(winner)))
+        return winner
     except (TypeError, ValueError, KeyError):
         config.print("Unable to parse winning result :(")
         config.print("*** ERROR: Apparently the game crashed. At least I could not find the outcome of the game.")
@@ -319,6 +374,11 @@ def start_match_with_replay(config, match, shuffle=False):
     """ Runs start_match until it returns a proper output or manual intervention. """
 
     winner = start_match(config, match, shuffle=shuffle)
+    return replay_until_decided(config, match, winner, shuffle=shuffle)
+
+
+def replay_until_decided(config, match, winner, shuffle=False):
+    """ Asks to re-play the match or to enter a winner, as long as `winner` is None. """
     while winner is None:
         config.print("Do you want to re-play the game or enter a winner manually?")
         res = config.input("(r)e-play/(0){}/(1){}/(d)raw > ".format(config.team_name(match[0]),
@@ -422,6 +482,10 @@ def round1(config, state):
     if not rr_unplayed:
         pp_round1_results(config, rr_played, rr_unplayed)
 
+    # a tk viewer can only show the parallel matches afterwards from their dumps
+    if config.parallel_matches > 1 and (config.tournament_log_folder or not uses_gui_viewer(config)):
+        round1_parallel(config, state)
+
     while rr_unplayed:
         match = rr_unplayed.pop()
 
@@ -440,6 +504,69 @@ def round1(config, state):
     return [team_id for team_id, p in round1_ranking(config, rr_played)]
 
 
+def round1_parallel(config, state):
+    """ Plays the unplayed matches of the first round, `config.parallel_matches`
+    at a time.
+
+    The matches run without a viewer. The state is saved after each
+    finished match. Afterwards, the matches are presented in the order in
+    which they have finished, and with a tk viewer they are replayed from
+    their dumps. Matches without an outcome are re-played or decided at
+    that point.
+    """
+    rr_unplayed = state.round1["unplayed"]
+    rr_played = state.round1["played"]
+
+    # the seeds are drawn here in the order of the matches
+    # and not in the order in which the threads start
+    matches = []
+    for match in reversed(rr_unplayed):
+        seed = str(random.randint(0, sys.maxsize))
+        matches.append((match, seed, match_dump_file(config, seed)))
+    presented = list(rr_played)
+    results = []
+
+    with ThreadPoolExecutor(max_workers=config.parallel_matches) as executor:
+        futures = {
+            executor.submit(play_game_with_config, config, match, seed=seed, viewer='null', dump=dump): (match, dump)
+            for match, seed, dump in matches
+        }
+        for future in as_completed(futures):
+            match, dump = futures[future]
+            final_state, stdout, stderr = future.result()
+            results.append((match, dump, final_state, stdout, stderr))
+            try:
+                winner = match_winner(match, final_state)
+            except (TypeError, ValueError, KeyError):
+                # we will ask for a re-play when presenting the match
+                _logger.info("No outcome for match {}.".format(match))
+                continue
+            rr_unplayed.remove(match)
+            rr_played.append({ "match": match, "winner": winner })
+            state.save(config.statefile)
+
+    for idx, (match, dump, final_state, stdout, stderr) in enumerate(results):
+        team1, team2 = match
+        config.print()
+        config.print('Starting match: '+ config.team_name(team1)+' vs ' + config.team_name(team2))
+        config.print()
+        config.wait_for_keypress()
+
+        if dump and uses_gui_viewer(config) and os.path.exists(dump):
+            replay_match(config, dump)
+
+        winner = present_match_result(config, match, final_state, stdout, stderr)
+        if winner is None:
+            winner = replay_until_decided(config, match, winner)
+            rr_unplayed.remove(match)
+            rr_played.append({ "match": match, "winner": winner })
+            state.save(config.statefile)
+        config.wait_for_keypress()
+
+        presented.append({ "match": match, "winner": winner })
+        pp_round1_results(config, presented, results[idx + 1:], highlight=match)
+
+
 def recur_match_winner(match):
     """ Returns the team id of the unambiguous winner.
 
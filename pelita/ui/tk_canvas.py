@@ -7,8 +7,8 @@
 import tkinter
 import tkinter.font
 
-from ..datamodel import CTFUniverse
 from ..libpelita import firstNN
+from ..viewer import DeltaDecoder
 from .tk_sprites import BotSprite, Food, Wall, col
 from .tk_utils import wm_delete_window_handler
 from .tk_sprites import BotSprite, Food, Wall, RED, BLUE, YELLOW, GREY, BROWN
@@ -142,6 +142,7 @@ def __init__(self, master, controller_address=None,
 
         self._universe = None
         self._game_state = None
+        self._decoder = DeltaDecoder()
 
         self.ui = UI()
 
@@ -690,8 +691,7 @@ def request_round(self):
                 self.controller_socket.send_json({"__action__": "play_round"})
 
     def observe(self, data):
-        universe = data["universe"]
-        universe = CTFUniverse._from_json_dict(universe)
+        universe = self._decoder.decode(universe=data.get("universe"), delta=data.get("delta"))
         game_state = data["game_state"]
 
         self.update(universe, game_state)
@@ -0,0 +1,286 @@
+""" Lock-step simulation of many games on the same layout with numpy.
+
+`LockstepGames` holds K independent games as arrays and applies the move
+of one bot in all K games at once. The rules are those of
+`CTFUniverse.move_bot`, so each game ends exactly like it would on a
+universe which was given the same moves.
+
+The games are driven by batched policies. A policy is a callable
+``policy(games, bot_id)`` which returns the index into `MOVES` of the move
+of `bot_id` in each game, as an integer array of length K.
+
+Examples
+--------
+Play 1000 games between two random policies:
+
+    >>> games = LockstepGames(layout_str, 1000)
+    >>> rng = np.random.RandomState(1)
+    >>> games.play([random_policy(rng), random_policy(rng)], game_time=300)
+    >>> (games.winner == 0).mean()
+"""
+
+import numpy as np
+
+from .datamodel import Bot, CTFUniverse, IllegalMoveException, Maze, Team, moves
+
+#: The moves in the order used for the move indices.
+MOVES = tuple(moves)
+
+
+class LockstepGames:
+    """ K independent games on the same layout.
+
+    The positions are given as cells, the linear index ``x + y * width``
+    of a position in the maze.
+
+    Parameters
+    ----------
+    layout_str : str
+        the layout
+    number_games : int
+        the number of games K
+    number_bots : int, optional
+        the number of bots in each game
+
+    Attributes
+    ----------
+    positions : ndarray of int, shape (K, number_bots)
+        the cell of each bot
+    food : ndarray of bool, shape (K, width * height)
+        the food in each game
+    score : ndarray of int, shape (K, number_teams)
+        the score of each team
+    zone_food : ndarray of int, shape (K, number_teams)
+        the amount of food in the zone of each team
+    round_index : ndarray of int, shape (K,)
+        the current (or, if finished, the last) round of each game
+    finished : ndarray of bool, shape (K,)
+        True for the games which are over
+    winner : ndarray of int, shape (K,)
+        the index of the winning team or -1 for a draw or a running game
+    legal : ndarray of int, shape (width * height, len(MOVES))
+        the target cell of each move from each cell or -1 if it is illegal
+    zone : ndarray of bool, shape (number_teams, width * height)
+        True for the cells in the zone of each team
+
+    """
+
+    #: the number of points to score when killing
+    KILLPOINTS = CTFUniverse.KILLPOINTS
+
+    def __init__(self, layout_str, number_games, number_bots=4):
+        universe = CTFUniverse.create(layout_str, number_bots)
+        maze = universe.maze
+        self.maze = maze
+        self.width = maze.width
+        self.height = maze.height
+        self.number_games = number_games
+        self.number_bots = number_bots
+
+        size = self.width * self.height
+        self.cell_positions = [maze._index_linear_to_tuple(cell) for cell in range(size)]
+        cell_x = np.array([pos[0] for pos in self.cell_positions])
+
+        self.legal = np.full((size, len(MOVES)), -1, dtype=np.intp)
+        move_index = {move: index for index, move in enumerate(MOVES)}
+        for cell, pos in enumerate(self.cell_positions):
+            for move, (new_x, new_y) in maze.legal_moves_table[pos]:
+                self.legal[cell, move_index[move]] = new_x + new_y * self.width
+
+        self.teams = universe.teams
+        self.zone = np.array([(team.zone[0] <= cell_x) & (cell_x <= team.zone[1])
+                              for team in self.teams])
+        self.bot_team = np.array([bot.team_index for bot in universe.bots])
+        self.initial_positions = np.array([self.cell(bot.initial_pos) for bot in universe.bots])
+
+        food = np.zeros(size, dtype=bool)
+        for pos in universe.food:
+            food[self.cell(pos)] = True
+
+        self.positions = np.tile(self.initial_positions, (number_games, 1))
+        self.food = np.tile(food, (number_games, 1))
+        self.score = np.zeros((number_games, len(self.teams)), dtype=int)
+        self.zone_food = np.tile(self.zone.astype(int).dot(food), (number_games, 1))
+        self.round_index = np.zeros(number_games, dtype=int)
+        self.finished = np.zeros(number_games, dtype=bool)
+        self.winner = np.full(number_games, -1, dtype=int)
+        self._check_food()
+
+    def cell(self, position):
+        """ The cell of a position. """
+        x, y = position
+        return x + y * self.width
+
+    def position(self, cell):
+        """ The position of a cell. """
+        return self.cell_positions[cell]
+
+    def enemy_food_count(self, team_index):
+        """ The food which `team_index` still has to eat in each game. """
+        return self.zone_food.sum(axis=1) - self.zone_food[:, team_index]
+
+    def legal_moves(self, bot_id):
+        """ The legal moves of a bot in each game.
+
+        Returns
+        -------
+        legal : ndarray of bool, shape (K, len(MOVES))
+            True for the legal moves
+
+        """
+        return self.legal[self.positions[:, bot_id]] >= 0
+
+    def move_bot(self, bot_id, move_indices):
+        """ Moves a bot in all running games.
+
+        Applies the rules of `CTFUniverse.move_bot`: A bot outside of its
+        homezone eats the food it steps on. A harvester which meets a
+        destroyer on the same cell is reset to its initial position and the
+        team of the destroyer scores `KILLPOINTS`. Games which are finished
+        are not changed.
+
+        Parameters
+        ----------
+        bot_id : int
+            index of the bot
+        move_indices : array of int, shape (K,)
+            the index into `MOVES` of the move in each game
+
+        Raises
+        ------
+        IllegalMoveException
+            if the move is illegal in one of the running games
+
+        """
+        games = np.flatnonzero(~self.finished)
+        old = self.positions[games, bot_id]
+        new = self.legal[old, np.asarray(move_indices)[games]]
+        if (new < 0).any():
+            raise IllegalMoveException(
+                'Illegal move from bot_id %r in games %s' % (bot_id, games[new < 0].tolist()))
+        self.positions[games, bot_id] = new
+
+        # check for food being eaten
+        team = self.bot_team[bot_id]
+        at_home = self.zone[team, new]
+        eaten = self.food[games, new] & ~at_home
+        eaten_games = games[eaten]
+        eaten_cells = new[eaten]
+        self.food[eaten_games, eaten_cells] = False
+        self.score[eaten_games, team] += 1
+        for zone_index, in_zone in enumerate(self.zone):
+            self.zone_food[eaten_games, zone_index] -= in_zone[eaten_cells]
+
+        # check for destruction, enemy by enemy like CTFUniverse does
+        bot_destroyed = np.zeros(len(games), dtype=bool)
+        for enemy in range(self.number_bots):
+            enemy_team = self.bot_team[enemy]
+            if enemy_team == team:
+                continue
+            same_cell = self.positions[games, enemy] == new
+            enemy_at_home = self.zone[enemy_team, new]
+            destroyed_by_enemy = same_cell & enemy_at_home & ~at_home & ~bot_destroyed
+            enemy_destroyed = same_cell & at_home & ~enemy_at_home
+
+            bot_destroyed |= destroyed_by_enemy
+            self.score[games[destroyed_by_enemy], enemy_team] += self.KILLPOINTS
+            self.score[games[enemy_destroyed], team] += self.KILLPOINTS
+            self.positions[games[enemy_destroyed], enemy] = self.initial_positions[enemy]
+
+        self.positions[games[bot_destroyed], bot_id] = self.initial_positions[bot_id]
+        self._check_food()
+
+    def _check_food(self):
+        """ Finishes the games in which a team has no food left to eat. """
+        no_food = np.zeros(self.number_games, dtype=bool)
+        for team in self.teams:
+            no_food |= self.enemy_food_count(team.index) == 0
+        self._finish(no_food & ~self.finished)
+
+    def _finish(self, games):
+        """ Finishes the given games and decides the winners. """
+        self.finished |= games
+        team_0, team_1 = self.score[:, 0], self.score[:, 1]
+        self.winner[games & (team_0 > team_1)] = 0
+        self.winner[games & (team_0 < team_1)] = 1
+
+    def play(self, policies, game_time):
+        """ Plays all games until they are finished.
+
+        The bots move in the order of their index, like in `GameMaster`, and
+        each bot is controlled by the policy of its team. A game ends when a
+        team has eaten all of its enemy food or after `game_time` rounds.
+
+        Parameters
+        ----------
+        policies : list of callables
+            the batched policy of each team
+        game_time : int
+            the total permitted number of rounds
+
+        """
+        for round_index in range(game_time):
+            if self.finished.all():
+                return
+            self.round_index[~self.finished] = round_index
+            for bot_id in range(self.number_bots):
+                if self.finished.all():
+                    return
+                move_indices = policies[self.bot_team[bot_id]](self, bot_id)
+                self.move_bot(bot_id, move_indices)
+        self.round_index[~self.finished] = game_time
+        self._finish(~self.finished)
+
+    def universe(self, game):
+        """ A `CTFUniverse` with the state of a single game.
+
+        Parameters
+        ----------
+        game : int
+            the index of the game
+
+        Returns
+        -------
+        universe : CTFUniverse
+            the universe
+
+        """
+        teams = [Team(team.index, team.zone, int(self.score[game, team.index]))
+                 for team in self.teams]
+        bots = [Bot(bot_id, self.position(self.initial_positions[bot_id]),
+                    int(self.bot_team[bot_id]), teams[self.bot_team[bot_id]].zone,
+                    current_pos=self.position(self.positions[game, bot_id]))
+                for bot_id in range(self.number_bots)]
+        food = [self.position(cell) for cell in np.flatnonzero(self.food[game])]
+        maze = Maze(self.width, self.height, data=list(self.maze._data))
+        return CTFUniverse(maze, food, teams, bots)
+
+
+def random_policy(rng):
+    """ A batched policy which chooses uniformly among the legal moves.
+
+    Like `RandomPlayer`, it only stops when there is no other legal move.
+
+    Parameters
+    ----------
+    rng : numpy.random.RandomState
+        the random number generator
+
+    Returns
+    -------
+    policy : callable
+        the policy
+
+    """
+    stop_index = MOVES.index((0, 0))
+
+    def policy(games, bot_id):
+        legal = games.legal_moves(bot_id)
+        # only stop if there is nothing else to do
+        can_move = legal.sum(axis=1) > 1
+        legal[can_move, stop_index] = False
+        # choose the n-th legal move with a random n
+        choice = (rng.random_sample(len(legal)) * legal.sum(axis=1)).astype(int)
+        return (legal.cumsum(axis=1) > choice[:, None]).argmax(axis=1)
+
+    return policy
@@ -6,6 +6,112 @@
 
 import zmq
 
+from .datamodel import CTFUniverse
+
+#: The number of messages after which a `DeltaEncoder` sends a keyframe
+KEYFRAME_INTERVAL = 100
+
+
+def _food_count(universe):
+    # the total amount of food, without iterating over it
+    return sum(universe.team_food_count(team.index) for team in universe.teams)
+
+
+class DeltaEncoder:
+    """ Encodes the universe of each step as the change to the previous step.
+
+    A keyframe holds the whole universe. The other messages only hold a
+    delta with the positions of the bots, the food which was eaten in this
+    step, the scores and the bot to move. A keyframe is sent for the first
+    message, after every `keyframe_interval` messages (so that late
+    subscribers can join) and whenever the delta would not describe the
+    change of the universe, e.g. when food appeared.
+
+    Parameters
+    ----------
+    keyframe_interval : int, optional
+        the maximum number of messages between two keyframes
+
+    """
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._since_keyframe = None
+        self._food_count = None
+
+    def keyframe(self, universe, game_state):
+        """ The data of a message with the whole universe. """
+        self._since_keyframe = 0
+        self._food_count = _food_count(universe)
+        return {"universe": universe._to_json_dict(),
+                "game_state": game_state}
+
+    def encode(self, universe, game_state):
+        """ The data of a message with the change of the universe. """
+        if self._since_keyframe is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            return self.keyframe(universe, game_state)
+
+        bots = universe.bots
+        food_eaten = [food["food_pos"] for food in game_state.get("food_eaten", [])]
+        food_count = _food_count(universe)
+        if (food_count != self._food_count - len(food_eaten) or
+                any(bot.noisy for bot in bots)):
+            return self.keyframe(universe, game_state)
+
+        self._since_keyframe += 1
+        self._food_count = food_count
+        return {"delta": {"bots": [bot.current_pos for bot in bots],
+                          "food_eaten": food_eaten,
+                          "score": [team.score for team in universe.teams],
+                          "bot_to_move": universe.bot_to_move},
+                "game_state": game_state}
+
+
+class DeltaDecoder:
+    """ Reconstructs the universes from the messages of a `DeltaEncoder`.
+
+    Attributes
+    ----------
+    universe : CTFUniverse or None
+        the current universe or None before the first keyframe
+
+    """
+    def __init__(self):
+        self.universe = None
+
+    def decode(self, universe=None, delta=None):
+        """ Updates the universe with a keyframe or a delta.
+
+        Parameters
+        ----------
+        universe : dict, optional
+            the json dict of the universe in a keyframe
+        delta : dict, optional
+            the delta to the previous universe
+
+        Returns
+        -------
+        universe : CTFUniverse or None
+            a copy of the current universe or None, if no keyframe
+            has been received yet
+
+        """
+        if universe is not None:
+            self.universe = CTFUniverse._from_json_dict(universe)
+        elif self.universe is None:
+            return None
+        elif delta is not None:
+            current = self.universe
+            for bot, position in zip(current.bots, delta["bots"]):
+                bot.current_pos = tuple(position)
+            food = current.food
+            for position in delta["food_eaten"]:
+                food.discard(tuple(position))
+            for team, score in zip(current.teams, delta["score"]):
+                team.score = score
+            current.bot_to_move = delta.get("bot_to_move", 0)
+        return self.universe.copy()
+
+
 class AbstractViewer(metaclass=abc.ABCMeta):
     def set_initial(self, universe, game_state):
         """ This method is called when the first universe is ready.
@@ -61,6 +167,8 @@ def observe(self, universe, game_state):
 
 class ReplyToViewer(AbstractViewer):
     """ A viewer which dumps to a given stream.
+
+    Only keyframes hold the whole universe, see `DeltaEncoder`.
     """
     def __init__(self, reply_to):
         ctx = zmq.Context()
@@ -75,6 +183,8 @@ def __init__(self, reply_to):
         self.pollout = zmq.Poller()
         self.pollout.register(self.sock, zmq.POLLOUT)
 
+        self._encoder = DeltaEncoder()
+
     def _send(self, message):
         socks = dict(self.pollout.poll(300))
         if socks.get(self.sock) == zmq.POLLOUT:
@@ -83,22 +193,24 @@ def _send(self, message):
 
     def set_initial(self, universe, game_state):
         message = {"__action__": "set_initial",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.keyframe(universe, game_state)}
         self._send(message)
 
     def observe(self, universe, game_state):
         message = {"__action__": "observe",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.encode(universe, game_state)}
         self._send(message)
 
 
 class DumpingViewer(AbstractViewer):
     """ A viewer which dumps to a given stream.
+
+    Only keyframes hold the whole universe, see `DeltaEncoder`. The
+    universes can be reconstructed with a `DeltaDecoder`.
     """
-    def __init__(self, stream):
+    def __init__(self, stream, keyframe_interval=KEYFRAME_INTERVAL):
         self.stream = stream
+        self._encoder = DeltaEncoder(keyframe_interval)
 
     def _send(self, message):
         as_json = json.dumps(message)
@@ -111,13 +223,11 @@ def _send(self, message):
 
     def set_initial(self, universe, game_state):
         message = {"__action__": "set_initial",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.keyframe(universe, game_state)}
         self._send(message)
 
     def observe(self, universe, game_state):
         message = {"__action__": "observe",
-                   "__data__": {"universe": universe._to_json_dict(),
-                                "game_state": game_state}}
+                   "__data__": self._encoder.encode(universe, game_state)}
         self._send(message)
 
@@ -124,6 +124,8 @@ def run_tests(self):
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
+        # faster binary protocol for the remote players
+        'msgpack': ['msgpack>=1.0'],
     },
 
     # If there are data files included in your packages that need to be
@@ -147,6 +149,7 @@ def run_tests(self):
             'pelita-tournament=pelita.scripts.pelita_tournament:main',
             'pelita-tkviewer=pelita.scripts.pelita_tkviewer:main',
             'pelita-player=pelita.scripts.pelita_player:main',
+            'pelita-batch=pelita.scripts.pelita_batch:main',
         ],
     },
 
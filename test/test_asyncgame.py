@@ -0,0 +1,120 @@
+import pytest
+
+import asyncio
+import time
+import uuid
+
+import zmq
+
+from pelita.asyncgame import AsyncGameMaster, AsyncRemoteTeamPlayer
+from pelita.game_master import GameMaster
+from pelita.player import SimpleTeam, SteppingPlayer
+from pelita.simplesetup import SimpleClient
+from pelita.viewer import AbstractViewer
+
+
+layout = """
+    ##########
+    #        #
+    #0  ..  1#
+    ##########
+    """
+
+def stepping_teams():
+    return [SimpleTeam("team1", SteppingPlayer("^>>v<")),
+            SimpleTeam("team2", SteppingPlayer("^<<v>"))]
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+def remote_team(context, team):
+    address = "ipc:///tmp/pelita-test-async-%s" % uuid.uuid4()
+    socket = context.socket(zmq.PAIR)
+    socket.bind(address)
+    client = SimpleClient(team, address=address)
+    return AsyncRemoteTeamPlayer(socket), client.autoplay_process()
+
+
+class SlowViewer(AbstractViewer):
+    def __init__(self):
+        self.rounds = []
+
+    def observe(self, universe, game_state):
+        time.sleep(0.05)
+        self.rounds.append((game_state["round_index"], game_state["bot_id"]))
+
+
+class TestAsyncGameMaster:
+    def test_local_game(self):
+        gm = GameMaster(layout, stepping_teams(), 2, 5, seed=1)
+        gm.play()
+
+        async_gm = AsyncGameMaster(layout, stepping_teams(), 2, 5, seed=1)
+        viewer = SlowViewer()
+        async_gm.register_viewer(viewer)
+        run(async_gm.play())
+
+        assert async_gm.universe == gm.universe
+        assert async_gm.game_state["finished"]
+        # all updates have been observed in order
+        assert viewer.rounds[:2] == [(0, 0), (0, 1)]
+        assert len(viewer.rounds) == 11
+
+    def test_play_step(self):
+        gm = GameMaster(layout, stepping_teams(), 2, 5, seed=1)
+        async_gm = AsyncGameMaster(layout, stepping_teams(), 2, 5, seed=1)
+        gm.set_initial()
+        run(async_gm.set_initial())
+        while not gm.game_state["finished"]:
+            gm.play_step()
+            run(async_gm.play_step())
+            assert async_gm.universe == gm.universe
+            assert async_gm.game_state["bot_id"] == gm.game_state["bot_id"]
+        assert async_gm.game_state["finished"]
+
+    def test_concurrent_remote_games(self):
+        context = zmq.Context()
+        game_masters = []
+        processes = []
+        for game in range(3):
+            players = [remote_team(context, team) for team in stepping_teams()]
+            processes.extend(process for _player, process in players)
+            game_masters.append(AsyncGameMaster(layout, [player for player, _process in players], 2, 5, seed=game))
+
+        async def play_all():
+            await asyncio.gather(*[gm.play() for gm in game_masters])
+            for gm in game_masters:
+                for team in gm.player_teams:
+                    team._exit()
+        run(play_all())
+        for process in processes:
+            process.join()
+
+        gm = GameMaster(layout, stepping_teams(), 2, 5, seed=0)
+        gm.play()
+        for async_gm in game_masters:
+            assert async_gm.game_state["team_name"] == ["team1", "team2"]
+            assert async_gm.universe == gm.universe
+
+    def test_timeout(self):
+        context = zmq.Context()
+        address = "ipc:///tmp/pelita-test-async-%s" % uuid.uuid4()
+        socket = context.socket(zmq.PAIR)
+        socket.bind(address)
+        # a client which never answers
+        client_socket = context.socket(zmq.PAIR)
+        client_socket.connect(address)
+        silent_player = AsyncRemoteTeamPlayer(socket)
+        gm = AsyncGameMaster(layout, [silent_player, stepping_teams()[1]], 2, 5,
+                             timeout_length=0.1, max_timeouts=2)
+        run(gm.play())
+        assert gm.game_state["teams_disqualified"] == ["timeout", None]
+        assert gm.game_state["team_wins"] == 1
+        client_socket.close()
+        socket.close()
@@ -0,0 +1,82 @@
+import pytest
+
+from pelita.batch import GameResult, make_team, play_game, play_games, summarize
+from pelita.compact import CompactUniverse
+from pelita.datamodel import CTFUniverse
+from pelita.layout import get_layout_by_name
+from pelita.player import SimpleTeam, StoppingPlayer, Team
+
+
+TEAM_NAME = "stoppers"
+
+def stopping_move(bot, state):
+    return (0, 0), state
+
+
+test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+
+class TestBatch:
+    def test_make_team(self):
+        team = make_team(stopping_move)
+        assert isinstance(team, Team)
+        assert team.team_name == "stoppers"
+
+        simple_team = SimpleTeam("simple", StoppingPlayer(), StoppingPlayer())
+        assert make_team(simple_team) is not simple_team
+        assert isinstance(make_team(lambda: simple_team), SimpleTeam)
+
+        with pytest.raises(TypeError):
+            make_team(5)
+
+    def test_play_game(self):
+        result = play_game(['0', stopping_move], "test", test_layout, rounds=20, seed=1)
+        assert isinstance(result, GameResult)
+        assert result.team_name[1] == "stoppers"
+        assert result.rounds <= 20
+        assert result.winner == 0
+        assert result.score[0] > 0 == result.score[1]
+        assert result.timeouts == (0, 0)
+
+    def test_universe_class(self):
+        compact = play_game(['0', '1'], "test", test_layout, rounds=20, seed=2)
+        generic = play_game(['0', '1'], "test", test_layout, rounds=20, seed=2,
+                            universe_class=CTFUniverse)
+        assert compact.score == generic.score
+        assert compact.winner == generic.winner
+
+    def test_universe_class_seeded_game(self):
+        # the food eating players pick their targets from the food lists,
+        # so both engines have to play exactly the same game
+        layout_name = "layout_big_with_dead_ends_001"
+        layout_string = get_layout_by_name(layout_name)
+        results = [play_game(['0', '0'], layout_name, layout_string, rounds=100, seed=4,
+                             universe_class=universe_class)
+                   for universe_class in (CompactUniverse, CTFUniverse)]
+        fields = ("winner", "score", "rounds", "timeouts", "disqualified")
+        compact, generic = [[getattr(result, field) for field in fields] for result in results]
+        assert compact == generic
+
+    def test_play_games(self):
+        results = play_games(['0', stopping_move], 4, filter='small', rounds=10,
+                             seed=3, processes=1)
+        assert [result.game for result in results] == [0, 1, 2, 3]
+        assert all('small' in result.layout_name for result in results)
+
+        summary = summarize(results)
+        assert sum(summary[0][key] for key in ("wins", "losses", "draws")) == 4
+        assert summary[0]["wins"] == summary[1]["losses"]
+
+        # the result does not depend on the number of processes
+        parallel = play_games(['0', stopping_move], 4, filter='small', rounds=10,
+                              seed=3, processes=2)
+        assert [result[:6] for result in parallel] == [result[:6] for result in results]
+
+    def test_no_layout(self):
+        with pytest.raises(ValueError):
+            play_games(['0', '1'], 1, filter='no such layout')
@@ -0,0 +1,182 @@
+import pytest
+
+import random
+
+from pelita.compact import CompactUniverse
+from pelita.datamodel import Bot, CTFUniverse, IllegalMoveException, Maze, Team, north, south, west
+from pelita.game_master import GameMaster
+from pelita.layout import get_layout_by_name
+from pelita.player import SimpleTeam, RandomPlayer, NQRandomPlayer
+
+
+test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+
+class TestCompactUniverse:
+    def test_create(self):
+        universe = CTFUniverse.create(test_layout, 4)
+        compact = CompactUniverse.create(test_layout, 4)
+        assert compact._to_json_dict()["maze"] == universe._to_json_dict()["maze"]
+        assert compact.food == universe.food
+        assert compact.bot_positions == universe.bot_positions
+        assert compact.teams == universe.teams
+        for team in compact.teams:
+            assert sorted(compact.team_food(team.index)) == sorted(universe.team_food(team.index))
+            assert sorted(compact.enemy_food(team.index)) == sorted(universe.enemy_food(team.index))
+        assert compact.compact_str == universe.compact_str
+        assert compact.team_border(0) == universe.team_border(0)
+
+    def test_legal_moves(self):
+        universe = CTFUniverse.create(test_layout, 4)
+        compact = CompactUniverse.create(test_layout, 4)
+        for pos in universe.maze.positions + [(-1, 0), (18, 4)]:
+            assert list(compact.legal_moves(pos).items()) == list(universe.legal_moves(pos).items())
+        for pos, _ in universe.free_positions():
+            assert compact.legal_moves_or_stop(pos) == universe.legal_moves_or_stop(pos)
+
+    def test_illegal_move(self):
+        compact = CompactUniverse.create(test_layout, 4)
+        with pytest.raises(IllegalMoveException):
+            compact.move_bot(0, north)
+        with pytest.raises(IllegalMoveException):
+            compact.move_bot(0, (2, 0))
+        # unhashable moves are illegal, too, as they are in CTFUniverse
+        with pytest.raises(IllegalMoveException):
+            compact.move_bot(0, [0, 1])
+        with pytest.raises(IllegalMoveException):
+            CTFUniverse.create(test_layout, 4).move_bot(0, [0, 1])
+
+    def test_random_games(self):
+        # both engines must produce the same states and events
+        rng = random.Random(1)
+        for _game in range(10):
+            universe = CTFUniverse.create(test_layout, 4)
+            compact = CompactUniverse.create(test_layout, 4)
+            for _step in range(200):
+                bot_id = rng.randrange(4)
+                moves = list(universe.legal_moves(universe.bots[bot_id].current_pos).keys())
+                move = rng.choice(moves)
+                assert compact.move_bot(bot_id, move) == universe.move_bot(bot_id, move)
+                assert compact.bot_positions == universe.bot_positions
+                assert compact.food == universe.food
+                assert compact.teams == universe.teams
+                for team in universe.teams:
+                    assert compact.team_food_count(team.index) == universe.team_food_count(team.index)
+                    assert compact.enemy_food_count(team.index) == universe.enemy_food_count(team.index)
+                    # players pick food from these lists, so the order matters
+                    assert compact.team_food(team.index) == universe.team_food(team.index)
+                    assert compact.enemy_food(team.index) == universe.enemy_food(team.index)
+
+    def test_food_order(self):
+        # players pick food by index, so both engines must list it alike
+        rng = random.Random(3)
+        layout = get_layout_by_name("layout_big_with_dead_ends_001")
+        universe = CTFUniverse.create(layout, 4)
+        compact = CompactUniverse.create(layout, 4)
+        for _step in range(300):
+            for team in universe.teams:
+                assert compact.team_food(team.index) == universe.team_food(team.index)
+                assert compact.enemy_food(team.index) == universe.enemy_food(team.index)
+            bot_id = rng.randrange(4)
+            move = rng.choice(list(universe.legal_moves(universe.bots[bot_id].current_pos)))
+            compact.move_bot(bot_id, move)
+            universe.move_bot(bot_id, move)
+            if rng.random() < 0.1:
+                # the order does not depend on copies or serialisation
+                universe = CTFUniverse._from_json_dict(universe.copy()._to_json_dict())
+                compact = compact.copy()
+
+    def test_apply_move_undo(self):
+        rng = random.Random(2)
+        universe = CTFUniverse.create(test_layout, 4)
+        compact = CompactUniverse.create(test_layout, 4)
+        tokens = []
+        for _step in range(300):
+            bot_id = rng.randrange(4)
+            move = rng.choice(list(universe.legal_moves(universe.bots[bot_id].current_pos)))
+            token = compact.apply_move(bot_id, move)
+            assert token == universe.apply_move(bot_id, move)
+            assert compact.state_hash == universe.state_hash
+            tokens.append(token)
+        for token in reversed(tokens):
+            compact.undo(token)
+            universe.undo(token)
+            assert compact.bot_positions == universe.bot_positions
+            assert compact.food == universe.food
+            assert compact.teams == universe.teams
+            assert compact.enemy_food_count(0) == universe.enemy_food_count(0)
+        assert compact == CompactUniverse.create(test_layout, 4)
+
+    def test_kill(self):
+        layout = (
+            """ ######
+                #01  #
+                #2  3#
+                ###### """)
+        compact = CompactUniverse.create(layout, 4)
+        game_state = compact.move_bot(1, west)
+        assert game_state["bot_destroyed"] == [{"bot_id": 1, "destroyed_by": 0}]
+        assert compact.bots[1].current_pos == (2, 1)
+        assert compact.teams[0].score == CompactUniverse.KILLPOINTS
+
+    def test_copy(self):
+        compact = CompactUniverse.create(test_layout, 4)
+        uni_copy = compact.copy()
+        assert compact == uni_copy
+        assert uni_copy._tables is compact._tables
+        uni_copy.move_bot(0, south)
+        uni_copy.food = set()
+        assert compact != uni_copy
+        assert compact.bots[0].current_pos == (1, 1)
+        assert compact.food
+        assert compact == compact.copy()
+
+    def test_food_view(self):
+        compact = CompactUniverse.create(test_layout, 4)
+        universe = CTFUniverse.create(test_layout, 4)
+        position = next(iter(universe.food))
+        for uni in [compact, universe]:
+            uni.food.remove(position)
+            uni.food.add((1, 1))
+        assert compact.food == universe.food
+        assert (1, 1) in compact.food
+        assert position not in compact.food
+        assert (-1, 0) not in compact.food
+        for team in universe.teams:
+            assert compact.team_food_count(team.index) == universe.team_food_count(team.index)
+            assert compact.food.count_in_zone(team.index) == universe.food.count_in_zone(team.index)
+            assert sorted(compact.food.outside_zone(team.index)) == sorted(universe.food.outside_zone(team.index))
+
+    def test_json(self):
+        compact = CompactUniverse.create(test_layout, 4)
+        compact.move_bot(1, south)
+        json_dict = compact._to_json_dict()
+        assert CompactUniverse._from_json_dict(json_dict) == compact
+        assert CTFUniverse._from_json_dict(compact._to_json_dict()).bot_positions == compact.bot_positions
+
+    def test_repr(self):
+        compact = CompactUniverse.create(test_layout, 4)
+        assert compact == eval(repr(compact))
+
+    def test_game_master(self):
+        def play(universe_class):
+            teams = [
+                SimpleTeam(RandomPlayer(), NQRandomPlayer()),
+                SimpleTeam(NQRandomPlayer(), RandomPlayer())
+            ]
+            gm = GameMaster(test_layout, teams, 4, 50, seed=20, universe_class=universe_class)
+            gm.play()
+            return gm
+
+        gm = play(CTFUniverse)
+        compact_gm = play(CompactUniverse)
+        assert isinstance(compact_gm.universe, CompactUniverse)
+        assert compact_gm.universe.bot_positions == gm.universe.bot_positions
+        assert compact_gm.universe.food == gm.universe.food
+        assert compact_gm.game_state["team_wins"] == gm.game_state["team_wins"]
+        assert compact_gm.game_state["food_count"] == gm.game_state["food_count"]
@@ -1,4 +1,7 @@
 import pytest
+import copy
+import pickle
+import random
 import unittest
 
 from pelita.datamodel import *
@@ -200,6 +203,64 @@ def test_eq_repr(self):
         maze = Maze(2, 1, data=[True, False])
         assert maze == eval(repr(maze))
 
+    def test_legal_moves_table(self):
+        maze = Maze(3, 2, data=[False, False, True,
+                                True, False, False])
+        table = maze.legal_moves_table
+        assert table[(0, 0)] == ((east, (1, 0)), (stop, (0, 0)))
+        assert table[(1, 0)] == ((south, (1, 1)), (west, (0, 0)), (stop, (1, 0)))
+        # a wall has no stop move
+        assert table[(2, 0)] == ((south, (2, 1)), (west, (1, 0)))
+        assert maze.legal_moves_table is table
+        # mazes with the same walls share the table
+        assert Maze(3, 2, data=list(maze._data)).legal_moves_table is table
+        with pytest.raises(TypeError):
+            table[(0, 0)] = ()
+
+        # changing the walls invalidates the table
+        maze[1, 1] = True
+        assert maze.legal_moves_table is not table
+        assert maze.legal_moves_table[(1, 0)] == ((west, (0, 0)), (stop, (1, 0)))
+
+        # the cached table does not get in the way of pickling
+        maze_copy = pickle.loads(pickle.dumps(maze))
+        assert maze_copy == maze
+        assert maze_copy.legal_moves_table is maze.legal_moves_table
+        assert copy.deepcopy(maze) == maze
+
+
+class TestFoodIndex:
+    def test_zones(self):
+        food = FoodIndex([(1, 1), [2, 1], (3, 2), (6, 1)], [(0, 1), (2, 3)])
+        assert food == {(1, 1), (2, 1), (3, 2), (6, 1)}
+        assert (2, 1) in food
+        assert len(food) == 4
+        assert food.in_zone(0) == [(1, 1)]
+        assert sorted(food.in_zone(1)) == [(2, 1), (3, 2)]
+        assert sorted(food.outside_zone(0)) == [(2, 1), (3, 2), (6, 1)]
+        assert food.count_in_zone(1) == 2
+        assert food.count_outside_zone(1) == 2
+
+    def test_mutation(self):
+        food = FoodIndex([(1, 1), (2, 1)], [(0, 1), (2, 3)])
+        food.remove((2, 1))
+        with pytest.raises(KeyError):
+            food.remove((2, 1))
+        food.discard((3, 3))
+        food.add((3, 3))
+        food.add((3, 3))
+        assert food.in_zone(1) == [(3, 3)]
+        assert food.count_in_zone(1) == 1
+        food.pop()
+        food.pop()
+        assert not food
+        assert food.count_in_zone(0) == food.count_in_zone(1) == 0
+
+    def test_repr(self):
+        food = FoodIndex([(1, 1), (2, 1)], [(0, 1), (2, 3)])
+        assert food == eval(repr(food))
+        assert food.zones == eval(repr(food)).zones
+
 
 class TestCTFUniverse:
 
@@ -225,6 +286,8 @@ def test_factory(self):
         unittest.TestCase().assertCountEqual(universe.enemy_food(0), team_white_food)
         unittest.TestCase().assertCountEqual(universe.team_food(1), team_white_food)
         unittest.TestCase().assertCountEqual(universe.enemy_food(1), team_black_food)
+        assert universe.team_food_count(0) == universe.enemy_food_count(1) == 3
+        assert universe.team_food_count(1) == universe.enemy_food_count(0) == 3
 
         assert [b.initial_pos for b in universe.bots] == \
                 [(1, 1), (1, 2), (16, 2), (16, 3)]
@@ -334,6 +397,147 @@ def test_copy(self):
         assert universe != uni_copy
         assert universe == universe.copy()
 
+    def test_apply_move_undo(self):
+        test_layout = (
+        """ ########
+            #0 .. 3#
+            #2.  .1#
+            ######## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        rng = random.Random(1)
+        history = []
+        tokens = []
+        for _step in range(300):
+            history.append((universe.copy(), universe.team_food_count(0)))
+            bot_id = rng.randrange(4)
+            move = rng.choice(list(universe.legal_moves(universe.bots[bot_id].current_pos)))
+            tokens.append(universe.apply_move(bot_id, move))
+        # kills and food
+        assert any(token[3] for token in tokens)
+        assert any(token[4] for token in tokens)
+
+        for token in reversed(tokens):
+            universe.undo(token)
+            state, team_food_count = history.pop()
+            assert universe == state
+            assert universe.team_food_count(0) == team_food_count
+
+    def test_state_hash(self):
+        test_layout = (
+        """ ########
+            #0 .. 3#
+            #2.  .1#
+            ######## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        initial_hash = universe.state_hash
+        assert initial_hash == CTFUniverse.create(test_layout, 4).state_hash
+
+        rng = random.Random(3)
+        hashes = [initial_hash]
+        tokens = []
+        for step in range(200):
+            bot_id = step % 4
+            move = rng.choice(list(universe.legal_moves(universe.bots[bot_id].current_pos)))
+            tokens.append(universe.apply_move(bot_id, move))
+            # the incremental hash matches a hash computed from scratch
+            fresh = CTFUniverse._from_json_dict(universe._to_json_dict())
+            assert fresh.bot_to_move == (bot_id + 1) % 4
+            assert universe.state_hash == fresh.state_hash
+            hashes.append(universe.state_hash)
+        assert len(set(hashes)) > 1
+
+        for token in reversed(tokens):
+            hashes.pop()
+            universe.undo(token)
+            assert universe.state_hash == hashes[-1]
+        assert universe.state_hash == initial_hash
+
+        # setting the bot to move updates the hash
+        universe.bot_to_move = 2
+        fresh = universe.copy()
+        fresh._state_hash = None
+        assert universe.state_hash == fresh.state_hash != initial_hash
+        universe.bot_to_move = 0
+        assert universe.state_hash == initial_hash
+
+    def test_state_hash_transposition(self):
+        test_layout = (
+        """ ########
+            #0   3 #
+            #2    1#
+            ######## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        uni_copy = universe.copy()
+        universe.move_bot(0, east)
+        universe.move_bot(1, north)
+        universe.move_bot(2, stop)
+        universe.move_bot(3, west)
+        # the same state, reached in a different way
+        uni_copy.move_bot(0, stop)
+        uni_copy.move_bot(1, north)
+        uni_copy.move_bot(2, stop)
+        uni_copy.move_bot(3, west)
+        assert universe.state_hash != uni_copy.state_hash
+        uni_copy.move_bot(0, east)
+        uni_copy.move_bot(1, stop)
+        uni_copy.move_bot(2, stop)
+        uni_copy.move_bot(3, stop)
+        assert universe.state_hash == uni_copy.state_hash
+        # only the bot to move differs
+        universe.move_bot(0, stop)
+        assert universe.bot_positions == uni_copy.bot_positions
+        assert universe.state_hash != uni_copy.state_hash
+
+    def test_apply_move_illegal(self):
+        test_layout = (
+        """ ######
+            #0  1#
+            ###### """)
+        universe = CTFUniverse.create(test_layout, 2)
+        with pytest.raises(IllegalMoveException):
+            universe.apply_move(0, west)
+        with pytest.raises(IllegalMoveException):
+            universe.apply_move(0, (2, 0))
+        assert universe == CTFUniverse.create(test_layout, 2)
+
+    def test_copy_on_write(self):
+        test_layout3 = (
+        """ ##################
+            #0#.  .  # .     #
+            #1#####    #####2#
+            #     . #  .  .#3#
+            ################## """)
+        universe = CTFUniverse.create(test_layout3, 4)
+        original = CTFUniverse.create(test_layout3, 4)
+        bots = universe.bots
+        uni_copy = universe.copy()
+        assert uni_copy.maze is universe.maze
+        assert uni_copy._food_index is universe._food_index
+        assert uni_copy._bots is not universe._bots
+
+        # moving a bot does not copy the food
+        uni_copy.move_bot(2, north)
+        assert uni_copy._food_index is universe._food_index
+        assert uni_copy.bots[2].current_pos == (16, 1)
+        assert universe == original
+
+        # the original keeps its bots
+        universe.move_bot(2, north)
+        assert universe.bots is bots
+        assert bots[2].current_pos == (16, 1)
+
+        # changes to the original do not reach the copy
+        universe = CTFUniverse.create(test_layout3, 4)
+        uni_copy = universe.copy()
+        universe.food.remove((3, 1))
+        universe.bots[0].current_pos = (1, 2)
+        universe.teams[0].score = 3
+        assert uni_copy.food == original.food
+        assert uni_copy.bots == original.bots
+        assert uni_copy.teams == original.teams
+        assert uni_copy.team_food_count(0) == 3
+        assert universe.team_food_count(0) == 2
+
     def test_str_compact_str(self):
         test_layout3 = (
         """ ##################
@@ -453,7 +657,8 @@ def test_json(self):
                         'current_pos': (16, 2), 'index': 2, 'initial_pos': (16, 2)},
                     {'team_index': 1, 'homezone': (9, 17), 'noisy': False,
                         'current_pos': (16, 3), 'index': 3, 'initial_pos': (16, 3)}
-                ]
+                ],
+                "bot_to_move": 0
             }
 
         universe_dict = universe._to_json_dict()
@@ -728,6 +933,9 @@ def create_TestUniverse(layout, black_score=0, white_score=0):
         game_state = universe.move_bot(1, west)
         assert create_TestUniverse(test_eat_food) == universe
         unittest.TestCase().assertCountEqual(universe.food_list, [(3, 1)])
+        assert universe.team_food(0) == []
+        assert universe.enemy_food_count(1) == 0
+        assert universe.team_food_count(1) == 1
         assert universe.teams[1].score == 1
         assert game_state == {
             "bot_moved": [{"bot_id": 1, "old_pos": (2, 2), "new_pos": (1, 2)}],
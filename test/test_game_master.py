@@ -4,8 +4,8 @@
 import collections
 
 from pelita.datamodel import CTFUniverse
-from pelita.game_master import GameMaster, ManhattanNoiser, PlayerTimeout, NoFoodWarning
-from pelita.player import AbstractPlayer, SimpleTeam, StoppingPlayer, SteppingPlayer
+from pelita.game_master import GameMaster, ManhattanNoiser, MazeNoiser, NoisyUniverse, PlayerTimeout, NoFoodWarning
+from pelita.player import AbstractPlayer, SimpleTeam, StoppingPlayer, SteppingPlayer, RandomPlayer
 from pelita.viewer import AbstractViewer
 
 
@@ -103,6 +103,59 @@ def test_no_food(self):
         with pytest.warns(NoFoodWarning):
             GameMaster(one_side_starving_layout, [team_1, team_2], 2, 1)
 
+    def test_reset(self):
+        test_layout = (
+            """ ##################
+                #0#.  .  # .     #
+                #2#####    #####1#
+                #     . #  .  .#3#
+                ################## """)
+        other_layout = (
+            """ ##################
+                #0#.  .  # .     #
+                #2#####    #####1#
+                #     .   .   .#3#
+                ################## """)
+
+        def play(gm):
+            gm.play()
+            state = dict(gm.game_state)
+            for key in ("game_uuid", "running_time", "team_time"):
+                del state[key]
+            return gm.universe.copy(), state
+
+        def new_game_master(layout, seed):
+            teams = [SimpleTeam(RandomPlayer(), RandomPlayer()),
+                     SimpleTeam(RandomPlayer(), RandomPlayer())]
+            return GameMaster(layout, teams, 4, 50, noiser="maze", layout_name="test", seed=seed)
+
+        gm = new_game_master(test_layout, 1)
+        noiser = gm.noiser
+        game_state = gm.game_state
+        first = play(gm)
+
+        gm.reset(seed=2)
+        assert gm.game_state is game_state
+        assert gm.game_state["round_index"] is None
+        assert gm.game_state["layout_name"] == "test"
+        assert gm.noiser is noiser
+        assert play(gm) == play(new_game_master(test_layout, 2))
+
+        # the parsed layout is shared, but not the walls
+        gm.reset(seed=1)
+        assert play(gm) == first
+        assert gm.universe.maze == new_game_master(test_layout, 1).universe.maze
+        assert gm.universe.maze is not new_game_master(test_layout, 1).universe.maze
+
+        gm.reset(seed=3, layout=other_layout, layout_name="other")
+        assert gm.noiser is not noiser
+        assert gm.game_state["layout_name"] == "other"
+        universe, state = play(gm)
+        other_universe, other_state = play(new_game_master(other_layout, 3))
+        assert universe == other_universe
+        state["layout_name"] = other_state["layout_name"]
+        assert state == other_state
+
 class TestUniverseNoiser:
     def test_uniform_noise_manhattan(self):
         test_layout = (
@@ -199,6 +252,152 @@ def test_uniform_noise_4_bots_no_noise_manhattan(self):
         assert 200 == position_bucket_2[bot_2_pos]
 
 
+    def test_noise_manhattan_candidates(self):
+        test_layout = (
+        """ ##################
+            # #. 2.  # .     #
+            # #####    #####3#
+            #   0  . # .  .#1#
+            ################## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        noiser = ManhattanNoiser(universe.copy(), noise_radius=3)
+        maze = universe.maze
+        for pos, candidates in noiser.noise_candidates.items():
+            assert not maze[pos]
+            # all free positions which the shuffling algorithm can return
+            square = [(x, y) for x in range(pos[0] - 3, pos[0] + 3)
+                             for y in range(pos[1] - 3, pos[1] + 3)
+                      if abs(x - pos[0]) + abs(y - pos[1]) <= 3]
+            assert set(candidates) == {p for p in square if p in maze and not maze[p]}
+            assert len(set(candidates)) == len(candidates)
+        # the table is shared between noisers on the same layout
+        assert ManhattanNoiser(universe.copy(), noise_radius=3).noise_candidates is noiser.noise_candidates
+
+    def test_noise_manhattan_seed_compatible(self):
+        import random
+        test_layout = (
+        """ ##################
+            # #. 2.  # .     #
+            # #####    #####3#
+            #   0  . # .  .#1#
+            ################## """)
+        universe = CTFUniverse.create(test_layout, 4)
+
+        def legacy_altered_pos(rnd, bot_pos, noise_radius=5):
+            possible_positions = [(i,j) for i in range(bot_pos[0] - noise_radius, bot_pos[0] + noise_radius)
+                                        for j in range(bot_pos[1] - noise_radius, bot_pos[1] + noise_radius)
+                                  if abs(i - bot_pos[0]) + abs(j - bot_pos[1]) <= noise_radius]
+            rnd.shuffle(possible_positions)
+            for pos in possible_positions:
+                if pos in universe.maze and not universe.maze[pos]:
+                    return pos
+            return bot_pos
+
+        noiser = ManhattanNoiser(universe.copy(), seed=12, seed_compatible=True)
+        rnd = random.Random(12)
+        for _ in range(50):
+            new = noiser.uniform_noise(universe.copy(), 1)
+            assert new.bots[0].current_pos == legacy_altered_pos(rnd, universe.bots[0].current_pos)
+            assert new.bots[2].current_pos == legacy_altered_pos(rnd, universe.bots[2].current_pos)
+
+    def test_uniform_noise_maze(self):
+        test_layout = (
+        """ ##################
+            # #.  .  # .     #
+            # #####    ##### #
+            #  0  . #  .  .#1#
+            ################## """)
+        universe = CTFUniverse.create(test_layout, 2)
+        noiser = MazeNoiser(universe.copy(), noise_radius=3)
+
+        position_bucket = collections.defaultdict(int)
+        for i in range(200):
+            new = noiser.uniform_noise(universe.copy(), 1)
+            assert new.bots[0].noisy
+            position_bucket[new.bots[0].current_pos] += 1
+        assert 200 == sum(position_bucket.values())
+        # all positions within 3 steps of (3, 3) in the maze
+        expected = [(1, 2), (1, 3), (2, 3), (3, 3), (4, 3), (5, 3), (6, 3)]
+        unittest.TestCase().assertCountEqual(position_bucket, expected, position_bucket)
+        # positions are memoised
+        assert noiser.pos_within((3, 3)) is noiser.pos_within((3, 3))
+
+    def test_maze_noiser_sight(self):
+        test_layout = (
+        """ ##########
+            #0  1    #
+            ######## #
+            #2  3    #
+            ########## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        noiser = MazeNoiser(universe.copy(), noise_radius=1, sight_distance=5)
+        universe.bots[1].current_pos = (6, 1)
+        assert noiser.distance(universe.bots[0], universe.bots[1]) == 5
+        # bot 3 is close in Manhattan distance, but far away in the maze
+        universe.bots[3].current_pos = (2, 3)
+        assert noiser.distance(universe.bots[0], universe.bots[3]) is None
+
+        new = noiser.uniform_noise(universe.copy(), 0)
+        assert not new.bots[1].noisy
+        assert new.bots[1].current_pos == (6, 1)
+        assert new.bots[3].noisy
+        assert new.bots[3].current_pos in [(1, 3), (2, 3), (3, 3)]
+
+    def test_noiser_by_name(self):
+        test_layout = (
+        """ ##########
+            #0      1#
+            ########## """)
+        teams = [SimpleTeam(StoppingPlayer()), SimpleTeam(StoppingPlayer())]
+        gm = GameMaster(test_layout, teams, 2, 5, noiser="maze")
+        assert isinstance(gm.noiser, MazeNoiser)
+        gm = GameMaster(test_layout, teams, 2, 5)
+        assert isinstance(gm.noiser, ManhattanNoiser)
+        assert not gm.noiser.seed_compatible
+
+        # the compatible mode is kept for a new layout
+        gm = GameMaster(test_layout, teams, 2, 5, noiser="manhattan-compat")
+        assert gm.noiser.seed_compatible
+        gm.reset(layout=test_layout.replace("0 ", "0#"))
+        assert isinstance(gm.noiser, ManhattanNoiser)
+        assert gm.noiser.seed_compatible
+
+    def test_noisy_universe_view(self):
+        test_layout = (
+        """ ##################
+            #0#.  .  # .     #
+            #2#####    #####1#
+            #     . #  .  .#3#
+            ################## """)
+        universe = CTFUniverse.create(test_layout, 4)
+        original = universe.copy()
+        noiser = ManhattanNoiser(universe.copy())
+        new = noiser.uniform_noise(universe, 0)
+        assert isinstance(new, NoisyUniverse)
+        # nothing is cloned before it is needed
+        assert new._materialised is None
+        json_dict = new._to_json_dict()
+        assert new._materialised is None
+        assert [bot["noisy"] for bot in json_dict["bots"]] == [False, True, False, True]
+        assert universe == original
+
+        # the serialised view and the materialised universe agree
+        assert CTFUniverse._from_json_dict(json_dict) == new.copy()
+        assert new.bots[1].noisy
+        assert new.bots[1].current_pos == tuple(json_dict["bots"][1]["current_pos"])
+        assert not universe.bots[1].noisy
+        assert universe.bot_positions == original.bot_positions
+
+        # the food is shared until either side changes it
+        assert new._materialised._food_index is universe._food_index
+        universe.food.remove((3, 1))
+        assert (3, 1) in new.food
+
+        # snapshots of the view do not follow the underlying universe
+        snapshot = new.copy()
+        universe.teams[0].score += 10
+        assert snapshot.teams[0].score == 0
+
     def test_noise_manhattan_failure(self):
         test_layout = (
         """ ##################
@@ -844,3 +1043,31 @@ def test_kill_count(self):
         assert gm.game_state["times_killed"] == [0, 2]
         gm.play_round()
         assert gm.game_state["times_killed"] == [1, 2]
+
+    def test_bot_to_move(self):
+        test_start = (
+            """ ##########
+                #0 2..3 1#
+                #........#
+                ########## """)
+        class HashCheckingPlayer(AbstractPlayer):
+            def get_move(self):
+                universe = self.current_uni
+                assert universe.bot_to_move == self._index
+                fresh = universe.copy()
+                fresh._state_hash = None
+                assert universe.state_hash == fresh.state_hash
+                return (0, 0)
+
+        class IllegalMovePlayer(AbstractPlayer):
+            def get_move(self):
+                return (2, 0)
+
+        teams = [
+            SimpleTeam(HashCheckingPlayer(), HashCheckingPlayer()),
+            SimpleTeam(IllegalMovePlayer(), SteppingPlayer('<<<<<'))
+        ]
+        gm = GameMaster(test_start, teams, 4, game_time=5, noise=True, max_timeouts=20)
+        gm.play()
+        assert gm.game_state["finished"]
+        assert gm.game_state["teams_disqualified"] == [None, None]
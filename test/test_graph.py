@@ -1,9 +1,11 @@
 import pytest
+import random
 import unittest
+from collections import deque
 
 from pelita.datamodel import CTFUniverse, east, north, south, stop, west
-from pelita.graph import (Graph, NoPathException, diff_pos, iter_adjacencies,
-                          manhattan_dist, move_pos)
+from pelita.graph import (DistanceField, DistanceMatrix, Graph, NoPathException,
+                          diff_pos, iter_adjacencies, manhattan_dist, move_pos)
 
 
 class TestStaticmethods:
@@ -186,6 +188,118 @@ def test_bfs_to_self(self):
         al = Graph(universe.free_positions())
         assert [] == al.bfs((1,1), [(1, 1), (2, 1)])
 
+    def test_bfs_tie_breaking(self):
+        # the path must be the same as with the original,
+        # list based implementation of bfs
+        def list_bfs(graph, initial, targets):
+            to_visit = deque([initial])
+            seen = []
+            found = False
+            while to_visit:
+                current = to_visit.popleft()
+                if current in seen:
+                    continue
+                elif current in targets:
+                    found = True
+                    break
+                else:
+                    seen.append(current)
+                    to_visit.extend(graph[current])
+            if not found:
+                raise NoPathException()
+            path = [current]
+            while seen:
+                next_ = seen.pop()
+                if next_ in graph[current]:
+                    path.append(next_)
+                    current = next_
+            return path[:-1]
+
+        from pelita.layout import get_layout_by_name
+        rng = random.Random(4)
+        for layout_name in ["layout_normal_with_dead_ends_001", "layout_normal_without_dead_ends_002"]:
+            universe = CTFUniverse.create(get_layout_by_name(layout_name), 4)
+            for al in [Graph(universe.free_positions()),
+                       Graph(universe.reachable([universe.bots[0].initial_pos]))]:
+                positions = sorted(al.keys())
+                for _ in range(50):
+                    initial = rng.choice(positions)
+                    targets = rng.sample(positions, rng.randint(1, 4))
+                    assert al.bfs(initial, targets) == list_bfs(al, initial, targets)
+
+    def test_a_star_tie_breaking(self):
+        # the path must be the same as with the original,
+        # dict based implementation of a_star
+        import heapq
+        def dict_a_star(graph, initial, target):
+            came_from = {initial: None}
+            cost_so_far = {initial: 0}
+            to_visit = [(0, initial)]
+            while to_visit:
+                old_prio, current = heapq.heappop(to_visit)
+                if current == target:
+                    break
+                for next in graph[current]:
+                    new_cost = cost_so_far[current] + 1
+                    if next not in cost_so_far or new_cost < cost_so_far[next]:
+                        cost_so_far[next] = new_cost
+                        came_from[next] = current
+                        heapq.heappush(to_visit, (new_cost + manhattan_dist(target, next), next))
+            else:
+                raise NoPathException()
+            path = [target]
+            while path[-1] != initial:
+                path.append(came_from[path[-1]])
+            return path[:-1]
+
+        from pelita.layout import get_layout_by_name
+        rng = random.Random(5)
+        universe = CTFUniverse.create(get_layout_by_name("layout_normal_with_dead_ends_001"), 4)
+        al = Graph(universe.free_positions())
+        positions = sorted(al.keys())
+        for _ in range(100):
+            initial, target = rng.choice(positions), rng.choice(positions)
+            assert al.a_star(initial, target) == dict_a_star(al, initial, target)
+
+    def test_csr(self):
+        test_layout = (
+        """ ######
+            #0  1#
+            # ####
+            ###### """)
+        universe = CTFUniverse.create(test_layout, 2)
+        al = Graph(universe.free_positions())
+        csr = al.csr
+        assert csr.positions == [(1, 1), (1, 2), (2, 1), (3, 1), (4, 1)]
+        assert csr.index[(2, 1)] == 2
+        for idx, pos in enumerate(csr.positions):
+            assert [csr.positions[n] for n in csr.neighbors_of(idx)] == list(al[pos])
+        assert al.csr is csr
+
+        # changing the graph rebuilds the csr
+        al[(4, 1)] = [(3, 1)]
+        assert al.csr is not csr
+        assert list(al.csr.neighbors_of(4)) == [3]
+        assert al.bfs((1, 2), [(4, 1)]) == [(4, 1), (3, 1), (2, 1), (1, 1)]
+        del al[(4, 1)]
+        assert len(al.csr) == 4
+        with pytest.raises(NoPathException):
+            al.bfs((1, 2), [(4, 1)])
+
+    def test_bfs_distances(self):
+        test_layout = (
+        """ ############
+            #0.  #  .1 #
+            ############ """)
+        universe = CTFUniverse.create(test_layout, 2)
+        al = Graph(universe.free_positions())
+        assert al.bfs_distances((1, 1), [(3, 1), (1, 1), (6, 1)]) == {(1, 1): 0, (3, 1): 2}
+        assert al.bfs_distances((1, 1)) == {(1, 1): 0, (2, 1): 1, (3, 1): 2, (4, 1): 3}
+        with pytest.raises(NoPathException):
+            al.bfs_distances((1, 1), [(5, 1)])
+        with pytest.raises(NoPathException):
+            al.bfs_distances((0, 1))
+
     def test_a_star(self):
         test_layout = (
         """ ##################
@@ -317,3 +431,126 @@ def test_a_star_exceptions(self):
             al.a_star((0, 1), (10, 1))
         with pytest.raises(NoPathException):
             al.a_star((1, 1), (11, 1))
+
+
+class TestDistanceField:
+    test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+    def test_distances(self):
+        universe = CTFUniverse.create(self.test_layout, 4)
+        al = Graph(universe.free_positions())
+        sources = universe.enemy_food(0)
+        field = al.distance_field(sources)
+        assert isinstance(field, DistanceField)
+        for pos in al:
+            path = al.bfs(pos, sources)
+            assert field.distance(pos) == len(path)
+            path = field.path(pos)
+            assert len(path) == field.distance(pos)
+            if path:
+                assert path[0] in sources
+                assert path[-1] == field.next_step(pos)
+                assert path[-1] in al[pos]
+            else:
+                assert field.next_step(pos) == pos
+
+    def test_unreachable(self):
+        test_layout = (
+        """ ############
+            #0.     #.1#
+            ############ """)
+        universe = CTFUniverse.create(test_layout, 2)
+        al = Graph(universe.free_positions())
+        field = al.distance_field([(2, 1), (3, 1)])
+        assert field.distance((7, 1)) == 4
+        assert field.next_step((7, 1)) == (6, 1)
+        with pytest.raises(NoPathException):
+            field.distance((10, 1))
+        with pytest.raises(NoPathException):
+            field.next_step((10, 1))
+        with pytest.raises(NoPathException):
+            al.distance_field([(0, 1)])
+
+
+class TestDistanceMatrix:
+    test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+    def test_distance(self):
+        universe = CTFUniverse.create(self.test_layout, 4)
+        graph = Graph(universe.free_positions())
+        matrix = DistanceMatrix(graph)
+        for initial in graph:
+            for target in graph:
+                if initial == target:
+                    assert matrix.distance(initial, target) == 0
+                    assert matrix.next_step(initial, target) == target
+                    continue
+                path = graph.a_star(initial, target)
+                assert matrix.distance(initial, target) == len(path)
+                next_step = matrix.next_step(initial, target)
+                assert next_step in graph[initial]
+                assert matrix.distance(next_step, target) == len(path) - 1
+
+    def test_exceptions(self):
+        test_layout = (
+        """ ############
+            #0.     #.1#
+            ############ """)
+        universe = CTFUniverse.create(test_layout, 2)
+        matrix = DistanceMatrix(Graph(universe.free_positions()))
+        with pytest.raises(NoPathException):
+            matrix.distance((1, 1), (10, 1))
+        with pytest.raises(NoPathException):
+            matrix.next_step((1, 1), (10, 1))
+        with pytest.raises(NoPathException):
+            matrix.distance((0, 1), (10, 1))
+        with pytest.raises(NoPathException):
+            matrix.next_step((1, 1), (11, 1))
+
+    def test_cached(self, tmpdir):
+        universe = CTFUniverse.create(self.test_layout, 4)
+        graph = Graph(universe.free_positions())
+        key = DistanceMatrix.graph_key(graph)
+        DistanceMatrix._cache.pop(key, None)
+
+        matrix = DistanceMatrix.cached(graph, cache_dir=str(tmpdir))
+        assert DistanceMatrix.cached(Graph(universe.free_positions())) is matrix
+        assert tmpdir.join("distances-%s.npz" % key).check()
+
+        # a fresh process would read the matrix from disk
+        DistanceMatrix._cache.pop(key)
+        loaded = DistanceMatrix.cached(graph, cache_dir=str(tmpdir))
+        assert loaded is not matrix
+        assert loaded.positions == matrix.positions
+        assert (loaded.distances == matrix.distances).all()
+
+        # a matrix for a different graph is not used
+        other_graph = Graph(CTFUniverse.create(
+        """ ######
+            #0  1#
+            ###### """, 2).free_positions())
+        with pytest.raises(ValueError):
+            DistanceMatrix.load(str(tmpdir.join("distances-%s.npz" % key)), other_graph)
+
+    def test_cached_size(self, monkeypatch):
+        universe = CTFUniverse.create(self.test_layout, 4)
+        graph = Graph(universe.free_positions())
+        monkeypatch.setattr(DistanceMatrix, "_cache", type(DistanceMatrix._cache)())
+        monkeypatch.setattr(DistanceMatrix, "CACHE_SIZE", 2)
+
+        first = DistanceMatrix.cached(graph, key="first")
+        DistanceMatrix.cached(graph, key="second")
+        # using a matrix keeps it in the cache
+        assert DistanceMatrix.cached(graph, key="first") is first
+        DistanceMatrix.cached(graph, key="third")
+        assert list(DistanceMatrix._cache) == ["first", "third"]
@@ -36,3 +36,25 @@ def test_call_pelita(self):
         assert state['team_wins'] == 1
         assert state['game_draw'] is None
 
+
+class TestPlayerPool:
+    def test_workers_are_reused(self):
+        layout = """
+        ##########
+        #0  ..  1#
+        #2      3#
+        ##########
+        """
+        teams = ["pelita/player/StoppingPlayer", "pelita/player/SmartEatingPlayer"]
+        with libpelita.PlayerPool(max_games=2) as pool:
+            states = [libpelita.run_game(teams, rounds=5, layout=layout, pool=pool) for _ in range(3)]
+            workers = [worker for idle in pool._idle.values() for worker in idle]
+            # the workers have been recycled after the second game
+            assert sorted(worker.games_played for worker in workers) == [1, 1]
+            assert all(worker.alive for worker in workers)
+
+        for state in states:
+            assert state["finished"]
+            assert state["teams_disqualified"] == [None, None]
+            assert state["team_wins"] == 1
+        assert not any(worker.alive for worker in workers)
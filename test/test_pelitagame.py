@@ -62,3 +62,65 @@ def test_remote_game():
     [p.terminate() for p in remote_procs]
     for p in remote_procs:
         assert p.wait(2) is not None
+
+def test_router_hub_queue():
+    import json
+    import threading
+    import time
+    import uuid
+    import zmq
+    from pelita.scripts.pelita_player import RouterHub
+
+    def wait_for(condition, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+    address = 'ipc:///tmp/pelita-test-hub-%s' % uuid.uuid4()
+    hub = RouterHub('pelita/player/StoppingPlayer', address, workers=1, max_queue=1)
+    hub_thread = threading.Thread(target=hub.run)
+    hub_thread.start()
+
+    ctx = zmq.Context()
+    dealers = []
+    def request():
+        dealer = ctx.socket(zmq.DEALER)
+        dealer.connect(address)
+        dealer.send_json({"REQUEST": "tcp://*"})
+        dealers.append(dealer)
+        return dealer
+
+    # the first match is played by the worker
+    first = request()
+    first.send_json({"__uuid__": 1, "__action__": "team_name", "__data__": {}})
+    assert first.poll(10000)
+    assert json.loads(first.recv().decode('utf-8'))["__return__"] == "Stopping"
+
+    # the second request waits in the queue
+    request()
+    wait_for(lambda: hub.metrics["queue_depth"] == 1)
+
+    # the pool and the queue are full
+    rejected = request()
+    assert rejected.poll(5000)
+    assert "__error__" in json.loads(rejected.recv().decode('utf-8'))
+
+    # undecodable messages from unknown dealers are dropped
+    stray = ctx.socket(zmq.DEALER)
+    stray.connect(address)
+    stray.send(b'\x93\x01\xff\x00')
+    dealers.append(stray)
+    first.send_json({"__uuid__": 2, "__action__": "team_name", "__data__": {}})
+    assert first.poll(10000)
+    assert json.loads(first.recv().decode('utf-8'))["__uuid__"] == 2
+
+    wait_for(lambda: hub.metrics["spawn_latency"] > 0)
+    assert hub.metrics["active_matches"] == 1
+    assert hub.metrics["queue_depth"] == 1
+    assert hub.metrics["spawned"] == 1
+    hub.stop()
+    hub_thread.join()
+    hub.terminate()
+    for dealer in dealers:
+        dealer.close(linger=0)
@@ -1,15 +1,42 @@
 import pytest
 
+import json
+import threading
 import uuid
 
 import zmq
 
 import pelita
+from pelita.datamodel import CTFUniverse
 from pelita.player import AbstractPlayer, SimpleTeam, SteppingPlayer
-from pelita.simplesetup import SimpleClient, SimpleServer, bind_socket, extract_port_range
+from pelita.game_master import GameMaster
+from pelita.simplesetup import (LATENCY_BUCKETS, PROTOCOLS, MatchServer, RemoteTeamPlayer, SimpleClient, SimpleServer,
+                                ZMQConnection, bind_socket,
+                                decode_message, encode_message, extract_port_range)
 from pelita.player import RandomPlayer
 
 
+protocol_layout = """
+    ##########
+    #0  ..  1#
+    ##########
+    """
+
+class RecordingTeam:
+    team_name = "recording"
+
+    def __init__(self):
+        self.universes = []
+
+    def set_initial(self, team_id, universe, game_state):
+        self.universes.append(universe)
+        return self.team_name
+
+    def get_move(self, bot_id, universe, game_state):
+        self.universes.append(universe)
+        return {"move": (0, 0)}
+
+
 class TestSimpleSetup:
     def test_bind_socket(self):
         # check that we cannot bind to a stupid address
@@ -69,6 +96,10 @@ def test_simple_remote_game(self):
         server.run()
         server.shutdown()
 
+        # set_initial and every move have been answered
+        for latency_histogram in server.game_master.game_state["team_latency"]:
+            assert sum(latency_histogram) > 1
+
     def test_simple_failing_bots(self):
         layout = """
         ##########
@@ -188,3 +219,162 @@ def test_extract_port_range(self):
             extracted = extract_port_range(test[0])
             assert extracted == test[1]
 
+    @pytest.mark.parametrize("protocol", ["json", "msgpack"])
+    def test_encode_message(self, protocol):
+        if protocol == "msgpack":
+            pytest.importorskip("msgpack")
+        message_obj = {"__uuid__": 1, "__return__": {"move": [0, 1], "say": "ü"}}
+        assert decode_message(encode_message(message_obj, protocol)) == message_obj
+        with pytest.raises(ValueError):
+            decode_message(b"\xc1")
+
+    def test_protocol_negotiation(self):
+        address = "ipc:///tmp/pelita-test-protocol-%s" % uuid.uuid4()
+        context = zmq.Context()
+        socket = context.socket(zmq.PAIR)
+        socket.bind(address)
+        team_player = RemoteTeamPlayer(socket)
+
+        team = RecordingTeam()
+        client = SimpleClient(team, address=address)
+        client_thread = threading.Thread(target=client.run)
+        client_thread.start()
+
+        universe = CTFUniverse.create(protocol_layout, 2)
+        game_state = {"timeout_length": 3}
+        assert not team_player.zmqconnection.negotiated
+        assert team_player.set_initial(0, universe, game_state) == "recording"
+        assert team_player.zmqconnection.negotiated
+        assert team_player.zmqconnection.protocol == client.protocol == PROTOCOLS[0]
+
+        universe.move_bot(0, (1, 0))
+        assert team_player.get_move(0, universe, game_state) == {"move": (0, 0)}
+        team_player._exit()
+        client_thread.join()
+        socket.close()
+
+        # the maze is only sent with set_initial, but the client knows it
+        assert team.universes[1] == universe
+        assert team.universes[1].maze == team.universes[0].maze
+
+    def test_legacy_client(self):
+        address = "ipc:///tmp/pelita-test-legacy-%s" % uuid.uuid4()
+        context = zmq.Context()
+        socket = context.socket(zmq.PAIR)
+        socket.bind(address)
+        team_player = RemoteTeamPlayer(socket)
+
+        received = []
+        def legacy_client():
+            # a client which only understands json and does not negotiate
+            client_socket = context.socket(zmq.PAIR)
+            client_socket.connect(address)
+            while True:
+                py_obj = json.loads(client_socket.recv_unicode())
+                if py_obj["__action__"] == "exit":
+                    break
+                received.append(py_obj["__data__"])
+                client_socket.send_unicode(json.dumps({"__uuid__": py_obj["__uuid__"],
+                                                       "__return__": {"move": [0, 0]}}))
+            client_socket.close()
+
+        client_thread = threading.Thread(target=legacy_client)
+        client_thread.start()
+
+        universe = CTFUniverse.create(protocol_layout, 2)
+        game_state = {"timeout_length": 3}
+        team_player.set_initial(0, universe, game_state)
+        assert team_player.get_move(0, universe, game_state) == {"move": (0, 0)}
+        team_player._exit()
+        client_thread.join()
+        socket.close()
+
+        assert not team_player.zmqconnection.negotiated
+        assert all("maze" in data["universe"] for data in received)
+
+    def test_client_caches_static_state(self):
+        team = RecordingTeam()
+        client = SimpleClient(team)
+
+        universe = CTFUniverse.create(protocol_layout, 2)
+        game_state = {"timeout_length": 3}
+        client.set_initial(0, universe._to_json_dict(), game_state)
+
+        universe.move_bot(0, (1, 0))
+        universe.teams[0].score = 3
+        universe_dict = universe._to_json_dict()
+        del universe_dict["maze"]
+        client.get_move(0, universe_dict, game_state)
+        assert team.universes[1] == universe
+        assert team.universes[1].bot_to_move == 1
+        assert team.universes[1].state_hash == universe.state_hash
+        # the maze is re-used and the earlier universe is unchanged
+        assert team.universes[1].maze is team.universes[0].maze
+        assert team.universes[0].bots[0].current_pos == (1, 1)
+        assert team.universes[0].teams[0].score == 0
+
+        # a different maze replaces the cache
+        other = CTFUniverse.create(protocol_layout.replace("  ..  ", " #..  "), 2)
+        client.get_move(0, other._to_json_dict(), game_state)
+        assert team.universes[2] == other
+
+    def test_stale_replies_and_latency(self):
+        address = "ipc:///tmp/pelita-test-latency-%s" % uuid.uuid4()
+        context = zmq.Context()
+        socket = context.socket(zmq.PAIR)
+        socket.bind(address)
+        connection = ZMQConnection(socket)
+
+        def late_client():
+            client_socket = context.socket(zmq.PAIR)
+            client_socket.connect(address)
+            py_obj = json.loads(client_socket.recv_unicode())
+            # a reply to an earlier request comes first
+            for uuid_ in [py_obj["__uuid__"] - 1, py_obj["__uuid__"]]:
+                client_socket.send_unicode(json.dumps({"__uuid__": uuid_, "__return__": uuid_}))
+            client_socket.close()
+
+        client_thread = threading.Thread(target=late_client)
+        client_thread.start()
+
+        connection.send("team_name", {})
+        assert connection.recv_timeout(3) == 1
+        client_thread.join()
+        socket.close()
+
+        assert len(connection.latency_histogram) == len(LATENCY_BUCKETS) + 1
+        assert sum(connection.latency_histogram) == 1
+
+    def test_match_server(self):
+        layout = """
+        ##########
+        #        #
+        #0  ..  1#
+        ##########
+        """
+        context = zmq.Context()
+        server = MatchServer()
+        clients = []
+        for game in range(3):
+            team_players = []
+            for team, moves in [("team1", "^>>v<"), ("team2", "^<<v>")]:
+                address = "ipc:///tmp/pelita-test-match-%s" % uuid.uuid4()
+                socket = context.socket(zmq.PAIR)
+                socket.bind(address)
+                team_players.append(RemoteTeamPlayer(socket))
+                client = SimpleClient(SimpleTeam(team, SteppingPlayer(moves)), address=address)
+                clients.append(client.autoplay_process())
+            server.add_game(GameMaster(layout, team_players, 2, 5, seed=game))
+        server.run()
+        for client in clients:
+            client.join()
+
+        # the same game in a single server
+        local_gm = GameMaster(layout, [SimpleTeam("team1", SteppingPlayer("^>>v<")),
+                                       SimpleTeam("team2", SteppingPlayer("^<<v>"))], 2, 5, seed=0)
+        local_gm.play()
+        for game_master in server.game_masters:
+            assert game_master.game_state["finished"]
+            assert game_master.game_state["team_name"] == ["team1", "team2"]
+            assert game_master.universe == local_gm.universe
+            assert sum(game_master.game_state["team_latency"][0]) == 6
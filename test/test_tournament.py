@@ -1,9 +1,12 @@
 import pytest
 from unittest.mock import MagicMock
 
+import os
 import re
 from textwrap import dedent
 
+import yaml
+
 try:
     from pelita.tournament import komode, roundrobin, tournament
     from pelita.tournament.komode import Team, Match, Bye
@@ -136,6 +139,7 @@ def test_play_game_with_config(self):
         config.team_spec = lambda x: x
         config.viewer = 'ascii'
         config.filter = 'small'
+        config.noiser = 'maze'
         config.tournament_log_folder = None
 
         teams = ["pelita/player/StoppingPlayer", "pelita/player/StoppingPlayer"]
@@ -178,6 +182,7 @@ def mock_print(str="", *args, **kwargs):
         config.team_name = lambda x: teams[x]
         config.viewer = 'ascii'
         config.filter = 'small'
+        config.noiser = 'maze'
         config.print = mock_print
         config.tournament_log_folder = None
 
@@ -215,6 +220,7 @@ def mock_print(str="", *args, **kwargs):
         config.team_name = lambda x: teams[x]
         config.viewer = 'ascii'
         config.filter = 'small'
+        config.noiser = 'maze'
         config.print = mock_print
         config.tournament_log_folder = None
 
@@ -277,3 +283,64 @@ def mock_print(str="", *args, **kwargs):
         winner = tournament.round2(config, sorted_ranking, state)
         assert winner == 'group1'
 
+
+    def test_round1_parallel(self, tmp_path):
+        c = {
+            "location": None,
+            "date": None,
+            "bonusmatch": None,
+            "teams": [
+                {"id": "group0", "spec": "pelita/player/StoppingPlayer", "members": []},
+                {"id": "group1", "spec": "pelita/player/SmartEatingPlayer", "members": []},
+                {"id": "group2", "spec": "pelita/player/StoppingPlayer", "members": []},
+            ],
+            "filter": "small",
+            "parallel_matches": 3,
+        }
+        config = tournament.Config(c)
+        config.print = lambda *args, **kwargs: None
+        config.viewer = 'null'
+        config.statefile = str(tmp_path / "state.yaml")
+
+        state = tournament.State(config)
+        rr_ranking = tournament.round1(config, state)
+        assert rr_ranking == ["group1", "group0", "group2"]
+        assert state.round1["unplayed"] == []
+        assert len(state.round1["played"]) == 3
+
+        with open(config.statefile) as f:
+            assert yaml.load(f, Loader=yaml.Loader) == state.state
+
+    def test_round1_parallel_replay(self, tmp_path, monkeypatch):
+        c = {
+            "location": None,
+            "date": None,
+            "bonusmatch": None,
+            "teams": [
+                {"id": "group0", "spec": "pelita/player/StoppingPlayer", "members": []},
+                {"id": "group1", "spec": "pelita/player/SmartEatingPlayer", "members": []},
+            ],
+            "filter": "small",
+            "parallel_matches": 2,
+        }
+        config = tournament.Config(c)
+        config.print = lambda *args, **kwargs: None
+        config.viewer = 'tk'
+        config.statefile = str(tmp_path / "state.yaml")
+
+        # without dumps, a tk viewer plays the matches one after the other
+        def round1_parallel(config, state):
+            raise AssertionError("must not run in parallel")
+        monkeypatch.setattr(tournament, "round1_parallel", round1_parallel)
+        monkeypatch.setattr(tournament, "start_match_with_replay", lambda config, match: False)
+        tournament.round1(config, tournament.State(config))
+        monkeypatch.undo()
+
+        # the matches run headless and are replayed from their dumps
+        config.tournament_log_folder = str(tmp_path)
+        replayed = []
+        monkeypatch.setattr(tournament, "replay_match", lambda config, dump: replayed.append(dump))
+        state = tournament.State(config)
+        assert tournament.round1(config, state) == ["group1", "group0"]
+        assert len(replayed) == 1
+        assert os.path.exists(replayed[0])
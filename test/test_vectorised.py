@@ -0,0 +1,89 @@
+import pytest
+
+import numpy as np
+
+from pelita.datamodel import CTFUniverse, IllegalMoveException
+from pelita.game_master import GameMaster
+from pelita.layout import get_layout_by_name
+from pelita.player import AbstractPlayer, SimpleTeam
+from pelita.vectorised import MOVES, LockstepGames, random_policy
+
+
+test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+kill_layout = (
+    """ ########
+        #0 .. 1#
+        #2    3#
+        ######## """)
+
+
+def position_policy(games, bot_id):
+    # a deterministic choice among the legal moves which are not a stop
+    legal = games.legal_moves(bot_id)
+    legal[legal.sum(axis=1) > 1, MOVES.index((0, 0))] = False
+    choice = (games.positions[:, bot_id] * 7919 + games.round_index * 104729 + bot_id) % 97 % legal.sum(axis=1)
+    return (legal.cumsum(axis=1) > choice[:, None]).argmax(axis=1)
+
+
+class PositionPlayer(AbstractPlayer):
+    def get_move(self):
+        legal = self.legal_moves
+        if len(legal) > 1:
+            del legal[(0, 0)]
+        x, y = self.current_pos
+        cell = x + y * self.current_uni.maze.width
+        legal_moves = [move for move in MOVES if move in legal]
+        round_index = self.current_state["round_index"]
+        return legal_moves[(cell * 7919 + round_index * 104729 + self._index) % 97 % len(legal_moves)]
+
+
+class TestLockstepGames:
+    @pytest.mark.parametrize('layout', [test_layout, kill_layout])
+    def test_random_moves(self, layout):
+        # every game must follow the same states as a CTFUniverse
+        number_games = 20
+        games = LockstepGames(layout, number_games)
+        universes = [CTFUniverse.create(layout, 4) for _ in range(number_games)]
+        rng = np.random.RandomState(1)
+        policy = random_policy(rng)
+        for _step in range(100):
+            for bot_id in range(4):
+                running = ~games.finished
+                move_indices = policy(games, bot_id)
+                games.move_bot(bot_id, move_indices)
+                for game, universe in enumerate(universes):
+                    if running[game]:
+                        universe.move_bot(bot_id, MOVES[move_indices[game]])
+                    assert games.universe(game) == universe
+                    assert games.enemy_food_count(0)[game] == universe.enemy_food_count(0)
+                    assert games.enemy_food_count(1)[game] == universe.enemy_food_count(1)
+
+    def test_illegal_move(self):
+        games = LockstepGames(test_layout, 3)
+        north = MOVES.index((0, -1))
+        south = MOVES.index((0, 1))
+        with pytest.raises(IllegalMoveException):
+            games.move_bot(0, [south, north, south])
+
+    def test_game_master(self):
+        layout = get_layout_by_name('layout_small_without_dead_ends_001')
+        game_time = 100
+        games = LockstepGames(layout, 2)
+        games.play([position_policy, position_policy], game_time)
+        assert games.finished.all()
+
+        teams = [SimpleTeam(PositionPlayer(), PositionPlayer()),
+                 SimpleTeam(PositionPlayer(), PositionPlayer())]
+        gm = GameMaster(layout, teams, 4, game_time, noise=False)
+        gm.play()
+        assert gm.game_state["team_wins"] is not None
+        for game in range(2):
+            assert games.universe(game) == gm.universe
+            assert games.round_index[game] == gm.game_state["round_index"]
+            assert games.winner[game] == gm.game_state["team_wins"]
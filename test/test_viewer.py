@@ -0,0 +1,94 @@
+import pytest
+
+import io
+import json
+
+from pelita.game_master import GameMaster
+from pelita.player import SimpleTeam, RandomPlayer, NQRandomPlayer
+from pelita.simplesetup import SimpleSubscriber
+from pelita.viewer import AbstractViewer, DeltaDecoder, DeltaEncoder, DumpingViewer
+
+
+test_layout = (
+    """ ##################
+        #0#.  .  # .     #
+        #2#####    #####1#
+        #     . #  .  .#3#
+        ################## """)
+
+
+class RecordingViewer(AbstractViewer):
+    def __init__(self):
+        self.universes = []
+
+    def set_initial(self, universe, game_state):
+        self.universes.append(universe.copy())
+
+    def observe(self, universe, game_state):
+        self.universes.append(universe.copy())
+
+
+def play_game(*viewers):
+    teams = [
+        SimpleTeam(RandomPlayer(), NQRandomPlayer()),
+        SimpleTeam(NQRandomPlayer(), RandomPlayer())
+    ]
+    gm = GameMaster(test_layout, teams, 4, 100, seed=3)
+    for viewer in viewers:
+        gm.register_viewer(viewer)
+    gm.play()
+    return gm
+
+
+class TestDeltas:
+    def test_dump_reconstructs_universes(self):
+        stream = io.StringIO()
+        recorder = RecordingViewer()
+        play_game(DumpingViewer(stream, keyframe_interval=50), recorder)
+
+        messages = [json.loads(msg) for msg in stream.getvalue().split("\x04") if msg.strip()]
+        assert len(messages) == len(recorder.universes)
+        keyframes = [msg for msg in messages if "universe" in msg["__data__"]]
+        assert 1 < len(keyframes) < len(messages) // 40
+        assert "universe" in messages[0]["__data__"]
+
+        decoder = DeltaDecoder()
+        for message, universe in zip(messages, recorder.universes):
+            data = message["__data__"]
+            assert decoder.decode(universe=data.get("universe"), delta=data.get("delta")) == universe
+
+    def test_delta_size(self):
+        recorder = RecordingViewer()
+        play_game(recorder)
+        encoder = DeltaEncoder()
+        keyframe = json.dumps(encoder.keyframe(recorder.universes[0], {}))
+        delta = json.dumps(encoder.encode(recorder.universes[1], {}))
+        assert len(delta) * 10 < len(keyframe)
+
+    def test_keyframe_on_changed_food(self):
+        recorder = RecordingViewer()
+        play_game(recorder)
+        universe = recorder.universes[0]
+        encoder = DeltaEncoder()
+        encoder.keyframe(universe, {})
+        assert "delta" in encoder.encode(universe, {})
+        changed = universe.copy()
+        changed.food.add((17, 2))
+        # new food cannot be described by a delta
+        assert "universe" in encoder.encode(changed, {})
+
+    def test_subscriber_waits_for_keyframe(self):
+        recorder = RecordingViewer()
+        play_game(recorder)
+        encoder = DeltaEncoder()
+        encoder.keyframe(recorder.universes[0], {})
+        delta_data = encoder.encode(recorder.universes[1], {})
+
+        received = RecordingViewer()
+        subscriber = SimpleSubscriber(received, "tcp://127.0.0.1:0")
+        # we joined late: the delta cannot be applied
+        subscriber.observe(**delta_data)
+        assert received.universes == []
+        subscriber.observe(**encoder.keyframe(recorder.universes[1], {}))
+        subscriber.observe(**encoder.encode(recorder.universes[2], {}))
+        assert received.universes == recorder.universes[1:3]